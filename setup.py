@@ -28,6 +28,7 @@ setup(
     license=LICENSE,
     url=URL,
     packages=find_packages(),
+    python_requires='>=3.7',
     package_data={'src.metamodel': ['*tx']},
     install_requires=[
         'funcsigs==1.0.2',
@@ -1,8 +1,8 @@
 from ..infrastructure import lsp
 
 
-def get_capabilities(cmd_list):
-    return {
+def get_capabilities(cmd_list, pull_diagnostics=False):
+    capabilities = {
             'codeActionProvider': True,
             'codeLensProvider': {
                 'resolveProvider': False,
@@ -12,7 +12,7 @@ def get_capabilities(cmd_list):
                 'triggerCharacters': ['.']
             },
             'documentFormattingProvider': True,
-            # 'documentHighlightProvider': True,
+            'documentHighlightProvider': True,
             'documentRangeFormattingProvider': True,
             'documentSymbolProvider': True,
             'definitionProvider': True,
@@ -24,5 +24,12 @@ def get_capabilities(cmd_list):
             'signatureHelpProvider': {
                 'triggerCharacters': ['(', ',']
             },
-            'textDocumentSync': lsp.TextDocumentSyncKind.INCREMENTAL
+            'textDocumentSync': lsp.TextDocumentSyncKind.INCREMENTAL,
+            'workspaceSymbolProvider': True
     }
+    if pull_diagnostics:
+        capabilities['diagnosticProvider'] = {
+            'interFileDependencies': False,
+            'workspaceDiagnostics': True
+        }
+    return capabilities
@@ -4,7 +4,6 @@ from textx.exceptions import TextXSemanticError, TextXSyntaxError
 from textx.const import MULT_ASSIGN_ERROR, UNKNOWN_OBJ_ERROR
 from textx.lang import BASE_TYPE_RULES
 
-from ..utils import _utils
 from ..infrastructure.lsp import Completions, CompletionItemKind
 
 __author__ = "Daniel Elero"
@@ -22,38 +21,35 @@ EXCLUDE_FROM_COMPLETIONS = ['Not', 'EOF', 'Comment']
 def completions(doc_uri, workspace, position):
     """
     Returns completion items at current position.
-    If model is valid, FAKE_SYN_CHARS are added to make parsing errors.
+    If model is valid, expected rules are looked up in grammar tables,
+    or FAKE_SYN_CHARS are added after source prefix to make parsing
+    errors. Otherwise, errors of the whole document are already known.
     """
+    snapshot = workspace.get_snapshot(doc_uri)
     txdoc = workspace.get_document(doc_uri)
 
-    if txdoc is None:
+    if snapshot is None or txdoc is None:
         return
 
     comps = Completions()
-    offset = _utils.line_col_to_pos(txdoc.source, position)
+    offset = snapshot.line_index.line_col_to_pos(position)
 
-    source = txdoc.source
-    if txdoc.is_valid_model is True:
-        source = txdoc.source[:offset] + FAKE_SYN_CHARS + \
-            txdoc.source[offset:]
-
-    # Parse invalid model and get errors
-    syntax_errors, semantic_errors = \
-        txdoc.parse_model(source, False)
+    if snapshot.is_valid_model is True:
+        expected_rules = _get_expected_rules(txdoc, snapshot, offset)
+        semantic_errors = []
+    else:
+        expected_rules = _get_err_expected_rules(snapshot.syntax_errors,
+                                                 position['line'] + 1)
+        semantic_errors = snapshot.semantic_errors
 
-    def get_syn_err_com_items(syntax_errors):
-        items = []
-        if len(syntax_errors) > 0:
-            # Arrpegio currently returns just one error
-            err = syntax_errors[0]
-            items.extend(
-                [rule_to_exp_str(r)
-                    for r in err.expected_rules
-                    if rule_to_exp_str(r) not in EXCLUDE_FROM_COMPLETIONS])
+    def get_syn_err_com_items(expected_rules):
+        items = [rule_to_exp_str(r)
+                 for r in expected_rules
+                 if rule_to_exp_str(r) not in EXCLUDE_FROM_COMPLETIONS]
 
         # Check ID
-        if len(items) > 0 and items[0] == 'ID':
-            rule = txdoc.get_rule_inst_at_position(position)
+        if 'ID' in items:
+            rule = snapshot.get_rule_inst_at_position(position)
             if rule is not None:
                 _, meta_attr = first_from_ordered_dict(type(rule)._tx_attrs)
                 if meta_attr.ref:
@@ -69,7 +65,7 @@ def completions(doc_uri, workspace, position):
                     # If type of error is UNKNOWN_OBJ_ERROR
                     # Find all instances of expected class
                     # and offer their name attribute
-                    if txdoc.last_valid_model is None:
+                    if snapshot.last_valid_model is None:
                         return []
 
                     items.extend(_get_instances_of_cls(e.expected_obj_cls))
@@ -97,12 +93,12 @@ def completions(doc_uri, workspace, position):
         cls_names.extend(_get_parent_classes(cls))
         instances = []
         instances.extend([obj.name
-                          for obj in txdoc.get_all_rule_instances()
+                          for obj in snapshot.get_all_rule_instances()
                           if hasattr(obj, 'name') and
                           type(obj).__name__ in cls_names])
         return instances
 
-    for i in get_syn_err_com_items(syntax_errors):
+    for i in get_syn_err_com_items(expected_rules):
         comps.add_completion(i)
 
     for i in get_sem_err_com_items(semantic_errors):
@@ -114,6 +110,43 @@ def completions(doc_uri, workspace, position):
     }
 
 
+def _get_expected_rules(txdoc, snapshot, offset):
+    """
+    Expected rules after a keyword are looked up in grammar tables.
+    Otherwise, only source before the cursor is parsed, parser stops at
+    FAKE_SYN_CHARS anyway. Result is reused while prefix is not changed.
+    """
+    tables = txdoc.config.get_grammar_tables(txdoc.file_ext)
+    expected_rules = tables.expected_after(
+        snapshot.source, offset, snapshot.rule_tree,
+        txdoc.config.get_parse_budget(txdoc.file_ext))
+    if expected_rules is not None:
+        return sorted(expected_rules, key=rule_to_exp_str)
+
+    prefix = snapshot.source[:offset]
+    mm = txdoc.config.get_mm_by_ext(txdoc.file_ext)
+    cached_mm, cached_prefix, expected_rules = txdoc.prefix_expected
+    if cached_mm is mm and cached_prefix == prefix:
+        return expected_rules
+
+    _, syntax_errors, _ = txdoc.parse_source(prefix + FAKE_SYN_CHARS)
+    expected_rules = _get_err_expected_rules(syntax_errors)
+    txdoc.prefix_expected = (mm, prefix, expected_rules)
+    return expected_rules
+
+
+def _get_err_expected_rules(syntax_errors, line=None):
+    if len(syntax_errors) > 0:
+        # Errors are recovered, so use the last one before the cursor line
+        error = syntax_errors[0]
+        if line is not None:
+            for e in syntax_errors:
+                if e.line and e.line <= line:
+                    error = e
+        return getattr(error, 'expected_rules', [])
+    return []
+
+
 # Coppied from arpeggio
 def rule_to_exp_str(rule):
     if hasattr(rule, '_exp_str'):
@@ -0,0 +1,35 @@
+"""
+This module is responsible for document highlight feature.
+"""
+from ..infrastructure.lsp import DocumentHighlightKind
+
+
+__author__ = "Daniel Elero"
+__copyright__ = "textX-tools"
+__license__ = "MIT"
+
+
+def document_highlight(doc_uri, workspace, position):
+    """
+    Highlights referenced rule and all its references if cursor is on
+    the rule or on one of its references
+    """
+
+    snapshot = workspace.get_snapshot(doc_uri)
+    if snapshot is not None and snapshot.is_valid_model:
+
+        reference_map = snapshot.reference_map
+        def_span = snapshot.get_referenced_span_at_position(position)
+
+        if def_span is None or not reference_map.count(def_span):
+            return []
+
+        highlights = [{
+            'range': reference_map.to_range(*def_span),
+            'kind': DocumentHighlightKind.Text
+        }]
+        highlights.extend({
+            'range': ref_range,
+            'kind': DocumentHighlightKind.Read
+        } for ref_range in reference_map.references(def_span))
+        return highlights
@@ -1,9 +1,7 @@
 """
 This module is responsible for find all references feature.
 """
-import bisect
 
-from ..utils import _utils
 
 __author__ = "Daniel Elero"
 __copyright__ = "textX-tools"
@@ -12,34 +10,20 @@ __license__ = "MIT"
 
 def find_all_references(doc_uri, workspace, position, context):
     """
-    Iterates crossref list and store all rules that meet the
-    condition
+    Returns references of the rule at (or referenced at) cursor
+    position
     """
 
-    txdoc = workspace.get_document(doc_uri)
-    if txdoc is not None and txdoc.is_valid_model:
+    snapshot = workspace.get_snapshot(doc_uri)
+    if snapshot is not None and snapshot.is_valid_model:
 
-        # List of all references in model
-        crossref_list = txdoc.last_valid_model._pos_crossref_list
+        def_span = snapshot.get_referenced_span_at_position(position)
+        if def_span is None:
+            return []
 
-        rule = txdoc.get_rule_inst_at_position(position)
-
-        all_references = []
-        for ref_rule in crossref_list:
-            if ref_rule.def_pos_start == rule._tx_position and \
-               ref_rule.def_pos_end == rule._tx_position_end:
-                st_line, st_col = _utils.pos_to_line_col(
-                                    txdoc.source, ref_rule.ref_pos_start)
-                end_line, end_col = _utils.pos_to_line_col(
-                                     txdoc.source, ref_rule.ref_pos_end)
-                all_references.append((
-                    (st_line, st_col), (end_line, end_col)
-                ))
+        ranges = snapshot.reference_map.references(def_span)
 
         return [{
             'uri': doc_uri,
-            'range': {
-                'start': {'line': ref[0][0], 'character': ref[0][1]},
-                'end': {'line': ref[1][0], 'character': ref[1][1]}
-            }
-        } for ref in all_references]
+            'range': ref_range
+        } for ref_range in ranges]
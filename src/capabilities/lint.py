@@ -1,36 +1,180 @@
 """
 This module is responsible for linting document file.
 """
-from ..utils import _utils
-from ..infrastructure.lsp import Diagnostic
+from ..infrastructure.lsp import Diagnostic, DocumentDiagnosticReportKind
+from ..utils import uris
+from ..utils.file_source import file_sources
+from ..utils.line_index import LineIndex
 
 __author__ = "Daniel Elero"
 __copyright__ = "textX-tools"
 __license__ = "MIT"
 
 
-LINT_DEBOUNCE_S = 0.5
+def lint_all(doc_uris, workspace):
+    """
+    Publishes diagnostics of all documents at once
+
+    Called by the lint scheduler with documents whose debounce interval
+    has expired.
+    """
+    uri_diagnostics = []
+    for doc_uri in doc_uris:
+        snapshot = workspace.get_snapshot(doc_uri)
+        if snapshot is not None:
+            uri_diagnostics.append((doc_uri, get_diagnostics(snapshot)))
+
+    workspace.publish_all_diagnostics(uri_diagnostics)
+
+
+def lint_files(doc_uris, workspace, indexer):
+    """
+    Publishes diagnostics of closed files from their workspace index
+
+    Files which are opened are linted from their snapshots instead.
+    """
+    uri_diagnostics = []
+    for doc_uri in doc_uris:
+        path = uris.to_fs_path(doc_uri)
+        if workspace.get_document_by_path(path) is not None:
+            continue
+
+        file_index = indexer.get_file_index(path)
+        try:
+            diagnostics = file_diagnostics(file_index,
+                                           workspace.position_encoding)
+        except OSError:
+            # File is deleted
+            diagnostics = []
+        uri_diagnostics.append((doc_uri, diagnostics))
 
+    workspace.publish_all_diagnostics(uri_diagnostics)
 
-@_utils.debounce(LINT_DEBOUNCE_S)
-def lint(doc_uri, workspace):
+
+def file_diagnostics(file_index, encoding):
+    """
+    Create and return diagnostics of a closed file
+    """
+    if file_index is None or file_index.error is None:
+        return []
+
+    line_index = LineIndex(file_sources.read(file_index.path), encoding)
+    line, col = file_index.error_line, file_index.error_col
+    if line and col:
+        col = line_index.encode_col(line - 1, col - 1) + 1
+
+    diagnostic = Diagnostic()
+    diagnostic.error(line_index.lines or [''], line, col,
+                     file_index.error.split(' at')[0])
+    return diagnostic.get_diagnostics()
+
+
+def document_diagnostic(doc_uri, workspace, previous_result_id=None):
     """
-    Create and return diagnostic object which contains all parsing errors
+    Returns diagnostic report of the document for pull diagnostics
+
+    Result id is the id of the parse result, so if the document is not
+    parsed again since client's previous request, unchanged report is
+    returned without computing diagnostics.
     """
-    if doc_uri in workspace.documents:
-        diagnostic = Diagnostic()
-        txdoc = workspace.get_document(doc_uri)
-        errors = txdoc.all_errors
-        for e in errors:
-            try:
-                msg = e.args[0].decode("utf-8")
-                msg = msg.split(' at')[0]
-                if e.offset:
-                    line, col = _utils.pos_to_line_col(txdoc.source, e.offset)
-                    e.line = line
-                    e.col = col
-                diagnostic.error(txdoc.lines, e.line, e.col, msg)
-            except:
-                diagnostic.error(txdoc.lines, e.line, e.col, str(e))
+    snapshot = workspace.get_snapshot(doc_uri)
+    if snapshot is None:
+        return {'kind': DocumentDiagnosticReportKind.Full, 'items': []}
+    return _diagnostic_report(snapshot, previous_result_id)
+
+
+def _diagnostic_report(snapshot, previous_result_id):
+    result_id = str(snapshot.parse_id)
+    if result_id == previous_result_id:
+        return {'kind': DocumentDiagnosticReportKind.Unchanged,
+                'resultId': result_id}
 
-        workspace.publish_diagnostics(doc_uri, diagnostic.get_diagnostics())
+    return {'kind': DocumentDiagnosticReportKind.Full,
+            'resultId': result_id,
+            'items': get_diagnostics(snapshot)}
+
+
+def workspace_diagnostic(workspace, previous_result_ids=None, indexer=None):
+    """
+    Returns diagnostic reports of all opened documents, and of closed files
+    if workspace is indexed
+    """
+    # Key: document uri
+    # Value: result id of the client's previous report
+    previous = {r['uri']: r['value'] for r in previous_result_ids or []}
+
+    items = []
+    for doc_uri in list(workspace.documents):
+        snapshot = workspace.get_snapshot(doc_uri)
+        if snapshot is None:
+            continue
+        report = _diagnostic_report(snapshot, previous.get(doc_uri))
+        report['uri'] = doc_uri
+        report['version'] = snapshot.version
+        items.append(report)
+
+    if indexer is not None:
+        for file_index in indexer.files:
+            path = file_index.path
+            if workspace.get_document_by_path(path) is not None:
+                continue
+            doc_uri = uris.from_fs_path(path)
+            report = _file_diagnostic_report(
+                file_index, indexer.get_grammar_hash(path),
+                workspace.position_encoding, previous.get(doc_uri))
+            if report is None:
+                continue
+            report['uri'] = doc_uri
+            report['version'] = None
+            items.append(report)
+
+    return {'items': items}
+
+
+def _file_diagnostic_report(file_index, grammar_hash, encoding,
+                            previous_result_id):
+    # Diagnostics of closed file are the same until its content or
+    # grammar is changed
+    result_id = '{}:{}'.format(file_index.content_hash, grammar_hash)
+    if result_id == previous_result_id:
+        return {'kind': DocumentDiagnosticReportKind.Unchanged,
+                'resultId': result_id}
+
+    try:
+        items = file_diagnostics(file_index, encoding)
+    except OSError:
+        return None
+    return {'kind': DocumentDiagnosticReportKind.Full,
+            'resultId': result_id,
+            'items': items}
+
+
+def get_diagnostics(snapshot):
+    """
+    Create and return diagnostics which contain all parsing errors
+    """
+    diagnostic = Diagnostic()
+    line_index = snapshot.line_index
+    errors = snapshot.all_errors
+    for e in errors:
+        line, col = _error_position(e, line_index)
+        try:
+            msg = e.args[0].decode("utf-8")
+            msg = msg.split(' at')[0]
+            diagnostic.error(line_index.lines, line, col, msg)
+        except:
+            diagnostic.error(line_index.lines, line, col, str(e))
+
+    return diagnostic.get_diagnostics()
+
+
+def _error_position(e, line_index):
+    """
+    Returns 1-based line and column (in code units) of the error
+    """
+    if getattr(e, 'offset', None):
+        line, col = line_index.pos_to_line_col(e.offset)
+        return line + 1, col + 1
+    if e.line and e.col:
+        return e.line, line_index.encode_col(e.line - 1, e.col - 1) + 1
+    return e.line, e.col
@@ -0,0 +1,33 @@
+"""
+This module is responsible for workspace symbols feature.
+"""
+from ..infrastructure import lsp
+from ..utils import uris
+
+
+__author__ = "Daniel Elero"
+__copyright__ = "textX-tools"
+__license__ = "MIT"
+
+
+def workspace_symbols(workspace, query):
+    """
+    Returns named rule instances of the workspace which match the query
+    """
+    results = []
+    for path, symbol in workspace.symbol_index.search(query):
+        results.append({
+            'name': symbol.name,
+            'kind': lsp.SymbolKind.Class,
+            'containerName': symbol.kind,
+            'location': {
+                'uri': uris.from_fs_path(path),
+                'range': {
+                    'start': {'line': symbol.line,
+                              'character': symbol.col},
+                    'end': {'line': symbol.end_line,
+                            'character': symbol.end_col}
+                }
+            }
+        })
+    return results
@@ -26,12 +26,14 @@ def get_commands():
 
 def _get_outline_command(textx_ls, args):
     try:
-        txdoc = textx_ls.workspace.get_document(args[0]['uri']['external'])
-        if txdoc is not None:
+        snapshot = textx_ls.workspace.get_snapshot(
+            args[0]['uri']['external'])
+        if snapshot is not None:
             return OutlineTree(
-                    model_source=txdoc.source,
+                    model_source=snapshot.source,
                     outline_model=textx_ls.configuration.outline_model,
-                    current_model=txdoc.last_valid_model
+                    current_model=snapshot.last_valid_model,
+                    line_index=snapshot.line_index
                    ).make_tree()
     except:
         pass
@@ -5,7 +5,7 @@ outline tree data.
 import os
 from os.path import join, dirname
 
-from ..utils._utils import pos_to_line_col
+from ..utils.line_index import LineIndex
 from ..utils.uris import to_abs_path
 from json import JSONEncoder
 
@@ -37,8 +37,10 @@ class Node(object):
 
 
 class OutlineTree(object):
-    def __init__(self, model_source, outline_model, current_model):
+    def __init__(self, model_source, outline_model, current_model,
+                 line_index=None):
         self.model_source = model_source
+        self.line_index = line_index or LineIndex(model_source)
         self.outline_model = outline_model
         self.outline_path = dirname(outline_model._tx_filename)
         self.nodes = []
@@ -83,12 +85,10 @@ class OutlineTree(object):
                 if outline_rule.icon is not None:
                     icon = to_abs_path(self.outline_path,
                                        outline_rule.icon.path)
-                start_line, start_point_in_line = pos_to_line_col(
-                                                    self.model_source,
-                                                    rule._tx_position)
-                end_line, end_point_in_line = pos_to_line_col(
-                                                    self.model_source,
-                                                    rule._tx_position_end)
+                start_line, start_point_in_line = \
+                    self.line_index.pos_to_line_col(rule._tx_position)
+                end_line, end_point_in_line = \
+                    self.line_index.pos_to_line_col(rule._tx_position_end)
                 node = Node(rule_name, label, icon,
                             rule._tx_position, rule._tx_position_end,
                             start_line, start_point_in_line,
@@ -1,20 +1,29 @@
 """
 Module for reading configuration file
 """
+import logging
 import os
+import threading
 
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 from os.path import join, dirname
 
+import textx.lang
 from textx.metamodel import metamodel_from_file
 
 from ..utils import uris
-from ..utils._utils import flatten, exec_func_from_module
+from ..utils._utils import flatten, exec_func_from_module, get_mtime, \
+    get_module_mtime
 from ..utils.constants import TX_TX_EXTENSION,\
     TX_CONFIG_EXTENSION, TX_OUTLINE_EXTENSION, TX_COLORING_EXTENSION, \
     TX_MM, CONFIG_MM, COLORING_MM, OUTLINE_MM, \
     MM_PATH
 
+from .grammar_cache import grammar_hash, grammar_trees
+from .grammar_tables import GrammarTables
+
 from .. import LS_ROOT_PATH
 
 __author__ = "Daniel Elero"
@@ -22,6 +31,45 @@ __copyright__ = "textX-tools"
 __license__ = "MIT"
 
 
+log = logging.getLogger(__name__)
+
+WARM_UP_WORKERS = 2
+
+
+class _ThreadLocalParsers(threading.local):
+    """
+    textX caches the parser of its grammar language in a module level dict
+    and the parser keeps its state while parsing a grammar, so two threads
+    could not compile grammars at the same time. Each thread gets its own
+    parser instead, and metamodels of different languages are built in
+    parallel.
+    """
+
+    def __init__(self):
+        # Key: debug flag
+        # Value: textX grammar parser
+        self.parsers = {}
+
+    def __contains__(self, debug):
+        return debug in self.parsers
+
+    def __getitem__(self, debug):
+        return self.parsers[debug]
+
+    def __setitem__(self, debug, parser):
+        if not debug:
+            # Debug parser exports parse trees, it has to parse
+            grammar_trees.attach(parser)
+        self.parsers[debug] = parser
+
+
+textx.lang.textX_parsers = _ThreadLocalParsers()
+
+
+# Used if parse budget is not set in .txconfig file
+DEFAULT_PARSE_BUDGET_S = 5
+
+
 class Configuration(object):
 
     def __init__(self, root_uri):
@@ -29,15 +77,6 @@ class Configuration(object):
         self.txconfig_uri = join(root_uri, TX_CONFIG_EXTENSION)
         self.config_model = None
 
-        self._loader = \
-            lambda path, classes=[], builtins={}, match_filters={}: \
-            metamodel_from_file(join(LS_ROOT_PATH,
-                                     MM_PATH,
-                                     path),
-                                textx_tools_support=True,
-                                classes=classes,
-                                builtins=builtins)
-
         self.languages = [
             ([TX_TX_EXTENSION], partial(self._loader, TX_MM)),
             ([TX_CONFIG_EXTENSION], partial(self._loader, CONFIG_MM)),
@@ -46,9 +85,31 @@ class Configuration(object):
         ]
         self.builtin_lang_len = len(self.languages)
 
+        # Key: extension
+        # Value: (cache key, metamodel)
+        self._mm_cache = {}
+        # Metamodels are built once, other callers wait for it
+        self._mm_locks = {}
+        self._mm_locks_guard = threading.Lock()
+
+        # Key: extension
+        # Value: (metamodel, grammar tables)
+        self._grammar_tables = {}
+
+        # Key: extension
+        # Value: number of parses stopped because of parse budget
+        self.parse_budget_overruns = Counter()
+
         self.load_configuration()
 
+    def _loader(self, path, classes=[], builtins={}, match_filters={}):
+        return metamodel_from_file(join(LS_ROOT_PATH, MM_PATH, path),
+                                   textx_tools_support=True,
+                                   classes=classes,
+                                   builtins=builtins)
+
     def load_configuration(self):
+        self.invalidate_mm_cache()
         try:
             self.config_model = self.get_mm_by_ext(TX_CONFIG_EXTENSION) \
                                     .model_from_file(self.txconfig_uri)
@@ -62,11 +123,80 @@ class Configuration(object):
             if ext in dsl_exts:
                 return mm_loader
 
+    @staticmethod
+    def _loader_grammar_path(mm_loader):
+        return join(LS_ROOT_PATH, MM_PATH, mm_loader.args[0])
+
+    def _mm_cache_key(self, ext, mm_loader):
+        """
+        Metamodel has to be rebuilt if grammar or processors are changed
+        """
+        grammar_path = self._loader_grammar_path(mm_loader)
+        key = [ext, grammar_path, get_mtime(grammar_path)]
+
+        if self._is_user_lang_ext(ext):
+            for path in (self.object_processors_path,
+                         self.model_processors_path):
+                key.extend((path, get_module_mtime(path)))
+
+        return tuple(key)
+
+    def get_grammar_hash(self, ext):
+        """
+        Returns hash of grammar content and textX version for extension
+        """
+        mm_loader = self._get_mm_loader_by_ext(ext)
+        if mm_loader is None:
+            return None
+
+        try:
+            with open(self._loader_grammar_path(mm_loader), 'rb') as f:
+                return grammar_hash(f.read().decode('utf-8'))
+        except (OSError, UnicodeDecodeError):
+            return None
+
+    def _is_user_lang_ext(self, ext):
+        return self.config_model is not None \
+            and ext in self.language_extensions
+
+    def invalidate_mm_cache(self):
+        self._mm_cache = {}
+        self._grammar_tables = {}
+
+    def _get_cached_mm(self, ext, key):
+        try:
+            cached_key, cached_mm = self._mm_cache[ext]
+            if cached_key == key:
+                return cached_mm
+        except KeyError:
+            pass
+
+    def _get_mm_lock(self, ext):
+        with self._mm_locks_guard:
+            return self._mm_locks.setdefault(ext, threading.Lock())
+
     def get_mm_by_ext(self, ext):
-        mm = self._get_mm_loader_by_ext(ext)()
+        mm_loader = self._get_mm_loader_by_ext(ext)
+        key = self._mm_cache_key(ext, mm_loader)
+
+        mm = self._get_cached_mm(ext, key)
+        if mm is not None:
+            return mm
+
+        with self._get_mm_lock(ext):
+            # Metamodel could be built while waiting for the lock
+            mm = self._get_cached_mm(ext, key)
+            if mm is not None:
+                return mm
+
+            mm = self._build_mm(ext, mm_loader)
+            self._mm_cache[ext] = (key, mm)
+            return mm
+
+    def _build_mm(self, ext, mm_loader):
+        mm = mm_loader()
         # Assign object and model processors
-        if self.config_model is not None \
-                and ext in self.language_extensions:
+        if self._is_user_lang_ext(ext):
 
             if self.object_processors_path:
                 obj_proc = exec_func_from_module(self.object_processors_path,
@@ -82,6 +212,38 @@ class Configuration(object):
 
         return mm
 
+    def get_grammar_tables(self, ext):
+        """
+        Returns FIRST/FOLLOW tables of the current metamodel for extension
+        """
+        mm = self.get_mm_by_ext(ext)
+        try:
+            cached_mm, tables = self._grammar_tables[ext]
+            if cached_mm is mm:
+                return tables
+        except KeyError:
+            pass
+
+        tables = GrammarTables(mm)
+        self._grammar_tables[ext] = (mm, tables)
+        return tables
+
+    def warm_up(self):
+        """
+        Builds metamodels of all languages in background.
+        Requests for a metamodel wait only until that one is built.
+        """
+        executor = ThreadPoolExecutor(max_workers=WARM_UP_WORKERS)
+        for dsl_exts, _ in self.languages:
+            executor.submit(self._warm_up_mm, dsl_exts[0])
+        executor.shutdown(wait=False)
+
+    def _warm_up_mm(self, ext):
+        try:
+            self.get_grammar_tables(ext)
+        except:
+            log.debug("Warm up of %s metamodel failed.", ext)
+
     def load_metamodel(self):
         classes = exec_func_from_module(self.classes_path,
                                         "_custom_classes")
@@ -105,6 +267,13 @@ class Configuration(object):
     def get_all_extensions(self):
         return flatten([ext for ext, _ in self.languages])
 
+    def get_parse_budget(self, ext):
+        """
+        Only user language can be slow to parse
+        """
+        if self._is_user_lang_ext(ext):
+            return self.parse_budget
+
     @property
     def language_name(self):
         return self.config_model.name
@@ -160,6 +329,14 @@ class Configuration(object):
         except:
             pass
 
+    @property
+    def parse_budget(self):
+        try:
+            return self.config_model.parser_section.parse_budget or \
+                DEFAULT_PARSE_BUDGET_S
+        except:
+            return DEFAULT_PARSE_BUDGET_S
+
     @property
     def generate_path(self):
         path = self.config_model.paths_section.generate_path
@@ -0,0 +1,245 @@
+"""
+Module for persisting parse trees of textX grammars between server runs.
+
+Most of the time of building a metamodel is spent on parsing its grammar
+with the textX grammar parser. Parse trees are stored on disk and the
+metamodel is built from the stored tree, so grammars which are not
+changed since the last run are not parsed again.
+
+Metamodels themselves can not be stored, their classes are created at
+run time.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+import arpeggio
+import textx
+
+from arpeggio import EndOfFile, NonTerminal, Terminal
+
+__author__ = "Daniel Elero"
+__copyright__ = "textX-tools"
+__license__ = "MIT"
+
+
+log = logging.getLogger(__name__)
+
+CACHE_DIR_NAME = 'textxls'
+CACHE_FILE_EXTENSION = '.grammar.json'
+# Oldest trees are removed when there are more of them (e.g. after many
+# edits of a grammar)
+MAX_CACHED_TREES = 64
+
+_NON_TERMINAL = 0
+_TERMINAL = 1
+# Arpeggio makes a new rule for each end of file match
+_EOF_RULE = -1
+
+
+def default_cache_dir():
+    cache_home = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, CACHE_DIR_NAME)
+
+
+def grammar_hash(grammar):
+    """
+    Returns hash of grammar content and textX and Arpeggio versions
+    """
+    sha = hashlib.sha1(grammar.encode('utf-8'))
+    versions = '{}-{}'.format(getattr(textx, '__version__', ''),
+                              getattr(arpeggio, '__version__', ''))
+    sha.update(versions.encode('utf-8'))
+    return sha.hexdigest()
+
+
+def parser_rules(parser):
+    """
+    Returns all parsing expressions of the parser, always in the same
+    order for the same grammar
+    """
+    rules = []
+    visited = set()
+    stack = [parser.comments_model, parser.parser_model]
+    while stack:
+        rule = stack.pop()
+        if rule is None or id(rule) in visited:
+            continue
+        visited.add(id(rule))
+        rules.append(rule)
+        stack.extend(reversed(rule.nodes))
+    return rules
+
+
+def tree_to_list(tree, rule_indexes):
+    """
+    Returns nodes of the parse tree in pre-order, as lists of plain values
+    """
+    nodes = []
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if isinstance(node.rule, EndOfFile):
+            rule = rule_indexes.get(id(node.rule), _EOF_RULE)
+        else:
+            rule = rule_indexes[id(node.rule)]
+        if isinstance(node, Terminal):
+            nodes.append([_TERMINAL, rule, node.position, node.value,
+                          node.suppress])
+        else:
+            nodes.append([_NON_TERMINAL, rule, node.position, len(node)])
+            stack.extend(reversed(node))
+    return nodes
+
+
+def list_to_tree(nodes, rules):
+    """
+    Builds parse tree from nodes returned by tree_to_list
+    """
+    # Non-terminals whose children are not all built yet, with the number
+    # of missing children
+    stack = []
+    root = None
+    for values in nodes:
+        rule = EndOfFile() if values[1] == _EOF_RULE else rules[values[1]]
+        if values[0] == _TERMINAL:
+            _, _, position, value, suppress = values
+            node = Terminal(rule, position, value, suppress=suppress)
+        else:
+            _, _, position, count = values
+            node = NonTerminal(rule, [])
+            node.position = position
+            stack.append([node, count])
+
+        if root is None:
+            root = node
+        else:
+            # Parent is the last non-terminal which still needs children
+            i = len(stack) - (2 if values[0] == _NON_TERMINAL else 1)
+            stack[i][0].append(node)
+            stack[i][1] -= 1
+
+        while stack and stack[-1][1] == 0:
+            stack.pop()
+    return root
+
+
+class GrammarTreeCache(object):
+    """
+    Parse trees of grammars stored on disk, keyed by grammar hash.
+
+    Rules of tree nodes are stored as indexes of parsing expressions of
+    the textX grammar parser, which is the same for the same textX
+    version (and that is a part of the key).
+    """
+
+    def __init__(self, cache_dir=None):
+        self._cache_dir = cache_dir
+        # Number of grammars parsed and loaded from disk
+        self.misses = 0
+        self.hits = 0
+
+    @property
+    def cache_dir(self):
+        return self._cache_dir or default_cache_dir()
+
+    def _cache_file(self, key):
+        return os.path.join(self.cache_dir, key + CACHE_FILE_EXTENSION)
+
+    def attach(self, parser):
+        """
+        Makes the textX grammar parser read parse trees from the cache
+        """
+        parse = parser.parse
+        rules = parser_rules(parser)
+        rule_indexes = {id(rule): i for i, rule in enumerate(rules)}
+
+        def _parse_cached(grammar, file_name=None):
+            key = grammar_hash(grammar)
+            tree = self.load(key, rules)
+            if tree is not None:
+                # Grammar parser reports positions of semantic errors
+                parser.input = grammar
+                parser.file_name = file_name
+                parser.line_ends = []
+                parser.parse_tree = tree
+                return tree
+
+            tree = parse(grammar, file_name)
+            self.store(key, tree, rule_indexes)
+            return tree
+
+        parser.parse = _parse_cached
+
+    def load(self, key, rules):
+        cache_file = self._cache_file(key)
+        try:
+            with open(cache_file, 'r') as f:
+                nodes = json.load(f)
+            tree = list_to_tree(nodes, rules)
+        except OSError:
+            self.misses += 1
+            return None
+        except Exception:
+            log.debug("Removing invalid grammar cache %s", cache_file)
+            self.misses += 1
+            self._remove(cache_file)
+            return None
+
+        self.hits += 1
+        try:
+            # Recently used trees are removed last
+            os.utime(cache_file)
+        except OSError:
+            pass
+        return tree
+
+    def store(self, key, tree, rule_indexes):
+        try:
+            data = json.dumps(tree_to_list(tree, rule_indexes),
+                              separators=(',', ':'))
+        except KeyError:
+            # Node made by a rule which is not in the parser model
+            log.debug("Grammar parse tree can not be cached.")
+            return False
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Write to temp file first, so other servers never read
+            # partially written tree
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+            with os.fdopen(fd, 'w') as f:
+                f.write(data)
+            os.replace(tmp_path, self._cache_file(key))
+        except OSError:
+            log.debug("Could not write grammar cache %s", key)
+            return False
+
+        self._prune()
+        return True
+
+    def _prune(self):
+        try:
+            paths = [os.path.join(self.cache_dir, name)
+                     for name in os.listdir(self.cache_dir)
+                     if name.endswith(CACHE_FILE_EXTENSION)]
+            if len(paths) <= MAX_CACHED_TREES:
+                return
+            paths.sort(key=os.path.getmtime)
+        except OSError:
+            return
+        for path in paths[:len(paths) - MAX_CACHED_TREES]:
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+grammar_trees = GrammarTreeCache()
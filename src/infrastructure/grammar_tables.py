@@ -0,0 +1,207 @@
+"""
+Module for computing FIRST/FOLLOW tables from the compiled metamodel
+"""
+from arpeggio import Match, StrMatch, Sequence, OrderedChoice, Optional, \
+    ZeroOrMore, OneOrMore, UnorderedGroup, SyntaxPredicate, Decorator, \
+    EndOfFile, NonTerminal, NoMatch, RegExMatch
+
+from textx.exceptions import TextXSyntaxError
+
+from .parse_scheduler import ParseBudgetExceeded, set_parse_budget
+
+__author__ = "Daniel Elero"
+__copyright__ = "textX-tools"
+__license__ = "MIT"
+
+
+class GrammarTables(object):
+    """
+    FIRST and FOLLOW sets of terminals for every parsing expression
+    of the metamodel parser.
+
+    Sets are used to answer what is expected after a keyword without
+    parsing the whole model. Text which looks like a keyword can be an ID,
+    a part of a string or a comment, so only the rule instance around it
+    is parsed to find out which keyword expression (if any) matched it.
+
+    Operands of syntax predicates (! and &) never consume input, so they
+    are not in the tables.
+    """
+
+    def __init__(self, metamodel):
+        self.metamodel = metamodel
+        self.root = metamodel.parser.parser_model
+
+        self._exprs = []
+        self._collect(self.root)
+
+        self.nullable = set()
+        # Key: id of parsing expression
+        # Value: set of terminals
+        self.first = {id(e): set() for e in self._exprs}
+        self.follow = {id(e): set() for e in self._exprs}
+
+        self._compute_first()
+        self._compute_follow()
+
+        # Keywords of the grammar, to parse only when source ends with one
+        self.keywords = set(e.to_match for e in self._exprs
+                            if isinstance(e, StrMatch))
+
+    def _collect(self, root):
+        visited = set()
+        stack = [root]
+        while stack:
+            expr = stack.pop()
+            if id(expr) in visited:
+                continue
+            visited.add(id(expr))
+            self._exprs.append(expr)
+            if isinstance(expr, SyntaxPredicate):
+                continue
+            stack.extend(expr.nodes)
+            if getattr(expr, 'sep', None) is not None:
+                stack.append(expr.sep)
+
+    def _first_of_seq(self, exprs):
+        """
+        Returns FIRST set of expressions sequence and if it is nullable
+        """
+        first = set()
+        for e in exprs:
+            first |= self.first[id(e)]
+            if id(e) not in self.nullable:
+                return first, False
+        return first, True
+
+    def _compute_first(self):
+        changed = True
+        while changed:
+            changed = False
+            for e in self._exprs:
+                first, nullable = self._expr_first(e)
+                if not first <= self.first[id(e)]:
+                    self.first[id(e)] |= first
+                    changed = True
+                if nullable and id(e) not in self.nullable:
+                    self.nullable.add(id(e))
+                    changed = True
+
+    def _expr_first(self, e):
+        if isinstance(e, Match):
+            # Regular expression can match empty string (e.g. /[^']*/)
+            return {e}, isinstance(e, RegExMatch) and \
+                e.regex.match('') is not None
+        elif isinstance(e, SyntaxPredicate):
+            # Predicates do not consume input
+            return set(), True
+        elif isinstance(e, OrderedChoice) or isinstance(e, UnorderedGroup):
+            first = set()
+            for n in e.nodes:
+                first |= self.first[id(n)]
+            if isinstance(e, OrderedChoice):
+                nullable = any(id(n) in self.nullable for n in e.nodes)
+            else:
+                nullable = all(id(n) in self.nullable for n in e.nodes)
+            return first, nullable
+        elif isinstance(e, (Optional, ZeroOrMore)):
+            return set(self.first[id(e.nodes[0])]), True
+        elif isinstance(e, OneOrMore):
+            n = e.nodes[0]
+            return set(self.first[id(n)]), id(n) in self.nullable
+        elif isinstance(e, (Sequence, Decorator)):
+            return self._first_of_seq(e.nodes)
+        return set(), True
+
+    def _compute_follow(self):
+        changed = True
+        while changed:
+            changed = False
+            for e in self._exprs:
+                for child, follow in self._children_follow(e):
+                    if not follow <= self.follow[id(child)]:
+                        self.follow[id(child)] |= follow
+                        changed = True
+
+    def _children_follow(self, e):
+        """
+        Yields (child, terminals which can follow the child in e)
+        """
+        e_follow = self.follow[id(e)]
+        if isinstance(e, (Match, SyntaxPredicate)):
+            return
+        elif isinstance(e, (ZeroOrMore, OneOrMore, UnorderedGroup)):
+            sep = getattr(e, 'sep', None)
+            for n in e.nodes:
+                if isinstance(e, UnorderedGroup):
+                    next_first = set()
+                    for other in e.nodes:
+                        next_first |= self.first[id(other)]
+                else:
+                    next_first = self.first[id(n)]
+                if sep is not None:
+                    yield sep, next_first
+                    next_first = self.first[id(sep)]
+                yield n, next_first | e_follow
+        elif isinstance(e, (Sequence, Decorator)) and \
+                not isinstance(e, OrderedChoice):
+            for i, n in enumerate(e.nodes):
+                first, nullable = self._first_of_seq(e.nodes[i + 1:])
+                yield n, first | e_follow if nullable else first
+        else:
+            # Ordered choice and optional
+            for n in e.nodes:
+                yield n, e_follow
+
+    def expected_after(self, source, offset, rule_tree, budget=None):
+        """
+        Returns terminals expected after the source prefix of a valid
+        model, or None if the prefix does not end with a keyword and has
+        to be parsed.
+        """
+        end = len(source[:offset].rstrip())
+        if not end:
+            return self.first[id(self.root)]
+
+        if not any(source.endswith(kw, 0, end) for kw in self.keywords):
+            return None
+
+        keyword = self._keyword_at(source, end, rule_tree, budget)
+        if keyword is None:
+            return None
+        return self.follow[id(keyword)]
+
+    def _keyword_at(self, source, end, rule_tree, budget):
+        """
+        Returns keyword expression which matched the token that ends at
+        the offset, found by parsing the innermost rule instance around it
+        """
+        rule = rule_tree.innermost(end - 1)
+        # Parsing the model rule is not faster than parsing the prefix
+        if rule is None or not hasattr(rule, 'parent'):
+            return None
+
+        start = rule._tx_position
+        parser = self.metamodel.parser.clone()
+        parser.parser_model = Sequence(
+            nodes=[type(rule)._tx_peg_rule, EndOfFile()],
+            rule_name='Model', root=True)
+        if budget:
+            set_parse_budget(parser, budget)
+        try:
+            node = parser.parse(source[start:rule._tx_position_end])
+        except (NoMatch, TextXSyntaxError, ParseBudgetExceeded):
+            return None
+
+        # Last terminal which ends at the offset
+        end -= start
+        while isinstance(node, NonTerminal):
+            children = [n for n in node
+                        if n.position < end <= n.position_end]
+            if not children:
+                return None
+            node = children[-1]
+
+        if node.position_end == end and isinstance(node.rule, StrMatch) \
+                and id(node.rule) in self.follow:
+            return node.rule
@@ -0,0 +1,296 @@
+"""
+This module is responsible for reparsing only the edited part of a model.
+
+Edited region is mapped onto the top-level rule instance which encloses it.
+Only that instance is parsed again and spliced into a copy of the previous
+model. If that is not possible, IncrementalParseError is raised and the
+whole model has to be parsed.
+"""
+import copy
+
+from collections import Counter, OrderedDict
+
+from arpeggio import Sequence, EndOfFile
+from textx.model import RefRulePosition
+from textx.scoping.tools import textx_isinstance
+
+from .parse_scheduler import ParseBudgetExceeded, set_parse_budget
+
+__author__ = "Daniel Elero"
+__copyright__ = "textX-tools"
+__license__ = "MIT"
+
+
+# Attributes which textX sets only on the root of the model
+MODEL_ONLY_ATTRS = ['_tx_filename', '_tx_metamodel', '_tx_parser',
+                    '_pos_rule_dict', '_pos_crossref_list']
+
+
+class IncrementalParseError(Exception):
+    """
+    Raised when edited region can not be reparsed on its own
+    """
+
+
+def common_prefix_len(a, b):
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        # Prefix up to lo is already known to be equal
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def common_suffix_len(a, b, max_len):
+    lo, hi = 0, max_len
+    la, lb = len(a), len(b)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[la - mid:la - lo] == b[lb - mid:lb - lo]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def changed_region(old_source, new_source):
+    """
+    Returns start of the changed region and its end in old and new source
+    """
+    start = common_prefix_len(old_source, new_source)
+    max_suffix = min(len(old_source), len(new_source)) - start
+    suffix = common_suffix_len(old_source, new_source, max_suffix)
+    return start, len(old_source) - suffix, len(new_source) - suffix
+
+
+def _contained_objects(obj):
+    """
+    Returns obj and all model objects it contains
+    """
+    objs = []
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        objs.append(o)
+        for attr_name, attr in getattr(type(o), '_tx_attrs', {}).items():
+            if not attr.cont:
+                continue
+            value = getattr(o, attr_name, None)
+            values = value if isinstance(value, list) else [value]
+            stack.extend(v for v in values if hasattr(v, '_tx_position'))
+    return objs
+
+
+def _top_level_instance(model, start, end):
+    """
+    Returns instance contained directly in model root which encloses
+    the region (first and last char of the instance are not changed)
+    """
+    for attr_name, attr in type(model)._tx_attrs.items():
+        if not attr.cont:
+            continue
+        value = getattr(model, attr_name, None)
+        values = value if isinstance(value, list) else [value]
+        for v in values:
+            if hasattr(v, '_tx_position') and \
+                    v._tx_position < start and end < v._tx_position_end:
+                return v
+
+    raise IncrementalParseError("Edit is not inside a top-level instance.")
+
+
+def _named_key(obj):
+    name = getattr(obj, 'name', None)
+    if isinstance(name, str):
+        return type(obj), name
+
+
+def reparse_region(metamodel, old_model, old_source, new_source,
+                   budget=None):
+    """
+    Returns new model where only the edited top-level instance is parsed.
+    Previous model is not changed.
+    """
+    if metamodel.obj_processors or metamodel._model_processors or \
+            metamodel.scope_providers:
+        # They can depend on the whole model
+        raise IncrementalParseError("Processors or scope providers are used.")
+
+    if old_source == new_source:
+        return old_model
+
+    edit_start, edit_old_end, _ = changed_region(old_source, new_source)
+    old_inst = _top_level_instance(old_model, edit_start, edit_old_end)
+
+    region_start = old_inst._tx_position
+    region_end = old_inst._tx_position_end
+    delta = len(new_source) - len(old_source)
+
+    old_region_objs = _contained_objects(old_inst)
+    region_ids = set(id(o) for o in old_region_objs)
+    # Objects with the same position as their parent are not in the
+    # position dict, so the whole model is walked
+    outside_objs = [o for o in _contained_objects(old_model)
+                    if id(o) not in region_ids and o is not old_model]
+    outside_ids = set(id(o) for o in outside_objs)
+
+    outside_by_name = {}
+    for o in outside_objs:
+        key = _named_key(o)
+        if key is not None:
+            outside_by_name.setdefault(key[1], []).append(o)
+
+    fragment_by_name = {}
+    # Key: relative position of cross-reference
+    # Value: referenced object
+    ref_targets = {}
+
+    def _shift_fragment(fragment):
+        for o in _contained_objects(fragment):
+            o._tx_position += region_start
+            o._tx_position_end += region_start
+            key = _named_key(o)
+            if key is not None:
+                fragment_by_name.setdefault(key[1], []).append(o)
+
+    def _resolve(obj, attr, obj_ref):
+        candidates = [o for o in fragment_by_name.get(obj_ref.obj_name, []) +
+                      outside_by_name.get(obj_ref.obj_name, [])
+                      if textx_isinstance(o, obj_ref.cls)]
+        if len(candidates) > 1:
+            raise IncrementalParseError("Name is not unique.")
+        if candidates:
+            ref_targets[obj_ref.position] = candidates[0]
+            return candidates[0]
+
+    fragment_mm = copy.copy(metamodel)
+    fragment_mm.scope_providers = {'*.*': _resolve}
+
+    parser = metamodel.parser.clone()
+    parser.metamodel = fragment_mm
+    parser.parser_model = Sequence(
+        nodes=[type(old_inst)._tx_peg_rule, EndOfFile()],
+        rule_name='Model', root=True)
+    if budget:
+        set_parse_budget(parser, budget)
+
+    try:
+        new_inst = parser.get_model_from_str(
+            new_source[region_start:region_end + delta],
+            pre_ref_resolution_callback=_shift_fragment)
+    except (IncrementalParseError, ParseBudgetExceeded):
+        # Budget is not renewed for the full parse
+        raise
+    except Exception as e:
+        raise IncrementalParseError(str(e))
+
+    fragment_crossrefs = new_inst._pos_crossref_list
+    for attr_name in MODEL_ONLY_ATTRS:
+        if attr_name in new_inst.__dict__:
+            delattr(new_inst, attr_name)
+
+    new_region_objs = _contained_objects(new_inst)
+
+    # Names in the region have to stay the same, otherwise references
+    # from the rest of the model could be resolved differently
+    old_names = Counter(filter(None, map(_named_key, old_region_objs)))
+    new_names = Counter(filter(None, map(_named_key, new_region_objs)))
+    if old_names != new_names:
+        raise IncrementalParseError("Names in edited region are changed.")
+
+    # Old region objects are replaced with new ones while copying
+    memo = {id(old_inst): new_inst}
+    new_by_key = {_named_key(o): o for o in new_region_objs
+                  if new_names[_named_key(o)] == 1}
+    for o in old_region_objs:
+        key = _named_key(o)
+        if key in new_by_key:
+            memo[id(o)] = new_by_key[key]
+
+    old_crossrefs = old_model._pos_crossref_list
+    for ref in old_crossrefs:
+        if region_start <= ref.ref_pos_start < region_end:
+            continue
+        target = old_model._pos_rule_dict.get((ref.def_pos_start,
+                                               ref.def_pos_end))
+        if id(target) in region_ids and id(target) not in memo:
+            raise IncrementalParseError("Referenced object is changed.")
+
+    def _shift(pos):
+        return pos + delta if pos >= region_end else pos
+
+    # Objects outside the region are copied one by one (not recursively,
+    # models can be nested deeper than the recursion limit), so the
+    # previous model is not changed
+    copies = []
+    for o in [old_model] + outside_objs:
+        o_copy = copy.copy(o)
+        o_copy._tx_position = _shift(o._tx_position)
+        o_copy._tx_position_end = _shift(o._tx_position_end)
+        memo[id(o)] = o_copy
+        copies.append(o_copy)
+    new_model = memo[id(old_model)]
+
+    def _copy_of(o):
+        return memo.get(id(o), o)
+
+    def _remap(o, cont):
+        """
+        Points attributes of the object to copied objects
+        """
+        for attr_name, attr in type(o)._tx_attrs.items():
+            if attr.cont and not cont:
+                continue
+            value = getattr(o, attr_name, None)
+            if isinstance(value, list):
+                setattr(o, attr_name, [_copy_of(v) for v in value])
+            else:
+                setattr(o, attr_name, _copy_of(value))
+        if 'parent' in o.__dict__:
+            o.parent = _copy_of(o.parent)
+
+    for o in copies:
+        _remap(o, cont=True)
+    # New objects reference objects of the previous model
+    for o in new_region_objs:
+        _remap(o, cont=False)
+    if hasattr(old_inst, 'parent'):
+        new_inst.parent = _copy_of(old_inst.parent)
+
+    # Parent rule instance wins if positions are the same, as in textX
+    new_objs = [_copy_of(o) for o in old_model._pos_rule_dict.values()
+                if id(o) in outside_ids or o is old_model]
+    new_objs.extend(reversed(new_region_objs))
+    new_model._pos_rule_dict = OrderedDict(sorted(
+        (((o._tx_position, o._tx_position_end), o) for o in new_objs),
+        key=lambda x: x[0], reverse=True))
+
+    crossrefs = []
+    for ref in old_crossrefs:
+        if region_start <= ref.ref_pos_start < region_end:
+            continue
+        target = _copy_of(old_model._pos_rule_dict.get(
+            (ref.def_pos_start, ref.def_pos_end)))
+        crossrefs.append(RefRulePosition(
+            name=ref.name,
+            ref_pos_start=_shift(ref.ref_pos_start),
+            ref_pos_end=_shift(ref.ref_pos_end),
+            def_pos_start=getattr(target, '_tx_position',
+                                  _shift(ref.def_pos_start)),
+            def_pos_end=getattr(target, '_tx_position_end',
+                                _shift(ref.def_pos_end))))
+    for ref in fragment_crossrefs:
+        target = _copy_of(ref_targets[ref.ref_pos_start])
+        crossrefs.append(RefRulePosition(
+            name=ref.name,
+            ref_pos_start=ref.ref_pos_start + region_start,
+            ref_pos_end=ref.ref_pos_end + region_start,
+            def_pos_start=target._tx_position,
+            def_pos_end=target._tx_position_end))
+    crossrefs.sort(key=lambda ref: ref.ref_pos_start)
+    new_model._pos_crossref_list = crossrefs
+
+    return new_model
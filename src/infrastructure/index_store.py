@@ -0,0 +1,230 @@
+"""
+Module for persisting workspace index between server runs
+"""
+import logging
+import os
+import sqlite3
+import threading
+
+from .indexer import FileIndex, Symbol, Reference
+from .lsp import PositionEncodingKind
+
+__author__ = "Daniel Elero"
+__copyright__ = "textX-tools"
+__license__ = "MIT"
+
+
+log = logging.getLogger(__name__)
+
+INDEX_DIR_NAME = '.textxls'
+INDEX_FILE_NAME = 'index.sqlite'
+
+# Increase when tables are changed, old index is dropped then
+SCHEMA_VERSION = 3
+
+# Writes of indexed files are committed in batches, after this many
+# writes or this many seconds after the first uncommitted one
+COMMIT_EVERY = 100
+COMMIT_INTERVAL = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime INTEGER,
+    size INTEGER,
+    content_hash TEXT,
+    grammar_hash TEXT,
+    error TEXT,
+    error_line INTEGER,
+    error_col INTEGER
+);
+CREATE TABLE IF NOT EXISTS symbols (
+    path TEXT,
+    name TEXT,
+    kind TEXT,
+    start_pos INTEGER,
+    end_pos INTEGER,
+    line INTEGER,
+    col INTEGER,
+    end_line INTEGER,
+    end_col INTEGER
+);
+CREATE TABLE IF NOT EXISTS refs (
+    path TEXT,
+    name TEXT,
+    start_pos INTEGER,
+    end_pos INTEGER,
+    def_start INTEGER,
+    def_end INTEGER
+);
+CREATE TABLE IF NOT EXISTS settings (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS symbols_path ON symbols (path);
+CREATE INDEX IF NOT EXISTS symbols_name ON symbols (name);
+CREATE INDEX IF NOT EXISTS refs_path ON refs (path);
+"""
+
+
+def default_index_path(root_path):
+    return os.path.join(root_path, INDEX_DIR_NAME, INDEX_FILE_NAME)
+
+
+class IndexStore(object):
+    """
+    SQLite database with symbols and references of indexed files.
+
+    Each file is stored with its mtime, size, content hash and hash of the
+    grammar it was parsed with, so on the next start only files which are
+    changed (or whose grammar is changed) have to be parsed again.
+
+    Symbol ranges are in code units of the position encoding, index stored
+    with another encoding is dropped.
+
+    Writes are committed in batches (see COMMIT_EVERY and COMMIT_INTERVAL),
+    so indexing a large workspace does not sync the database per file.
+    """
+
+    def __init__(self, db_path, position_encoding=PositionEncodingKind.UTF16,
+                 commit_every=COMMIT_EVERY, commit_interval=COMMIT_INTERVAL):
+        self.db_path = db_path
+        self.position_encoding = position_encoding
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self._lock = threading.Lock()
+        # Number of writes since the last commit
+        self._uncommitted = 0
+        self._commit_timer = None
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # Connection is used from indexer threads, access is serialized
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._create_schema()
+
+    def _create_schema(self):
+        with self._lock, self._conn:
+            version = self._conn.execute('PRAGMA user_version').fetchone()[0]
+            if version != SCHEMA_VERSION:
+                for table in ('files', 'symbols', 'refs'):
+                    self._conn.execute('DROP TABLE IF EXISTS ' + table)
+            self._conn.executescript(SCHEMA)
+            self._conn.execute(
+                'PRAGMA user_version = {}'.format(SCHEMA_VERSION))
+
+            row = self._conn.execute(
+                "SELECT value FROM settings WHERE name = 'position_encoding'"
+            ).fetchone()
+            if row is None or row[0] != self.position_encoding:
+                for table in ('files', 'symbols', 'refs'):
+                    self._conn.execute('DELETE FROM ' + table)
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO settings VALUES (?, ?)',
+                    ('position_encoding', self.position_encoding))
+
+    def load(self):
+        """
+        Returns (file index, grammar hash) for all stored files
+        """
+        with self._lock:
+            symbols = {}
+            for row in self._conn.execute(
+                    'SELECT path, name, kind, start_pos, end_pos, line, col, '
+                    'end_line, end_col FROM symbols'):
+                symbols.setdefault(row[0], []).append(Symbol(*row[1:]))
+
+            references = {}
+            for row in self._conn.execute(
+                    'SELECT path, name, start_pos, end_pos, def_start, '
+                    'def_end FROM refs'):
+                references.setdefault(row[0], []).append(Reference(*row[1:]))
+
+            files = []
+            for path, mtime, size, content_hash, grammar_hash, error, \
+                    error_line, error_col in self._conn.execute(
+                        'SELECT path, mtime, size, content_hash, '
+                        'grammar_hash, error, error_line, error_col '
+                        'FROM files'):
+                file_index = FileIndex(path, mtime, size, content_hash,
+                                       symbols.get(path, []),
+                                       references.get(path, []), error,
+                                       error_line, error_col)
+                files.append((file_index, grammar_hash))
+            return files
+
+    def put(self, file_index, grammar_hash):
+        path = file_index.path
+        with self._lock:
+            self._delete(path)
+            self._conn.execute(
+                'INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (path, file_index.mtime, file_index.size,
+                 file_index.content_hash, grammar_hash, file_index.error,
+                 file_index.error_line, file_index.error_col))
+            self._conn.executemany(
+                'INSERT INTO symbols VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(path,) + tuple(s) for s in file_index.symbols])
+            self._conn.executemany(
+                'INSERT INTO refs VALUES (?, ?, ?, ?, ?, ?)',
+                [(path,) + tuple(r) for r in file_index.references])
+            self._written()
+
+    def touch(self, path, mtime, size):
+        """
+        File is saved without changes, only its stat is updated
+        """
+        with self._lock:
+            self._conn.execute(
+                'UPDATE files SET mtime = ?, size = ? WHERE path = ?',
+                (mtime, size, path))
+            self._written()
+
+    def remove(self, path):
+        with self._lock:
+            self._delete(path)
+            self._written()
+
+    def clear(self):
+        with self._lock:
+            for table in ('files', 'symbols', 'refs'):
+                self._conn.execute('DELETE FROM ' + table)
+            self._commit()
+
+    def flush(self):
+        """
+        Commits all pending writes
+        """
+        with self._lock:
+            if self._uncommitted:
+                self._commit()
+
+    def _written(self):
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_every:
+            self._commit()
+        elif self._commit_timer is None:
+            self._commit_timer = threading.Timer(self.commit_interval,
+                                                 self.flush)
+            self._commit_timer.daemon = True
+            self._commit_timer.start()
+
+    def _commit(self):
+        if self._commit_timer is not None:
+            self._commit_timer.cancel()
+            self._commit_timer = None
+        self._uncommitted = 0
+        try:
+            self._conn.commit()
+        except sqlite3.Error:
+            log.exception("Committing index store failed.")
+            self._conn.rollback()
+
+    def _delete(self, path):
+        for table in ('files', 'symbols', 'refs'):
+            self._conn.execute(
+                'DELETE FROM {} WHERE path = ?'.format(table), (path,))
+
+    def close(self):
+        with self._lock:
+            self._commit()
+            self._conn.close()
@@ -0,0 +1,392 @@
+"""
+This module is responsible for indexing model files of the whole workspace,
+including files which are not opened in editor.
+"""
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from os.path import join
+
+from ..utils.file_source import file_sources
+from ..utils.line_index import LineIndex
+from .configuration import Configuration
+from .lsp import PositionEncodingKind
+from .parse_scheduler import model_from_str
+
+__author__ = "Daniel Elero"
+__copyright__ = "textX-tools"
+__license__ = "MIT"
+
+
+log = logging.getLogger(__name__)
+
+# Leave half of the cores for interactive requests
+INDEX_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+INDEX_WORKER_NICENESS = 10
+# Part of the time a worker spends parsing, it sleeps for the rest so the
+# background indexing does not use more than its share of CPU
+INDEX_WORKER_DUTY_CYCLE = 0.5
+
+HASH_CHUNK_SIZE = 1 << 16
+
+# Directories which are never indexed (hidden directories are skipped too)
+SKIP_DIRS = ['node_modules', '__pycache__', 'venv', 'env']
+
+# Named rule instance, with its range (in code units of the position
+# encoding) so it can be shown without reading the file
+Symbol = namedtuple('Symbol', ['name', 'kind', 'start', 'end', 'line', 'col',
+                               'end_line', 'end_col'])
+# Cross-reference and position of referenced rule instance
+Reference = namedtuple('Reference',
+                       ['name', 'start', 'end', 'def_start', 'def_end'])
+# Index of one model file, error (message, line and column) is set if file
+# could not be parsed
+FileIndex = namedtuple('FileIndex', ['path', 'mtime', 'size', 'content_hash',
+                                     'symbols', 'references', 'error',
+                                     'error_line', 'error_col'])
+
+
+def file_ext(path):
+    # If extension is None, return name (e.g. '.txconfig')
+    name, ext = os.path.splitext(os.path.basename(path))
+    return ext or name
+
+
+# Configuration of the worker process
+_worker_config = None
+
+
+def _init_worker(config_root_uri, niceness):
+    global _worker_config
+    try:
+        os.nice(niceness)
+    except (AttributeError, OSError):
+        pass
+    _worker_config = Configuration(config_root_uri)
+
+
+def index_model(model, line_index):
+    """
+    Returns symbols and references of the model, line index of the model
+    source is used for symbol ranges
+    """
+    symbols = []
+    for obj in model._pos_rule_dict.values():
+        if isinstance(getattr(obj, 'name', None), str):
+            start, end = obj._tx_position, obj._tx_position_end
+            line, col = line_index.pos_to_line_col(start)
+            end_line, end_col = line_index.pos_to_line_col(end)
+            symbols.append(Symbol(obj.name, type(obj).__name__, start, end,
+                                  line, col, end_line, end_col))
+    references = [Reference(ref.name, ref.ref_pos_start, ref.ref_pos_end,
+                            ref.def_pos_start, ref.def_pos_end)
+                  for ref in model._pos_crossref_list]
+    return symbols, references
+
+
+def content_hash(path):
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def index_file(path, ext, position_encoding=PositionEncodingKind.UTF16):
+    """
+    Parses model file in worker process. Only picklable index is returned,
+    because models can not be sent between processes.
+    """
+    st = os.stat(path)
+    file_hash = content_hash(path)
+    start = time.monotonic()
+    try:
+        metamodel = _worker_config.get_mm_by_ext(ext)
+        source = file_sources.read(path)
+        model = model_from_str(metamodel, source,
+                               _worker_config.get_parse_budget(ext))
+        symbols, references = index_model(
+            model, LineIndex(source, position_encoding))
+        error, error_line, error_col = None, None, None
+    except Exception as e:
+        symbols, references = [], []
+        # textX errors keep message without position
+        error = getattr(e, 'message', None) or str(e)
+        error_line = getattr(e, 'line', None)
+        error_col = getattr(e, 'col', None)
+
+    # Throttle worker
+    elapsed = time.monotonic() - start
+    time.sleep(elapsed * (1 - INDEX_WORKER_DUTY_CYCLE) /
+               INDEX_WORKER_DUTY_CYCLE)
+
+    return FileIndex(path, st.st_mtime_ns, st.st_size, file_hash, symbols,
+                     references, error, error_line, error_col)
+
+
+class WorkspaceIndexer(object):
+    """
+    Keeps index of symbols and references of all model files under the
+    workspace root.
+
+    Files are parsed in a bounded pool of worker processes with lower
+    priority, so indexing does not slow down requests for opened documents.
+    Files are indexed again when their content or grammar is changed.
+
+    If index store is given, index of the previous run is loaded first and
+    used while changed files are indexed. If workspace is given, symbols of
+    indexed files are added to its symbol index.
+
+    Callbacks are called with file index of each indexed file and with
+    path of each removed file.
+    """
+
+    def __init__(self, root_path, configuration, store=None,
+                 max_workers=INDEX_WORKERS, workspace=None,
+                 indexed_callback=None, removed_callback=None,
+                 position_encoding=PositionEncodingKind.UTF16):
+        self.root_path = root_path
+        self.configuration = configuration
+        self.position_encoding = position_encoding
+        self.store = store
+        self.workspace = workspace
+        self.indexed_callback = indexed_callback
+        self.removed_callback = removed_callback
+        self.max_workers = max_workers
+        self.extensions = set()
+
+        self._lock = threading.Lock()
+        self._executor = None
+        # Key: file path
+        # Value: FileIndex
+        self._files = {}
+        # Key: file path
+        # Value: hash of the grammar file is indexed with
+        self._grammar_hashes = {}
+        # Key: file path
+        # Value: future of the latest indexing job
+        self._pending = {}
+
+    def start(self):
+        with self._lock:
+            self.extensions = set(self.configuration.get_all_extensions())
+            # Workers are spawned, forking a multithreaded server is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(self.configuration.root_uri,
+                          INDEX_WORKER_NICENESS))
+
+        thread = threading.Thread(target=self._start_indexing)
+        thread.daemon = True
+        thread.start()
+
+    def _start_indexing(self):
+        if self.store is not None and not self._files:
+            try:
+                stored = self.store.load()
+            except Exception:
+                log.exception("Loading stored index failed.")
+                stored = []
+            with self._lock:
+                for file_index, grammar_hash in stored:
+                    self._files[file_index.path] = file_index
+                    self._grammar_hashes[file_index.path] = grammar_hash
+            for file_index, _ in stored:
+                self._file_indexed(file_index)
+        self.index_all()
+
+    def _file_indexed(self, file_index):
+        if self.workspace is not None:
+            self.workspace.update_symbols(file_index.path, file_index.symbols,
+                                          from_disk=True)
+        if self.indexed_callback is not None:
+            self.indexed_callback(file_index)
+
+    def _file_removed(self, path):
+        if self.workspace is not None:
+            self.workspace.remove_symbols(path)
+        if self.removed_callback is not None:
+            self.removed_callback(path)
+
+    def shutdown(self):
+        with self._lock:
+            executor = self._executor
+            pending = self._pending
+            self._executor = None
+            self._pending = {}
+
+        # Done callbacks of cancelled futures are called immediately,
+        # so futures are cancelled without holding the lock
+        for future in pending.values():
+            future.cancel()
+        if executor is not None:
+            executor.shutdown(wait=False)
+        if self.store is not None:
+            self.store.flush()
+
+    def restart(self):
+        """
+        Configuration is changed, workers have to load it again
+        """
+        self.shutdown()
+        with self._lock:
+            old_paths = list(self._files)
+            self._files = {}
+            self._grammar_hashes = {}
+        for path in old_paths:
+            self._file_removed(path)
+        if self.store is not None:
+            self.store.clear()
+        self.start()
+
+    def discover(self):
+        for dirpath, dirnames, filenames in os.walk(self.root_path):
+            dirnames[:] = [d for d in dirnames
+                           if not d.startswith('.') and d not in SKIP_DIRS]
+            for filename in filenames:
+                if file_ext(filename) in self.extensions:
+                    yield join(dirpath, filename)
+
+    def index_all(self):
+        try:
+            for path in self.discover():
+                self.schedule(path)
+        except Exception:
+            log.exception("Discovering model files failed.")
+
+        # Forget files which are deleted while server was not running
+        for path in list(self._files):
+            if not os.path.exists(path):
+                self.remove(path)
+
+    def reindex_all(self):
+        """
+        Grammar is changed, files indexed with old grammar are parsed again
+        """
+        thread = threading.Thread(target=self.index_all)
+        thread.daemon = True
+        thread.start()
+
+    def _is_up_to_date(self, path, st, grammar_hash):
+        """
+        File does not have to be parsed if grammar and content are the same
+        """
+        file_index = self._files.get(path)
+        if file_index is None or path in self._pending or \
+                self._grammar_hashes.get(path) != grammar_hash:
+            return False
+
+        if (file_index.mtime, file_index.size) == (st.st_mtime_ns,
+                                                   st.st_size):
+            return True
+
+        # File is saved, but its content is not changed
+        if file_index.content_hash == content_hash(path):
+            self._files[path] = file_index._replace(mtime=st.st_mtime_ns,
+                                                    size=st.st_size)
+            if self.store is not None:
+                self.store.touch(path, st.st_mtime_ns, st.st_size)
+            return True
+        return False
+
+    def schedule(self, path):
+        ext = file_ext(path)
+        if ext not in self.extensions:
+            return
+
+        try:
+            st = os.stat(path)
+            grammar_hash = self.configuration.get_grammar_hash(ext)
+            with self._lock:
+                if self._executor is None or \
+                        self._is_up_to_date(path, st, grammar_hash):
+                    return
+
+                old_future = self._pending.get(path)
+                future = self._executor.submit(index_file, path, ext,
+                                               self.position_encoding)
+                self._pending[path] = future
+        except OSError:
+            return
+
+        if old_future is not None:
+            old_future.cancel()
+        future.add_done_callback(partial(self._index_done, path,
+                                         grammar_hash))
+
+    def _index_done(self, path, grammar_hash, future):
+        with self._lock:
+            if self._pending.get(path) is not future:
+                # File is scheduled again or removed
+                return
+            del self._pending[path]
+
+        if future.cancelled():
+            return
+        try:
+            file_index = future.result()
+        except Exception:
+            log.exception("Indexing of %s failed.", path)
+            return
+
+        with self._lock:
+            self._files[path] = file_index
+            self._grammar_hashes[path] = grammar_hash
+        self._file_indexed(file_index)
+        if self.store is not None:
+            self.store.put(file_index, grammar_hash)
+
+    def remove(self, path):
+        with self._lock:
+            future = self._pending.pop(path, None)
+            self._files.pop(path, None)
+            self._grammar_hashes.pop(path, None)
+        if future is not None:
+            future.cancel()
+        self._file_removed(path)
+        if self.store is not None:
+            self.store.remove(path)
+        file_sources.discard(path)
+
+    def file_changed(self, path):
+        self.schedule(path)
+
+    def file_closed(self, path):
+        """
+        Unsaved changes of closed document are discarded, so symbols of the
+        file on disk are used again
+        """
+        file_index = self._files.get(path)
+        if file_index is not None:
+            self._file_indexed(file_index)
+        self.schedule(path)
+
+    @property
+    def files(self):
+        with self._lock:
+            return list(self._files.values())
+
+    def get_file_index(self, path):
+        return self._files.get(path)
+
+    def is_indexed(self, path):
+        """
+        Returns True if the file is indexed or is being indexed
+        """
+        with self._lock:
+            return path in self._files or path in self._pending
+
+    def get_grammar_hash(self, path):
+        """
+        Returns hash of the grammar file is indexed with
+        """
+        return self._grammar_hashes.get(path)
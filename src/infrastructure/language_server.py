@@ -1,5 +1,6 @@
 # Copyright 2017 Palantir Technologies, Inc.
 from ..utils import uris
+from ..infrastructure.lsp import PositionEncodingKind
 from ..infrastructure.server import JSONRPCServer
 
 import logging
@@ -97,6 +98,15 @@ class LanguageServer(MethodJSONRPCServer):
     process_id = None
     root_uri = None
     init_opts = None
+    client_capabilities = None
+    # UTF-16 is the only encoding every client supports
+    position_encoding = PositionEncodingKind.UTF16
+
+    # Python strings are indexed by code points, so UTF-32 columns do not
+    # need any conversion
+    PREFERRED_POSITION_ENCODINGS = [PositionEncodingKind.UTF32,
+                                    PositionEncodingKind.UTF8,
+                                    PositionEncodingKind.UTF16]
 
     def capabilities(self):
         return {}
@@ -115,18 +125,47 @@ class LanguageServer(MethodJSONRPCServer):
             self.root_uri = ''
         self.init_opts = kwargs.get('initializationOptions')
         self.process_id = kwargs.get('processId')
+        self.client_capabilities = kwargs.get('capabilities') or {}
+        self.position_encoding = self.negotiate_position_encoding(
+            kwargs.get('capabilities'))
 
         self.initialize(self.root_uri, self.init_opts, self.process_id)
 
         # Get our capabilities
-        return {'capabilities': self.capabilities()}
+        capabilities = self.capabilities()
+        capabilities['positionEncoding'] = self.position_encoding
+        return {'capabilities': capabilities}
+
+    def negotiate_position_encoding(self, client_capabilities):
+        try:
+            client_encodings = \
+                client_capabilities['general']['positionEncodings']
+        except (KeyError, TypeError):
+            client_encodings = None
+
+        for encoding in self.PREFERRED_POSITION_ENCODINGS:
+            if encoding in (client_encodings or []):
+                return encoding
+        return PositionEncodingKind.UTF16
+
+    def client_supports(self, *keys):
+        """
+        Returns True if client capability at the given path is present,
+        e.g. client_supports('textDocument', 'diagnostic')
+        """
+        capability = self.client_capabilities
+        try:
+            for key in keys:
+                capability = capability[key]
+        except (KeyError, TypeError):
+            return False
+        return capability is not None and capability is not False
 
     def m___cancel_request(self, **kwargs):
-        # TODO: We could I suppose launch tasks in their own threads and kill
-        # them on cancel, but is it really worth the effort given most methods
-        # are reasonably quick?
+        # Requests are handled on worker threads, only those which are not
+        # started yet can be cancelled
         # This tends to happen when cancelling a hover request
-        pass
+        self.cancel_request(kwargs.get('id'))
 
     def m_shutdown(self, **_kwargs):
         self.shutdown()
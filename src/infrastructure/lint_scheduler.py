@@ -0,0 +1,140 @@
+"""
+This module is responsible for scheduling linting of documents.
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+__author__ = "Daniel Elero"
+__copyright__ = "textX-tools"
+__license__ = "MIT"
+
+
+log = logging.getLogger(__name__)
+
+# Debounce interval of the active document (the last edited one)
+LINT_ACTIVE_DEBOUNCE_S = 0.25
+# Debounce interval of other documents
+LINT_DEBOUNCE_S = 0.5
+LINT_MAX_DEBOUNCE_S = 3.0
+# Documents which take longer to parse are linted less often
+LINT_PARSE_TIME_FACTOR = 2.0
+
+
+class LintScheduler(object):
+    """
+    Lints documents on one thread, after their debounce interval expires.
+
+    Each document has its own deadline, so editing one document does not
+    delay or cancel linting of other documents. Deadlines are kept in a
+    heap, entries of rescheduled documents are skipped when popped.
+
+    Active document is debounced for a shorter time and is linted first
+    when more documents are due. Debounce interval grows with the measured
+    parse time of the document. Other documents which are due at the same
+    time are linted together, so their diagnostics are sent in one write.
+    """
+
+    def __init__(self, lint_func, parse_time_func=None):
+        # Called with list of document uris
+        self._lint_func = lint_func
+        self._parse_time_func = parse_time_func
+        self._cond = threading.Condition()
+        self._counter = itertools.count()
+        # (deadline, sequence number, document uri)
+        self._heap = []
+        # Key: document uri
+        # Value: (sequence number, deadline) of its valid heap entry
+        self._scheduled = {}
+        self._active_uri = None
+        self._stopped = False
+
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def debounce_interval(self, doc_uri, active=False):
+        interval = LINT_ACTIVE_DEBOUNCE_S if active else LINT_DEBOUNCE_S
+        if self._parse_time_func is not None:
+            parse_time = self._parse_time_func(doc_uri)
+            if parse_time is not None:
+                interval = max(interval, LINT_PARSE_TIME_FACTOR * parse_time)
+        return min(interval, LINT_MAX_DEBOUNCE_S)
+
+    def schedule(self, doc_uri, active=False):
+        """
+        Lints the document after its debounce interval, pending lint of
+        the same document is postponed
+        """
+        deadline = time.monotonic() + self.debounce_interval(doc_uri, active)
+        with self._cond:
+            if active:
+                self._active_uri = doc_uri
+            seq = next(self._counter)
+            self._scheduled[doc_uri] = (seq, deadline)
+            heapq.heappush(self._heap, (deadline, seq, doc_uri))
+            self._cond.notify()
+
+    def discard(self, doc_uri):
+        with self._cond:
+            self._scheduled.pop(doc_uri, None)
+            if self._active_uri == doc_uri:
+                self._active_uri = None
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def _is_valid(self, entry):
+        deadline, seq, doc_uri = entry
+        return self._scheduled.get(doc_uri) == (seq, deadline)
+
+    def _pop_due(self):
+        """
+        Waits for the next due documents, returns None when stopped
+        """
+        with self._cond:
+            while not self._stopped:
+                # Skip entries of rescheduled and discarded documents
+                while self._heap and not self._is_valid(self._heap[0]):
+                    heapq.heappop(self._heap)
+
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+
+                now = time.monotonic()
+                deadline = self._heap[0][0]
+                if deadline > now:
+                    self._cond.wait(deadline - now)
+                    continue
+
+                # Active document goes first if it is due too
+                doc_uri = self._active_uri
+                _, active_deadline = self._scheduled.get(doc_uri,
+                                                         (None, None))
+                if active_deadline is not None and active_deadline <= now:
+                    del self._scheduled[doc_uri]
+                    return [doc_uri]
+
+                doc_uris = []
+                while self._heap and self._heap[0][0] <= now:
+                    entry = heapq.heappop(self._heap)
+                    if self._is_valid(entry):
+                        doc_uri = entry[2]
+                        del self._scheduled[doc_uri]
+                        doc_uris.append(doc_uri)
+                return doc_uris
+
+    def _run(self):
+        while True:
+            doc_uris = self._pop_due()
+            if doc_uris is None:
+                return
+            try:
+                self._lint_func(doc_uris)
+            except Exception:
+                log.exception("Linting of %s failed.", ', '.join(doc_uris))
@@ -32,6 +32,23 @@ class DiagnosticSeverity(object):
     Hint = 4
 
 
+class DocumentDiagnosticReportKind(object):
+    Full = 'full'
+    Unchanged = 'unchanged'
+
+
+class DocumentHighlightKind(object):
+    Text = 1
+    Read = 2
+    Write = 3
+
+
+class FileChangeType(object):
+    Created = 1
+    Changed = 2
+    Deleted = 3
+
+
 class MessageType(object):
     Error = 1
     Warning = 2
@@ -39,6 +56,12 @@ class MessageType(object):
     Log = 4
 
 
+class PositionEncodingKind(object):
+    UTF8 = 'utf-8'
+    UTF16 = 'utf-16'
+    UTF32 = 'utf-32'
+
+
 class SymbolKind(object):
     File = 1
     Module = 2
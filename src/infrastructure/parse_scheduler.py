@@ -0,0 +1,241 @@
+"""
+This module is responsible for parsing documents off the main thread.
+"""
+import logging
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+__author__ = "Daniel Elero"
+__copyright__ = "textX-tools"
+__license__ = "MIT"
+
+
+log = logging.getLogger(__name__)
+
+PARSE_WORKERS = 2
+
+# Weight of the latest parse in the average parse time of a document
+PARSE_TIME_WEIGHT = 0.3
+
+
+class ParseBudgetExceeded(Exception):
+    """
+    Raised when model is not parsed in the given time budget
+    """
+
+    def __init__(self, budget):
+        super(ParseBudgetExceeded, self).__init__(
+            "Model is not parsed in {} seconds (parse budget). "
+            "Last valid model is used.".format(budget))
+        self.budget = budget
+        self.line = None
+        self.col = None
+        self.offset = None
+
+
+def model_from_str(metamodel, model_source, budget=None):
+    """
+    Parses model and stops if parsing takes more than budget seconds.
+
+    Deadline is checked each time parser fails to match, so grammars
+    with heavy backtracking are stopped too.
+    """
+    if not budget:
+        return metamodel.model_from_str(model_source)
+
+    parser = metamodel.parser.clone()
+    set_parse_budget(parser, budget)
+
+    model = parser.get_model_from_str(model_source)
+    for model_processor in metamodel._model_processors:
+        model_processor(model, metamodel)
+    return model
+
+
+def set_parse_budget(parser, budget):
+    """
+    Makes parser clone raise ParseBudgetExceeded after budget seconds
+    """
+    deadline = time.monotonic() + budget
+    nm_raise = parser._nm_raise
+
+    def _nm_raise_with_deadline(*args):
+        if time.monotonic() > deadline:
+            raise ParseBudgetExceeded(budget)
+        nm_raise(*args)
+
+    parser._nm_raise = _nm_raise_with_deadline
+
+
+class ParseScheduler(object):
+    """
+    Parses documents on worker threads.
+
+    Only one parse per document is running at the time. If a newer
+    version of the document is scheduled while parsing, result of the
+    running parse is dropped and the newest version is parsed.
+
+    If the document has an error, its result is applied (and waiting
+    requests are released) first, then errors which follow it are
+    collected and the result is applied again.
+
+    NOTE:
+        Parsing is done in threads and not in processes because parsed
+        models (with user classes and processors) can not be sent back
+        from another process.
+    """
+
+    def __init__(self, max_workers=PARSE_WORKERS, parsed_callback=None,
+                 recovered_callback=None):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        # Called with the document after its parse result is applied
+        self._parsed_callback = parsed_callback
+        # Called with the document after errors which follow the first
+        # error are collected
+        self._recovered_callback = recovered_callback
+        self._cond = threading.Condition()
+        self._ticket = 0
+        # Key: document uri
+        # Value: (ticket, txdoc, source, version)
+        self._requested = {}
+        # Key: document uri
+        # Value: ticket of the last applied parse result
+        self._parsed = {}
+        # Documents which are currently parsed
+        self._running = set()
+        # Key: document uri
+        # Value: average parse time in seconds
+        self._parse_times = {}
+
+    def schedule(self, txdoc):
+        with self._cond:
+            self._ticket += 1
+            self._requested[txdoc.uri] = (self._ticket, txdoc,
+                                          txdoc.source, txdoc.version)
+            if txdoc.uri not in self._running:
+                self._running.add(txdoc.uri)
+                self._executor.submit(self._parse_job, txdoc.uri)
+
+    def discard(self, doc_uri):
+        with self._cond:
+            self._requested.pop(doc_uri, None)
+            self._parsed.pop(doc_uri, None)
+            self._parse_times.pop(doc_uri, None)
+            self._cond.notify_all()
+
+    def parse_time(self, doc_uri):
+        """
+        Returns average parse time of the document or None
+        """
+        return self._parse_times.get(doc_uri)
+
+    def wait(self, doc_uri, timeout=None):
+        """
+        Blocks until the latest scheduled version of the document is parsed.
+        Returns False if timeout has expired.
+        """
+        with self._cond:
+            try:
+                ticket = self._requested[doc_uri][0]
+            except KeyError:
+                return True
+
+            return self._cond.wait_for(
+                lambda: doc_uri not in self._requested or
+                self._parsed.get(doc_uri, 0) >= ticket,
+                timeout)
+
+    def _is_stale(self, doc_uri, ticket):
+        entry = self._requested.get(doc_uri)
+        return entry is None or entry[0] != ticket
+
+    def _notify_parsed(self, callback, txdoc):
+        if callback is None:
+            return
+        try:
+            callback(txdoc)
+        except Exception:
+            log.exception("Parsed callback failed for %s.", txdoc.uri)
+
+    def _parse_job(self, doc_uri):
+        while True:
+            with self._cond:
+                try:
+                    ticket, txdoc, source, version = self._requested[doc_uri]
+                except KeyError:
+                    self._running.discard(doc_uri)
+                    return
+
+            start = time.monotonic()
+            try:
+                result = txdoc.parse_source(source, incremental=True)
+            except Exception:
+                log.exception("Parsing of %s failed.", doc_uri)
+                result = None
+            elapsed = time.monotonic() - start
+
+            with self._cond:
+                entry = self._requested.get(doc_uri)
+                if entry is not None:
+                    average = self._parse_times.get(doc_uri, elapsed)
+                    self._parse_times[doc_uri] = \
+                        average + PARSE_TIME_WEIGHT * (elapsed - average)
+                if entry is not None and entry[0] != ticket:
+                    # Newer version is scheduled, drop this result
+                    continue
+
+                applied = entry is not None and result is not None
+                error = None
+                if applied:
+                    model, syntax_errors, semantic_errors = result
+                    txdoc.set_parse_result(version, model, syntax_errors,
+                                           semantic_errors, source)
+                    errors = list(syntax_errors) + list(semantic_errors)
+                    if len(errors) == 1 and \
+                            not isinstance(errors[0], ParseBudgetExceeded):
+                        error = errors[0]
+                if entry is not None:
+                    self._parsed[doc_uri] = ticket
+
+                if error is None:
+                    self._running.discard(doc_uri)
+                self._cond.notify_all()
+
+            # Waiting requests get the snapshot with the first error, more
+            # errors are collected afterwards
+            if applied:
+                self._notify_parsed(self._parsed_callback, txdoc)
+            if error is None:
+                return
+
+            try:
+                recovered = txdoc.recover_source(
+                    source, error,
+                    cancelled=lambda: self._is_stale(doc_uri, ticket))
+            except Exception:
+                log.exception("Error recovery of %s failed.", doc_uri)
+                recovered = None
+
+            with self._cond:
+                if self._is_stale(doc_uri, ticket):
+                    if doc_uri in self._requested:
+                        continue
+                    self._running.discard(doc_uri)
+                    return
+
+                # Model of recovered parts or more errors are found
+                applied = recovered is not None and \
+                    (recovered[0] is not None or
+                     len(recovered[1]) + len(recovered[2]) > 1)
+                if applied:
+                    model, syntax_errors, semantic_errors = recovered
+                    txdoc.set_parse_result(version, model, syntax_errors,
+                                           semantic_errors, source)
+                self._running.discard(doc_uri)
+                self._cond.notify_all()
+
+            if applied:
+                self._notify_parsed(self._recovered_callback, txdoc)
+            return
@@ -0,0 +1,416 @@
+"""
+This module is responsible for collecting more than one error per parse.
+
+textX stops at the first syntax or semantic error. To find the next one,
+the erroneous part of the source is blanked out and the source is parsed
+again. Blanked part is replaced with spaces (line breaks are kept), so
+positions of errors and of the recovered model are the same as in the
+original source.
+
+Parts are spans of top-level rule instances. They start where top-level
+instances of the last valid model start or end (on lines which are not
+edited since), and at lines which start with a token that can start an
+item of a top-level repetition of the grammar (e.g. 'entity'). Each span
+ends where the next one starts, so a block closed by e.g. ';' or '}' at
+the start of a line stays in its span. Spans are kept inside top-level
+repetitions, so tokens of the model rule around them (e.g. 'begin' and
+'end' of a program) are never blanked.
+
+Errors which are caused only by blanking are not reported: errors at the
+end of the source when everything after the blanked part is blank, and
+unresolved references to names which are defined in blanked parts (then
+recovery stops, as the rest of the source has no syntax errors).
+"""
+import bisect
+import difflib
+import logging
+import re
+import time
+
+from arpeggio import NoMatch, OneOrMore, RegExMatch, Sequence, StrMatch, \
+    ZeroOrMore
+from textx.const import UNKNOWN_OBJ_ERROR
+from textx.exceptions import TextXError, TextXSyntaxError
+
+from ..utils.line_index import LineIndex
+from .grammar_tables import GrammarTables
+from .parse_scheduler import ParseBudgetExceeded, model_from_str, \
+    set_parse_budget
+
+__author__ = "Daniel Elero"
+__copyright__ = "textX-tools"
+__license__ = "MIT"
+
+
+log = logging.getLogger(__name__)
+
+MAX_RECOVERED_ERRORS = 10
+# Time for all recovery parses of one document version, independent of
+# the parse budget
+RECOVERY_BUDGET_S = 1.0
+
+RE_NOT_LINE_BREAK = re.compile(r'[^\r\n]')
+RE_WORD_CHAR = re.compile(r'\w')
+RE_UNKNOWN_OBJ = re.compile(r'{} "(.*?)"'.format(UNKNOWN_OBJ_ERROR))
+
+
+def blank_out(source, start, end):
+    """
+    Replaces all characters between start and end, except line breaks,
+    with spaces
+    """
+    return source[:start] + RE_NOT_LINE_BREAK.sub(' ', source[start:end]) + \
+        source[end:]
+
+
+def _top_level_repetitions(tables):
+    """
+    Returns repetitions of the model rule, without looking into other rules
+    """
+    model_rule = tables.root.nodes[0]
+    repetitions = []
+    stack = list(model_rule.nodes)
+    while stack:
+        expr = stack.pop()
+        if isinstance(expr, (ZeroOrMore, OneOrMore)):
+            repetitions.append(expr)
+        elif expr.root and not expr.rule_name.startswith('__'):
+            # Other rule
+            continue
+        else:
+            stack.extend(expr.nodes)
+    return repetitions
+
+
+def _contains(expr, targets):
+    """
+    Returns True if one of the target expressions is the expression or is
+    in it, without looking into other rules
+    """
+    stack = [expr]
+    while stack:
+        e = stack.pop()
+        if id(e) in targets:
+            return True
+        if e is expr or not e.root or e.rule_name.startswith('__'):
+            stack.extend(e.nodes)
+    return False
+
+
+def _parse_at(tables, exprs, source, pos, deadline):
+    """
+    Returns end offset of the expressions parsed from the offset, or None
+    """
+    parser = tables.metamodel.parser.clone()
+    parser.parser_model = Sequence(nodes=list(exprs), rule_name='Model',
+                                   root=True)
+    set_parse_budget(parser, max(deadline - time.monotonic(), 0.001))
+    try:
+        return pos + parser.parse(source[pos:]).position_end
+    except (NoMatch, TextXSyntaxError, ParseBudgetExceeded):
+        return None
+
+
+def repetition_extent(tables, source, deadline):
+    """
+    Returns start and end offsets of top-level repetitions in the source,
+    i.e. offsets after and before tokens of the model rule which are not
+    in them (e.g. 'begin' and 'end' of a program)
+    """
+    model_rule = tables.root.nodes[0]
+    targets = set(map(id, _top_level_repetitions(tables)))
+    if not isinstance(model_rule, Sequence) or not targets:
+        return 0, len(source)
+
+    inside = [i for i, expr in enumerate(model_rule.nodes)
+              if _contains(expr, targets)]
+    prefix = model_rule.nodes[:inside[0]]
+    suffix = model_rule.nodes[inside[-1] + 1:]
+
+    start = 0
+    if prefix:
+        start = _parse_at(tables, prefix, source, 0, deadline) or 0
+
+    end = len(source)
+    firsts = tables._first_of_seq(suffix)[0] if suffix else set()
+    if firsts and all(isinstance(expr, StrMatch) for expr in firsts):
+        # The last keyword which starts the rest of the model rule
+        candidates = sorted(set(
+            pos for expr in firsts
+            for pos in _find_all(source, expr.to_match, start)
+            if _matches_at(expr, source, pos)), reverse=True)
+        for pos in candidates:
+            if _parse_at(tables, suffix, source, pos, deadline) is not None:
+                end = pos
+                break
+    return start, end
+
+
+def _find_all(source, text, start):
+    pos = source.find(text, start)
+    while pos >= 0:
+        yield pos
+        pos = source.find(text, pos + 1)
+
+
+def _matches_at(expr, source, pos):
+    if isinstance(expr, StrMatch):
+        keyword = expr.to_match
+        text = source[pos:pos + len(keyword)]
+        if expr.ignore_case:
+            text, keyword = text.lower(), keyword.lower()
+        if text != keyword:
+            return False
+        # Keyword must not be just the start of a longer word
+        return not (RE_WORD_CHAR.match(keyword[-1:]) and
+                    RE_WORD_CHAR.match(source[pos + len(keyword):][:1]))
+    elif isinstance(expr, RegExMatch):
+        m = expr.regex.match(source, pos)
+        return m is not None and m.end() > pos
+    return False
+
+
+def _top_level_firsts(tables):
+    """
+    Returns terminals which can start an item of a top-level repetition
+    """
+    firsts = set()
+    for repetition in _top_level_repetitions(tables):
+        firsts |= tables.first[id(repetition)]
+    return firsts
+
+
+def grammar_starts(tables, source):
+    """
+    Returns offsets of lines which start with a token that can start an
+    item of a top-level repetition, at the outermost indentation of them
+    """
+    firsts = _top_level_firsts(tables)
+    if not firsts:
+        return []
+
+    # Key: indentation
+    # Value: offsets of the first tokens of lines
+    starts = {}
+    line_starts = LineIndex(source).line_starts
+    for line_start in line_starts:
+        pos = line_start
+        while pos < len(source) and source[pos] in ' \t':
+            pos += 1
+        if any(_matches_at(expr, source, pos) for expr in firsts):
+            starts.setdefault(pos - line_start, []).append(pos)
+    return starts[min(starts)] if starts else []
+
+
+def model_boundaries(last_valid, source):
+    """
+    Returns start and end offsets of top-level instances of the last valid
+    model, mapped onto the source by lines which are not changed since
+    """
+    old_source, old_model = last_valid
+    if old_model is None:
+        return [], []
+
+    old_index = LineIndex(old_source)
+    new_index = LineIndex(source)
+    # Key: line of the last valid source
+    # Value: the same line of the source
+    lines = {}
+    matcher = difflib.SequenceMatcher(None, old_index.lines, new_index.lines)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            lines.update(zip(range(i1, i2), range(j1, j2)))
+
+    def _map(pos):
+        line = bisect.bisect_right(old_index.line_starts, pos) - 1
+        if line in lines:
+            return new_index.line_starts[lines[line]] + pos - \
+                old_index.line_starts[line]
+
+    starts, ends = [], []
+    for obj in old_model._pos_rule_dict.values():
+        if getattr(obj, 'parent', None) is not old_model:
+            continue
+        starts.append(_map(obj._tx_position))
+        ends.append(_map(obj._tx_position_end))
+    return [p for p in starts if p is not None], \
+        [p for p in ends if p is not None]
+
+
+class _Cascade(Exception):
+    """
+    Raised when the error after blanking is caused by blanking itself
+    """
+
+
+def _error_offset(error, line_starts, source_len):
+    if not error.line:
+        return None
+    if error.line > len(line_starts):
+        return source_len
+    return min(line_starts[error.line - 1] + (error.col or 1) - 1,
+               source_len)
+
+
+def _refers_to_blanked(error, blanked_texts):
+    """
+    Reference can not be resolved because its target is blanked out
+    """
+    if getattr(error, 'err_type', None) != UNKNOWN_OBJ_ERROR:
+        return False
+    m = RE_UNKNOWN_OBJ.search(error.message or '')
+    if m is None:
+        return False
+    name = re.compile(r'(?<!\w){}(?!\w)'.format(re.escape(m.group(1))))
+    return any(name.search(text) for text in blanked_texts)
+
+
+def recover_errors(metamodel, source, error, tables=None,
+                   last_valid=(None, None), max_errors=MAX_RECOVERED_ERRORS,
+                   budget=RECOVERY_BUDGET_S, cancelled=None):
+    """
+    Collects errors which follow the given error of the source.
+
+    Args:
+        tables(GrammarTables): tables of the metamodel, built if not given
+        last_valid(tuple): source and model of the last valid parse
+        budget(float): seconds for all recovery parses
+        cancelled(callable): returns True if the result is not needed
+            anymore
+
+    Returns:
+        Model parsed from the source with erroneous parts blanked out, or
+        None if the source could not be recovered
+        List of errors ordered by position, starting with the given one
+    """
+    errors = [error]
+    deadline = time.monotonic() + budget
+    if tables is None:
+        tables = GrammarTables(metamodel)
+
+    instance_starts, instance_ends = model_boundaries(last_valid, source)
+    instance_starts = set(instance_starts)
+    instance_starts.update(grammar_starts(tables, source))
+    # Tokens of the model rule around top-level repetitions are never
+    # blanked
+    extent_start, extent_end = repetition_extent(tables, source, deadline)
+    starts = sorted(p for p in instance_starts.union(instance_ends)
+                    if extent_start < p < extent_end)
+    starts.insert(0, extent_start)
+    # Blanking does not change line starts
+    line_starts = LineIndex(source).line_starts
+    # Errors which expect the start of the model are caused by blanking
+    # the model start, if nothing but the blank is before them
+    model_firsts = set(map(id, tables.first[id(tables.root)]))
+
+    def _offset(e):
+        return _error_offset(e, line_starts, len(source))
+
+    def _position(e):
+        return e.line or 0, e.col or 0
+
+    def _spans(pos):
+        """
+        Returns spans to blank for the error at the offset. Error on the
+        first line of a span can be in the previous one (e.g. its closing
+        bracket is missing and the next keyword is taken for an ID).
+        """
+        if not extent_start <= pos <= extent_end:
+            return []
+        i = bisect.bisect_right(starts, pos) - 1
+        ends = starts[1:] + [extent_end]
+        spans = [(starts[i], ends[i])]
+        if i > 0 and '\n' not in source[starts[i]:pos]:
+            spans.append((starts[i - 1], ends[i - 1]))
+            spans.append((starts[i - 1], ends[i]))
+        return [(start, end) for start, end in spans
+                if source[start:end].strip()]
+
+    def _expects_model_start(e, before):
+        expected = [r for r in getattr(e, 'expected_rules', None) or []
+                    if id(r) in tables.first]
+        return bool(expected) and not before.strip() and \
+            all(id(r) in model_firsts for r in expected)
+
+    def _blank(start, end):
+        """
+        Returns (model, error) after blanking the span. Model and error
+        are None if the source has no more errors which can be reported.
+        """
+        candidate = blank_out(source, start, end)
+        try:
+            return model_from_str(metamodel, candidate,
+                                  deadline - time.monotonic()), None
+        except TextXError as e:
+            e_pos = _offset(e)
+            if e_pos is None:
+                raise _Cascade()
+
+            if e_pos >= len(candidate.rstrip()) and \
+                    not candidate[start:].strip():
+                # Everything after the blanked part is blank, so the end
+                # of the source is reached earlier than before
+                return None, None
+
+            if _refers_to_blanked(e, blanked + [source[start:end]]):
+                # References are resolved after the whole source is
+                # parsed, so there are no more syntax errors. Blanking
+                # referencing instances could go on through a chain of
+                # references, so recovery stops here.
+                return None, None
+
+            # Error inside the blanked part (or a syntax error before it)
+            # is caused by blanking, as well as an error at the first
+            # token after it, unless a top-level instance starts there
+            follows = len(candidate) - len(candidate[end:].lstrip())
+            if _position(e) in known or start <= e_pos < end or \
+                    (isinstance(e, TextXSyntaxError) and e_pos < start) or \
+                    (e_pos == follows and follows not in instance_starts) or \
+                    _expects_model_start(e, candidate[:e_pos]):
+                raise _Cascade()
+            return None, e
+
+    # Original text of blanked parts
+    blanked = []
+    known = set([_position(error)])
+    pending = error
+    while len(errors) < max_errors:
+        pos = _offset(pending)
+        if pos is None:
+            break
+
+        # Span after which parsing gets furthest is blanked
+        best = None
+        at_end = False
+        for start, end in _spans(pos):
+            if time.monotonic() >= deadline or \
+                    (cancelled is not None and cancelled()):
+                return None, sorted(errors, key=_position)
+
+            try:
+                model, e = _blank(start, end)
+            except ParseBudgetExceeded:
+                return None, sorted(errors, key=_position)
+            except _Cascade:
+                continue
+
+            if model is not None:
+                log.debug("Recovered %s errors.", len(errors))
+                return model, sorted(errors, key=_position)
+            if e is None:
+                at_end = True
+            elif best is None or _offset(e) > _offset(best[2]):
+                best = (start, end, e)
+
+        if at_end or best is None:
+            # No more errors, or error can not be isolated
+            break
+
+        start, end, pending = best
+        blanked.append(source[start:end])
+        source = blank_out(source, start, end)
+        errors.append(pending)
+        known.add(_position(pending))
+
+    log.debug("Recovered %s errors.", len(errors))
+    return None, sorted(errors, key=_position)
@@ -3,24 +3,48 @@ from jsonrpc import jsonrpc2, JSONRPCResponseManager
 
 import json
 import logging
+import threading
 import uuid
 
+from concurrent.futures import ThreadPoolExecutor
+
 
 log = logging.getLogger(__name__)
 
+# Requests are handled on worker threads, so a request which waits (e.g.
+# for its document to be parsed) does not block reading of next messages
+REQUEST_WORKERS = 4
+
+# Error code of the response to a cancelled request
+REQUEST_CANCELLED = -32800
+
 
 class JSONRPCServer(object):
     """ Read/Write JSON RPC messages """
 
+    # Requests which change state of the server are handled before the
+    # next message is read
+    SYNC_METHODS = ('initialize', 'shutdown', 'exit')
+
     def __init__(self, rfile, wfile):
         self.rfile = rfile
         self.wfile = wfile
 
         self._callbacks = {}
         self._shutdown = False
+        # Messages are written from request handler and worker threads
+        self._write_lock = threading.Lock()
+
+        self._request_executor = ThreadPoolExecutor(
+            max_workers=REQUEST_WORKERS)
+        # Key: request id
+        # Value: future of the request which is not handled yet
+        self._pending_requests = {}
+        self._pending_lock = threading.Lock()
 
     def exit(self):
         # Exit causes a complete exit of the server
+        self._request_executor.shutdown(wait=False)
         self.rfile.close()
         self.wfile.close()
 
@@ -45,11 +69,13 @@ class JSONRPCServer(object):
 
                 msg = json.loads(data)
                 if 'method' in msg:
-                    # It's a notification or request
-                    # Dispatch to the thread pool for handling
-                    response = JSONRPCResponseManager.handle(data, self)
-                    if response is not None:
-                        self._write_message(response.data)
+                    if 'id' in msg and msg['method'] not in self.SYNC_METHODS:
+                        # It's a request
+                        # Dispatch to the thread pool for handling
+                        self._dispatch_request(msg['id'], data)
+                    else:
+                        # Notifications are handled in order they are sent
+                        self._handle_message(data)
                 else:
                     # Otherwise, it's a response message
                     on_result, on_error = self._callbacks.pop(msg['id'])
@@ -62,6 +88,42 @@ class JSONRPCServer(object):
                                due to uncaught exception")
                 break
 
+    def _handle_message(self, data):
+        response = JSONRPCResponseManager.handle(data, self)
+        if response is not None:
+            self._write_message(response.data)
+
+    def _dispatch_request(self, msg_id, data):
+        with self._pending_lock:
+            self._pending_requests[msg_id] = self._request_executor.submit(
+                self._handle_request, msg_id, data)
+
+    def _handle_request(self, msg_id, data):
+        try:
+            self._handle_message(data)
+        except Exception:
+            log.exception("Handling of request %s failed.", msg_id)
+        finally:
+            with self._pending_lock:
+                self._pending_requests.pop(msg_id, None)
+
+    def cancel_request(self, msg_id):
+        """
+        Cancels the request if its handling is not started yet, client gets
+        RequestCancelled error. Running request is not interrupted.
+        """
+        with self._pending_lock:
+            future = self._pending_requests.pop(msg_id, None)
+        if future is not None and future.cancel():
+            self._write_message({
+                'jsonrpc': '2.0',
+                'id': msg_id,
+                'error': {
+                    'code': REQUEST_CANCELLED,
+                    'message': 'Request cancelled'
+                }
+            })
+
     def call(self, method, params=None, on_result=None, on_error=None):
         """Call a method on the client."""
         msg_id = str(uuid.uuid4())
@@ -86,6 +148,13 @@ class JSONRPCServer(object):
         )
         self._write_message(req.data)
 
+    def notify_all(self, method, params_list):
+        """ Send notifications to the client in one write. """
+        log.debug("Sending %s notifications %s", len(params_list), method)
+        self._write_messages([jsonrpc2.JSONRPC20Request(
+            method=method, params=params, is_notification=True
+        ).data for params in params_list])
+
     def _read_message(self):
         line = self.rfile.readline()
 
@@ -105,15 +174,23 @@ class JSONRPCServer(object):
         return self.rfile.read(content_length)
 
     def _write_message(self, msg):
-        body = json.dumps(msg, separators=(",", ":"))
-        content_length = len(body)
-        response = (
-            "Content-Length: {}\r\n"
-            "Content-Type: application/vscode-jsonrpc; charset=utf8\r\n\r\n"
-            "{}".format(content_length, body)
-        )
-        self.wfile.write(response.encode('utf-8'))
-        self.wfile.flush()
+        self._write_messages([msg])
+
+    def _write_messages(self, msgs):
+        responses = []
+        for msg in msgs:
+            body = json.dumps(msg, separators=(",", ":"))
+            content_length = len(body)
+            responses.append(
+                "Content-Length: {}\r\n"
+                "Content-Type: application/vscode-jsonrpc; "
+                "charset=utf8\r\n\r\n"
+                "{}".format(content_length, body)
+            )
+        data = ''.join(responses).encode('utf-8')
+        with self._write_lock:
+            self.wfile.write(data)
+            self.wfile.flush()
 
 
 def _content_length(line):
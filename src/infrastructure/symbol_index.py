@@ -0,0 +1,216 @@
+"""
+Module for searching named rule instances of the whole workspace
+"""
+import bisect
+import heapq
+import itertools
+import threading
+
+__author__ = "Daniel Elero"
+__copyright__ = "textX-tools"
+__license__ = "MIT"
+
+
+MAX_SYMBOL_RESULTS = 100
+# Matching names which are ranked for one query, of names which start with
+# the query and of names which only contain it
+MAX_RANKED_NAMES = 1000
+# Sorted names are kept in chunks of this size (up to twice as long)
+NAMES_CHUNK_SIZE = 512
+
+
+def trigrams(text):
+    return set(text[i:i + 3] for i in range(len(text) - 2))
+
+
+class SortedNames(object):
+    """
+    Sorted list of names split into short sorted chunks, so adding or
+    removing a name is a binary search and an insert into one chunk
+    instead of sorting all names again.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        # Last name of each chunk
+        self._maxes = []
+
+    def __len__(self):
+        return sum(len(chunk) for chunk in self._chunks)
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self._chunks)
+
+    def add(self, name):
+        if not self._chunks:
+            self._chunks.append([name])
+            self._maxes.append(name)
+            return
+
+        i = bisect.bisect_left(self._maxes, name)
+        if i == len(self._maxes):
+            # Name is after all names
+            i -= 1
+            self._chunks[i].append(name)
+            self._maxes[i] = name
+        else:
+            bisect.insort(self._chunks[i], name)
+
+        chunk = self._chunks[i]
+        if len(chunk) > 2 * NAMES_CHUNK_SIZE:
+            self._chunks[i:i + 1] = [chunk[:NAMES_CHUNK_SIZE],
+                                     chunk[NAMES_CHUNK_SIZE:]]
+            self._maxes[i:i + 1] = [chunk[NAMES_CHUNK_SIZE - 1], chunk[-1]]
+
+    def remove(self, name):
+        i = bisect.bisect_left(self._maxes, name)
+        if i == len(self._maxes):
+            return
+
+        chunk = self._chunks[i]
+        j = bisect.bisect_left(chunk, name)
+        if j == len(chunk) or chunk[j] != name:
+            return
+
+        del chunk[j]
+        if not chunk:
+            del self._chunks[i]
+            del self._maxes[i]
+        elif j == len(chunk):
+            self._maxes[i] = chunk[-1]
+
+    def iter_from(self, name):
+        """
+        Yields names which are not less than the name, in order
+        """
+        i = bisect.bisect_left(self._maxes, name)
+        if i == len(self._chunks):
+            return iter(())
+
+        first = self._chunks[i]
+        first = first[bisect.bisect_left(first, name):]
+        return itertools.chain(first, itertools.chain.from_iterable(
+            itertools.islice(self._chunks, i + 1, None)))
+
+
+class SymbolIndex(object):
+    """
+    Index of symbol names.
+
+    Names which start with the query are found in sorted names. Names
+    which contain it are found in the smallest trigram posting set of the
+    query (all names for queries shorter than three characters). Names are
+    matched case insensitive, and results are ranked: exact match, then
+    prefix match, then shorter names. Only the first MAX_RANKED_NAMES
+    matching names of each kind are ranked, so common queries do not look
+    at every name.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Key: file path
+        # Value: symbols of the file
+        self._files = {}
+        # Key: lower-case name
+        # Value: {file path: [symbols]}
+        self._by_name = {}
+        # Key: trigram
+        # Value: set of lower-case names
+        self._trigrams = {}
+        # Lower-case names for prefix search
+        self._sorted_names = SortedNames()
+
+    def update(self, path, symbols):
+        with self._lock:
+            old_symbols = self._files.get(path, [])
+            self._files[path] = symbols
+
+            # Key: lower-case name
+            # Value: symbols of the file with the name
+            file_names = {}
+            for symbol in symbols:
+                file_names.setdefault(symbol.name.lower(), []).append(symbol)
+
+            # Only names which are added to or removed from the file change
+            # the index
+            for name in set(s.name.lower() for s in old_symbols):
+                if name not in file_names:
+                    self._remove_name(path, name)
+
+            for name, name_symbols in file_names.items():
+                files = self._by_name.get(name)
+                if files is None:
+                    files = self._by_name[name] = {}
+                    for trigram in trigrams(name):
+                        self._trigrams.setdefault(trigram, set()).add(name)
+                    self._sorted_names.add(name)
+                files[path] = name_symbols
+
+    def remove(self, path):
+        with self._lock:
+            for name in set(s.name.lower()
+                            for s in self._files.pop(path, [])):
+                self._remove_name(path, name)
+
+    def _remove_name(self, path, name):
+        files = self._by_name.get(name)
+        if files is None:
+            return
+        files.pop(path, None)
+        if files:
+            return
+
+        del self._by_name[name]
+        for trigram in trigrams(name):
+            names = self._trigrams[trigram]
+            names.discard(name)
+            if not names:
+                del self._trigrams[trigram]
+        self._sorted_names.remove(name)
+
+    def _match_names(self, query, limit):
+        """
+        Returns names which start with the query and, if there are less
+        than limit of them, names which contain it
+        """
+        prefixed = itertools.takewhile(lambda name: name.startswith(query),
+                                       self._sorted_names.iter_from(query))
+        names = list(itertools.islice(prefixed, MAX_RANKED_NAMES))
+        if len(names) >= limit:
+            return names
+
+        if len(query) >= 3:
+            candidates = min((self._trigrams.get(t, ())
+                              for t in trigrams(query)), key=len)
+        else:
+            candidates = self._by_name
+        contained = (name for name in candidates
+                     if query in name and not name.startswith(query))
+        names.extend(itertools.islice(contained, MAX_RANKED_NAMES))
+        return names
+
+    def search(self, query, limit=MAX_SYMBOL_RESULTS):
+        """
+        Returns at most limit (file path, symbol) pairs
+        """
+        query = query.lower()
+
+        def rank(name):
+            return (name != query, not name.startswith(query), len(name),
+                    name)
+
+        with self._lock:
+            if query:
+                names = heapq.nsmallest(limit,
+                                        self._match_names(query, limit),
+                                        key=rank)
+            else:
+                # Empty query, any symbols can be returned
+                names = list(itertools.islice(self._by_name, limit))
+            results = []
+            for name in names:
+                for path, symbols in self._by_name[name].items():
+                    results.extend((path, symbol) for symbol in symbols)
+                if len(results) >= limit:
+                    break
+            return results[:limit]
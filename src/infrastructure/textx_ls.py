@@ -11,15 +11,21 @@ from ..utils import _utils, uris
 from ..infrastructure.language_server import LanguageServer
 from ..infrastructure.workspace import Workspace
 from ..infrastructure.configuration import Configuration
-from ..infrastructure.lsp import MessageType
+from ..infrastructure.index_store import IndexStore, default_index_path
+from ..infrastructure.indexer import WorkspaceIndexer
+from ..infrastructure.lint_scheduler import LintScheduler
+from ..infrastructure.lsp import FileChangeType, MessageType
 
 from ..capabilities import get_capabilities
 from ..capabilities.completions import completions
-from ..capabilities.lint import lint
+from ..capabilities.lint import document_diagnostic, lint_all, \
+    lint_files, workspace_diagnostic
 from ..capabilities.hover import hover
 from ..capabilities.definitions import definitions
+from ..capabilities.document_highlight import document_highlight
 from ..capabilities.find_references import find_all_references
 from ..capabilities.code_lens import code_lens
+from ..capabilities.workspace_symbols import workspace_symbols
 
 from ..commands import get_commands
 
@@ -39,12 +45,51 @@ class TextXLanguageServer(LanguageServer):
     """
     workspace = None
     configuration = None
+    indexer = None
+    lint_scheduler = None
+    file_lint_scheduler = None
 
     commands = get_commands()
 
     def capabilities(self):
         cmd_list = list(self.commands.keys())
-        return get_capabilities(cmd_list)
+        return get_capabilities(cmd_list, self.pull_diagnostics)
+
+    @property
+    def pull_diagnostics(self):
+        """
+        If client pulls diagnostics, they are not published
+        """
+        return self.client_supports('textDocument', 'diagnostic')
+
+    def lint(self, doc_uri, active=False):
+        if not self.pull_diagnostics:
+            self.lint_scheduler.schedule(doc_uri, active)
+
+    def refresh_diagnostics(self):
+        """
+        Diagnostics of all documents are changed (e.g. grammar is changed)
+        """
+        if self.pull_diagnostics:
+            self._request_diagnostic_refresh()
+        else:
+            for doc_uri in self.workspace.documents:
+                self.lint_scheduler.schedule(doc_uri)
+
+    def diagnostics_changed(self, doc_uri):
+        """
+        Diagnostics of the parsed document are changed without an edit
+        (e.g. errors which follow the first one are collected)
+        """
+        if self.pull_diagnostics:
+            # Client pulled diagnostics of the first error already
+            self._request_diagnostic_refresh()
+        else:
+            self.lint_scheduler.schedule(doc_uri)
+
+    def _request_diagnostic_refresh(self):
+        if self.client_supports('workspace', 'diagnostics', 'refreshSupport'):
+            self.call('workspace/diagnostic/refresh')
 
     def initialize(self, root_uri, init_opts, _process_id):
         self.process_id = _process_id
@@ -55,7 +100,10 @@ class TextXLanguageServer(LanguageServer):
 
         self.gen_cmd_finished = True
 
-        self.workspace = Workspace(root_uri, self)
+        self.workspace = Workspace(root_uri, self, self.position_encoding)
+        self.lint_scheduler = LintScheduler(
+            lambda doc_uris: lint_all(doc_uris, self.workspace),
+            self.workspace.get_parse_time)
 
         # Change config uri for generated extensions
         config_root_uri = uris.to_fs_path(root_uri)
@@ -63,32 +111,80 @@ class TextXLanguageServer(LanguageServer):
             config_root_uri = join(LS_ROOT_PATH, 'txconfig')
 
         self.configuration = Configuration(config_root_uri)
+        self.configuration.warm_up()
+
+        # Index model files which are not opened
+        if self.workspace.is_local():
+            self.indexer = WorkspaceIndexer(
+                self.workspace.root_path, self.configuration,
+                self._open_index_store(), workspace=self.workspace,
+                indexed_callback=lambda f: self._lint_file(f.path),
+                removed_callback=self._lint_file,
+                position_encoding=self.position_encoding)
+            # Diagnostics of closed files
+            self.file_lint_scheduler = LintScheduler(
+                lambda doc_uris: lint_files(doc_uris, self.workspace,
+                                            self.indexer))
+            self.indexer.start()
+
+    def _lint_file(self, path):
+        """
+        Publishes diagnostics of the closed file after it is indexed or
+        removed from the index
+        """
+        if not self.pull_diagnostics:
+            self.file_lint_scheduler.schedule(uris.from_fs_path(path))
+
+    def _open_index_store(self):
+        try:
+            return IndexStore(default_index_path(self.workspace.root_path),
+                              self.position_encoding)
+        except:
+            log.warning("Index store can not be opened, workspace will be "
+                        "indexed again on every start.")
+
+    def m_shutdown(self, **_kwargs):
+        if self.indexer is not None:
+            self.indexer.shutdown()
+        if self.lint_scheduler is not None:
+            self.lint_scheduler.stop()
+        if self.file_lint_scheduler is not None:
+            self.file_lint_scheduler.stop()
+        super(TextXLanguageServer, self).m_shutdown(**_kwargs)
 
     def m_text_document__did_close(self, textDocument=None, **_kwargs):
         # Remove document from workspace
         self.workspace.rm_document(textDocument['uri'])
+        self.lint_scheduler.discard(textDocument['uri'])
+        path = uris.to_fs_path(textDocument['uri'])
+        if self.indexer is not None:
+            self.indexer.file_closed(path)
+        # Diagnostics of closed files are published only from the index
+        if self.indexer is None or not self.indexer.is_indexed(path):
+            self.workspace.clear_diagnostics(textDocument['uri'])
 
     def m_text_document__did_open(self, textDocument=None, **_kwargs):
         # Add document to workspace
         self.workspace.put_document(doc_uri=textDocument['uri'],
                                     content=textDocument['text'],
                                     version=textDocument.get('version'))
-        lint(textDocument['uri'], self.workspace)
+        self.lint(textDocument['uri'], active=True)
 
     def m_text_document__did_change(self,
                                     contentChanges=None,
                                     textDocument=None,
                                     **_kwargs):
-        for change in contentChanges:
-            self.workspace.update_document(
-                textDocument['uri'],
-                change,
-                version=textDocument.get('version')
-            )
-        lint(textDocument['uri'], self.workspace)
+        self.workspace.update_document(
+            textDocument['uri'],
+            contentChanges,
+            version=textDocument.get('version')
+        )
+        self.lint(textDocument['uri'], active=True)
 
     def m_text_document__did_save(self, textDocument=None, **_kwargs):
-        lint(textDocument['uri'], self.workspace)
+        self.lint(textDocument['uri'], active=True)
+        if self.indexer is not None:
+            self.indexer.file_changed(uris.to_fs_path(textDocument['uri']))
 
     def m_text_document__code_action(self, textDocument=None, range=None,
                                      context=None, **_kwargs):
@@ -112,10 +208,15 @@ class TextXLanguageServer(LanguageServer):
     def m_text_document__document_symbol(self, textDocument=None, **_kwargs):
         pass
 
-    # def m_text_document__document_highlight(self, textDocument=None,
-    #                                         **_kwargs):
-    #     # return self.document_symbols(textDocument['uri'])
-    #     pass
+    def m_text_document__diagnostic(self, textDocument=None,
+                                    previousResultId=None, **_kwargs):
+        return document_diagnostic(textDocument['uri'], self.workspace,
+                                   previousResultId)
+
+    def m_text_document__document_highlight(self, textDocument=None,
+                                            position=None, **_kwargs):
+        return document_highlight(textDocument['uri'], self.workspace,
+                                  position)
 
     def m_text_document__formatting(self, textDocument=None, options=None,
                                     **_kwargs):
@@ -140,11 +241,20 @@ class TextXLanguageServer(LanguageServer):
     def m_workspace__did_change_watched_files(self, **_kwargs):
         for change in _kwargs['changes']:
             path = uris.to_fs_path(change['uri'])
+            if change.get('type') == FileChangeType.Deleted:
+                if self.indexer is not None:
+                    self.indexer.remove(path)
+                continue
+
             # Grammar changed
             try:
                 if os.path.samefile(path,
                                     self.configuration.grammar_path):
-                    pass
+                    self.configuration.invalidate_mm_cache()
+                    self.workspace.parse_all()
+                    self.refresh_diagnostics()
+                    if self.indexer is not None:
+                        self.indexer.reindex_all()
 
                 # Configuration file changed
                 elif os.path.samefile(path,
@@ -162,8 +272,9 @@ class TextXLanguageServer(LanguageServer):
                                                  get_all_extensions())
 
                         self.workspace.parse_all()
-                        for doc_uri in self.workspace.documents:
-                            lint(doc_uri, self.workspace)
+                        self.refresh_diagnostics()
+                        if self.indexer is not None:
+                            self.indexer.restart()
                     else:
                         self.workspace.show_message("Error in .txconfig file.",
                                                     MessageType.Error)
@@ -174,8 +285,17 @@ class TextXLanguageServer(LanguageServer):
             else:
                 txdoc = self.workspace.get_document(change['uri'])
                 if txdoc is not None:
-                    txdoc.parse_model(txdoc.source)
-                    lint(change['uri'], self.workspace)
+                    self.workspace.parse_document(change['uri'])
+                    self.lint(change['uri'])
+                if self.indexer is not None:
+                    self.indexer.file_changed(path)
+
+    def m_workspace__symbol(self, query=None, **_kwargs):
+        return workspace_symbols(self.workspace, query or '')
+
+    def m_workspace__diagnostic(self, previousResultIds=None, **_kwargs):
+        return workspace_diagnostic(self.workspace, previousResultIds,
+                                    self.indexer)
 
     def m_workspace__execute_command(self, command=None, arguments=None):
         try:
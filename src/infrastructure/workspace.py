@@ -1,23 +1,43 @@
 # Copyright 2017 Palantir Technologies, Inc.
 # Added TextXDocument class
-import io
 import logging
 import os
 import re
 import sys
 import itertools
+import threading
+
+from collections import namedtuple
 
 from ..infrastructure import lsp
-from ..utils import uris, _utils
+from ..infrastructure.incremental import IncrementalParseError, \
+    reparse_region
+from ..infrastructure.indexer import index_model
+from ..infrastructure.parse_scheduler import ParseScheduler, \
+    ParseBudgetExceeded, model_from_str
+from ..infrastructure.recovery import recover_errors
+from ..infrastructure.symbol_index import SymbolIndex
+from ..utils import uris
+from ..utils.file_source import file_sources
+from ..utils.line_index import LineIndex, units_table, units_to_col
+from ..utils.rope import Rope
+from ..utils.reference_map import ReferenceMap
+from ..utils.rule_tree import RuleTree
 
 from textx.exceptions import TextXSemanticError, TextXSyntaxError
 
 log = logging.getLogger(__name__)
 
+# Unique id of each parse result, used as result id of pulled diagnostics
+_parse_ids = itertools.count(1)
+
 # TODO: this is not the best e.g. we capture numbers
 RE_START_WORD = re.compile('[A-Za-z_0-9]*$')
 RE_END_WORD = re.compile('^[A-Za-z_0-9]*')
 
+# Max seconds to wait for a document to be parsed
+PARSE_WAIT_TIMEOUT_S = 10
+
 
 class Workspace(object):
 
@@ -25,12 +45,23 @@ class Workspace(object):
     M_APPLY_EDIT = 'workspace/applyEdit'
     M_SHOW_MESSAGE = 'window/showMessage'
 
-    def __init__(self, root_uri, lang_server=None):
+    def __init__(self, root_uri, lang_server=None,
+                 position_encoding=lsp.PositionEncodingKind.UTF16):
         self._root_uri = root_uri
+        self.position_encoding = position_encoding
         self._root_uri_scheme = uris.urlparse(self._root_uri)[0]
         self._root_path = uris.to_fs_path(self._root_uri)
         self._docs = {}
         self._lang_server = lang_server
+        self._parse_scheduler = ParseScheduler(
+            parsed_callback=self._document_parsed,
+            recovered_callback=self._document_recovered)
+        # Named rule instances of opened documents and indexed files
+        self.symbol_index = SymbolIndex()
+        # Key: document uri
+        # Value: last published diagnostics
+        self._published = {}
+        self._publish_lock = threading.Lock()
 
     @property
     def documents(self):
@@ -55,33 +86,99 @@ class Workspace(object):
         except KeyError:
             return None
 
+    def get_snapshot(self, doc_uri, timeout=PARSE_WAIT_TIMEOUT_S):
+        """
+        Returns snapshot of the document after its latest version is parsed
+        """
+        if not self._parse_scheduler.wait(doc_uri, timeout):
+            log.warning("Parsing of %s is not finished in %s seconds.",
+                        doc_uri, timeout)
+        txdoc = self.get_document(doc_uri)
+        if txdoc is not None:
+            return txdoc.snapshot
+
+    def get_parse_time(self, doc_uri):
+        return self._parse_scheduler.parse_time(doc_uri)
+
     def put_document(self, doc_uri, content, version=None):
         document = TextXDocument(
             config=self._lang_server.configuration,
             uri=doc_uri,
             source=content,
-            version=version
+            version=version,
+            position_encoding=self.position_encoding
         )
         self._docs[doc_uri] = document
+        self._parse_scheduler.schedule(document)
         return document
 
     def rm_document(self, doc_uri):
         try:
-            self._docs.pop(doc_uri)
+            txdoc = self._docs.pop(doc_uri)
+            self._parse_scheduler.discard(doc_uri)
+            self.symbol_index.remove(txdoc.path)
         except KeyError:
             pass
 
-    def update_document(self, doc_uri, change, version=None):
-        self._docs[doc_uri].apply_change(change)
-        self._docs[doc_uri].version = version
+    def _document_parsed(self, txdoc):
+        snapshot = txdoc.snapshot
+        if snapshot.is_valid_model and snapshot.last_valid_model is not None:
+            symbols, _ = index_model(snapshot.last_valid_model,
+                                     snapshot.line_index)
+            self.symbol_index.update(txdoc.path, symbols)
+
+    def _document_recovered(self, txdoc):
+        # Diagnostics of the first error could be published or pulled
+        # already
+        if self._lang_server is not None:
+            self._lang_server.diagnostics_changed(txdoc.uri)
+
+    def get_document_by_path(self, path):
+        for txdoc in list(self._docs.values()):
+            if txdoc.path == path:
+                return txdoc
+
+    def update_symbols(self, path, symbols, from_disk=False):
+        # Opened documents can be newer than files on disk
+        if from_disk and self.get_document_by_path(path) is not None:
+            return
+        self.symbol_index.update(path, symbols)
+
+    def remove_symbols(self, path):
+        self.symbol_index.remove(path)
+
+    def update_document(self, doc_uri, changes, version=None):
+        """
+        Applies all changes from one notification and parses model once
+        """
+        txdoc = self._docs[doc_uri]
+        for change in changes:
+            txdoc.apply_change(change)
+
+        # Skip parsing if newer version is already parsed
+        if txdoc.is_newer_version(txdoc.version, version):
+            return
+
+        txdoc.version = version
         # Parse new model
-        self._docs[doc_uri].parse_model(self._docs[doc_uri].source)
+        self._parse_scheduler.schedule(txdoc)
+
+    def parse_document(self, doc_uri):
+        txdoc = self.get_document(doc_uri)
+        if txdoc is not None:
+            self._parse_scheduler.schedule(txdoc)
 
     def parse_all(self):
         for doc in self.documents.values():
-            doc.parse_model(doc.source)
+            # Metamodel is changed, do not keep the old one
+            doc.prefix_expected = (None, None, None)
+            self._parse_scheduler.schedule(doc)
 
     def remove_by_extension(self, supported_extensions):
+        for key, val in self.documents.items():
+            if val.file_ext not in supported_extensions:
+                self._parse_scheduler.discard(key)
+
         self._docs = {
             key: val
             for key, val in self.documents.items()
@@ -93,8 +190,39 @@ class Workspace(object):
         return self._lang_server.call(self.M_APPLY_EDIT, {'edit': edit})
 
     def publish_diagnostics(self, doc_uri, diagnostics):
-        params = {'uri': doc_uri, 'diagnostics': diagnostics}
-        self._lang_server.notify(self.M_PUBLISH_DIAGNOSTICS, params)
+        self.publish_all_diagnostics([(doc_uri, diagnostics)])
+
+    def publish_all_diagnostics(self, uri_diagnostics):
+        """
+        Publishes diagnostics of more documents in one write. Diagnostics
+        which are the same as the last published ones (client shows them
+        even after the document is closed) are not sent again.
+
+        Only documents with errors are remembered, so the cache does not
+        grow with every published document.
+        """
+        with self._publish_lock:
+            params_list = []
+            for doc_uri, diagnostics in uri_diagnostics:
+                if self._published.get(doc_uri, []) == diagnostics:
+                    continue
+                if diagnostics:
+                    self._published[doc_uri] = diagnostics
+                else:
+                    self._published.pop(doc_uri, None)
+                params_list.append({'uri': doc_uri,
+                                    'diagnostics': diagnostics})
+
+            if params_list:
+                self._lang_server.notify_all(self.M_PUBLISH_DIAGNOSTICS,
+                                             params_list)
+
+    def clear_diagnostics(self, doc_uri):
+        """
+        Document is not tracked anymore, so its diagnostics would never be
+        updated
+        """
+        self.publish_all_diagnostics([(doc_uri, [])])
 
     def show_message(self, message, msg_type=lsp.MessageType.Info):
         params = {'type': msg_type, 'message': message}
@@ -103,18 +231,26 @@ class Workspace(object):
 
 class Document(object):
 
-    def __init__(self, uri, source=None, version=None, local=True):
+    def __init__(self, uri, source=None, version=None, local=True,
+                 position_encoding=lsp.PositionEncodingKind.UTF16):
         self.uri = uri
         self.version = version
+        self.position_encoding = position_encoding
         self.path = uris.to_fs_path(uri)
         self.filename = os.path.basename(self.path)
 
         self._local = local
-        self._source = source
+        self._rope = Rope(source) if source is not None else None
+        self._line_index = None
 
     def __str__(self):
         return str(self.uri)
 
+    @staticmethod
+    def is_newer_version(version, other_version):
+        return version is not None and other_version is not None \
+            and version > other_version
+
     @property
     def file_ext(self):
         # If extension is None, return name (e.g. '.txconfig')
@@ -123,14 +259,27 @@ class Document(object):
 
     @property
     def lines(self):
-        return self.source.splitlines(True)
+        return self.line_index.lines
+
+    @property
+    def line_index(self):
+        """
+        Line index of the current source, built once per version
+        """
+        return self._get_line_index(self.source)
+
+    def _get_line_index(self, source):
+        line_index = self._line_index
+        if line_index is None or line_index.source is not source:
+            line_index = LineIndex(source, self.position_encoding)
+            self._line_index = line_index
+        return line_index
 
     @property
     def source(self):
-        if self._source is None:
-            with open(self.path, 'r') as f:
-                return f.read()
-        return self._source
+        if self._rope is None:
+            return file_sources.read(self.path)
+        return str(self._rope)
 
     def apply_change(self, change):
         """Apply a change to the document."""
@@ -139,48 +288,32 @@ class Document(object):
 
         if not change_range:
             # The whole file has changed
-            self._source = text
+            self._rope = Rope(text)
             return
 
-        start_line = change_range['start']['line']
-        start_col = change_range['start']['character']
-        end_line = change_range['end']['line']
-        end_col = change_range['end']['character']
-
-        # Check for an edit occuring at the very end of the file
-        if start_line == len(self.lines):
-            self._source = self.source + text
-            return
-
-        new = io.StringIO()
-
-        # Iterate over the existing document until we hit the edit range,
-        # at which point we write the new text, then loop until we hit
-        # the end of the range and continue writing.
-        for i, line in enumerate(self.lines):
-            if i < start_line:
-                new.write(line)
-                continue
+        if self._rope is None:
+            self._rope = Rope(self.source)
 
-            if i > end_line:
-                new.write(line)
-                continue
+        start = self._offset(change_range['start'])
+        end = self._offset(change_range['end'])
+        self._rope = self._rope.replace(start, end, text)
 
-            if i == start_line:
-                new.write(line[:start_col])
-                new.write(text)
-
-            if i == end_line:
-                new.write(line[end_col:])
-
-        self._source = new.getvalue()
+    def _offset(self, position):
+        line = position['line']
+        table = units_table(self._rope.line(line), self.position_encoding)
+        return self._rope.offset(line,
+                                 units_to_col(table, position['character']))
 
     def word_at_position(self, position):
         """
         Get the word under the cursor returning the start and end positions.
         """
-        line = self.lines[position['line']]
-        i = position['character']
+        if self._rope is None:
+            line = self.lines[position['line']]
+        else:
+            line = self._rope.line(position['line'])
+        i = units_to_col(units_table(line, self.position_encoding),
+                         position['character'])
         # Split word in two
         start = line[:i]
         end = line[i:]
@@ -195,16 +328,24 @@ class Document(object):
 
 class TextXDocument(Document):
 
-    def __init__(self, config, uri, source=None, version=None, local=True):
-        super(TextXDocument, self).__init__(uri, source, version, local)
+    def __init__(self, config, uri, source=None, version=None, local=True,
+                 position_encoding=lsp.PositionEncodingKind.UTF16):
+        super(TextXDocument, self).__init__(uri, source, version, local,
+                                            position_encoding)
 
         self.config = config
 
-        self.last_valid_model = None
-        self.tx_syntax_errors = []
-        self.tx_semantic_errors = []
-
-        self.parse_model(self.source)
+        # Metamodel, source prefix and rules expected after it, of the
+        # last completion request
+        self.prefix_expected = (None, None, None)
+        # Source and model of the last valid parse, used as a base for
+        # incremental reparsing
+        self._last_valid = (None, None)
+        # State of the last parsed version, replaced after every parse
+        line_index = LineIndex('')
+        self.snapshot = DocumentSnapshot(uri, None, '', line_index, None,
+                                         (), (), RuleTree({}),
+                                         ReferenceMap([], line_index), 0)
 
     def parse_model(self, model_source, change_state=True):
         """
@@ -218,38 +359,191 @@ class TextXDocument(Document):
             List of syntax errors
             List of semantic errors
         """
-        # Return lists
+        model, syn_errs, sem_errs = self.parse_source(model_source,
+                                                      recover=True)
+
+        if change_state:
+            self.set_parse_result(self.version, model, syn_errs, sem_errs,
+                                  model_source)
+
+        return syn_errs, sem_errs
+
+    def parse_source(self, model_source, incremental=False, recover=False):
+        """
+        Parses model source without changing object's state.
+
+        If incremental is True, only the edited top-level rule instance of
+        the last valid model is parsed again, when that is possible.
+
+        If recover is True, parsing continues after an error to collect
+        more errors, and the model of recovered parts is returned.
+
+        Returns:
+            Model or None if model is not valid (or could not be recovered)
+            List of syntax errors
+            List of semantic errors
+        """
+        model = None
+        metamodel = None
+        budget = None
         syn_errs = []
         sem_errs = []
 
         # Parse
         try:
             log.debug("Parsing model source: " + model_source)
-            model = self.config.get_mm_by_ext(self.file_ext)\
-                               .model_from_str(model_source)
+            metamodel = self.config.get_mm_by_ext(self.file_ext)
+            budget = self.config.get_parse_budget(self.file_ext)
+            if incremental:
+                model = self._reparse(metamodel, model_source, budget)
+            if model is None:
+                model = model_from_str(metamodel, model_source, budget)
+            log.debug("Parsing model. Model is valid. Source: {0}".format(
+                      model_source))
+
+        except (TextXSyntaxError, TextXSemanticError) as e:
+            log.debug("Parsing model error: " + str(e))
+            if recover and metamodel is not None:
+                return self.recover_source(model_source, e)
+            if isinstance(e, TextXSyntaxError):
+                syn_errs.append(e)
+            else:
+                sem_errs.append(e)
+        except ParseBudgetExceeded as e:
+            self.config.parse_budget_overruns[self.file_ext] += 1
+            log.warning("Parse budget exceeded for %s (%s overruns).",
+                        self.uri,
+                        self.config.parse_budget_overruns[self.file_ext])
+            syn_errs.append(e)
 
-            # Change object's state
-            if change_state:
-                log.debug("Parsing model. Model is valid. Source: {0}".format(
-                          model_source))
-                self.last_valid_model = model
+        return model, syn_errs, sem_errs
 
-        except TextXSyntaxError as e:
-            log.debug("Parsing model syntax error: " + str(e))
-            syn_errs.append(e)
-        except TextXSemanticError as e:
-            log.debug("Parsing model semantic error: " + str(e))
-            sem_errs.append(e)
+    def recover_source(self, model_source, error, cancelled=None):
+        """
+        Collects errors which follow the first error of the model source.
 
-        if change_state:
-            self.syntax_errors = syn_errs
-            self.semantic_errors = sem_errs
+        Returns:
+            Model of the recovered parts or None
+            List of syntax errors
+            List of semantic errors
+        """
+        model, errors = recover_errors(
+            self.config.get_mm_by_ext(self.file_ext), model_source, error,
+            self.config.get_grammar_tables(self.file_ext), self._last_valid,
+            cancelled=cancelled)
 
-        return syn_errs, sem_errs
+        syn_errs = [e for e in errors if isinstance(e, TextXSyntaxError)]
+        sem_errs = [e for e in errors if not isinstance(e, TextXSyntaxError)]
+        return model, syn_errs, sem_errs
+
+    def _reparse(self, metamodel, model_source, budget):
+        """
+        Returns incrementally parsed model or None if the whole model
+        has to be parsed. ParseBudgetExceeded is raised as for the full
+        parse, so the budget is not spent twice.
+        """
+        base_source, base_model = self._last_valid
+        if base_model is None or \
+                getattr(base_model, '_tx_metamodel', None) is not metamodel:
+            return None
+
+        try:
+            return reparse_region(metamodel, base_model, base_source,
+                                  model_source, budget)
+        except IncrementalParseError as e:
+            log.debug("Incremental parse is not possible: " + str(e))
+            return None
+        except ParseBudgetExceeded:
+            # Full parse would get the whole budget again
+            raise
+        except Exception:
+            log.exception("Incremental parse failed for %s.", self.uri)
+            return None
+
+    def set_parse_result(self, version, model, syntax_errors, semantic_errors,
+                         source=None):
+        if source is None:
+            source = self.source
+
+        line_index = self._get_line_index(source)
+        if model is not None:
+            if not syntax_errors and not semantic_errors:
+                self._last_valid = (source, model)
+            # Positions of references are valid only for parsed source
+            reference_map = ReferenceMap.from_model(model, line_index)
+        else:
+            model = self.snapshot.last_valid_model
+            reference_map = ReferenceMap([], line_index)
+
+        if model is self.snapshot.last_valid_model:
+            rule_tree = self.snapshot.rule_tree
+        else:
+            rule_tree = RuleTree.from_model(model)
+
+        self.snapshot = DocumentSnapshot(self.uri, version, source,
+                                         line_index, model,
+                                         tuple(syntax_errors),
+                                         tuple(semantic_errors), rule_tree,
+                                         reference_map, next(_parse_ids))
+
+    @property
+    def last_valid_model(self):
+        return self.snapshot.last_valid_model
+
+    @property
+    def parsed_version(self):
+        return self.snapshot.version
+
+    @property
+    def syntax_errors(self):
+        return self.snapshot.syntax_errors
+
+    @property
+    def semantic_errors(self):
+        return self.snapshot.semantic_errors
+
+    @property
+    def is_valid_model(self):
+        return self.snapshot.is_valid_model
+
+    @property
+    def all_errors(self):
+        return self.snapshot.all_errors
+
+    @property
+    def has_syntax_errors(self):
+        return self.snapshot.has_syntax_errors
+
+    @property
+    def has_semantic_errors(self):
+        return self.snapshot.has_semantic_errors
+
+    def get_rule_inst_at_position(self, position):
+        return self.snapshot.get_rule_inst_at_position(position)
+
+    def get_rule_chain_at_position(self, position):
+        return self.snapshot.get_rule_chain_at_position(position)
+
+    def get_all_rule_instances(self):
+        return self.snapshot.get_all_rule_instances()
+
+
+class DocumentSnapshot(namedtuple('DocumentSnapshot', [
+        'uri', 'version', 'source', 'line_index', 'last_valid_model',
+        'syntax_errors', 'semantic_errors', 'rule_tree',
+        'reference_map', 'parse_id'])):
+    """
+    Immutable state of one parsed document version.
+
+    Document gets a new snapshot after each parse, so background workers
+    (lint, outline...) can keep a reference to it and read source, line
+    index, model and errors of the same version without locking.
+    """
+    __slots__ = ()
 
     @property
     def is_valid_model(self):
-        return len(list(self.all_errors)) == 0
+        return not self.syntax_errors and not self.semantic_errors
 
     @property
     def all_errors(self):
@@ -270,17 +564,36 @@ class TextXDocument(Document):
         if self.last_valid_model is None:
             return
 
-        offset = _utils.line_col_to_pos(self.source, position)
+        offset = self.line_index.line_col_to_pos(position)
+        return self.rule_tree.innermost(offset)
 
-        rules_dict = self.last_valid_model._pos_rule_dict
+    def get_referenced_span_at_position(self, position):
+        """
+        Returns (start, end) of the rule at cursor position, or of the rule
+        referenced at cursor position
+        """
+        if self.last_valid_model is None:
+            return
+
+        offset = self.line_index.line_col_to_pos(position)
+        ref_rule = self.reference_map.reference_at(offset)
+        if ref_rule is not None:
+            return ref_rule.def_pos_start, ref_rule.def_pos_end
+
+        rule = self.rule_tree.innermost(offset)
+        if rule is not None:
+            return rule._tx_position, rule._tx_position_end
 
-        rule = None
-        for p in rules_dict.keys():
-            if p[1] > offset > p[0]:
-                rule = rules_dict[p]
-                break
+    def get_rule_chain_at_position(self, position):
+        """
+        Returns all rules which enclose cursor position, from the innermost
+        to the outermost one
+        """
+        if self.last_valid_model is None:
+            return []
 
-        return rule
+        offset = self.line_index.line_col_to_pos(position)
+        return self.rule_tree.enclosing(offset)
 
     def get_all_rule_instances(self):
         """
@@ -288,8 +601,8 @@ class TextXDocument(Document):
         """
         builtins = []
         try:
-            builtins = list(self.config.get_mm_by_ext(
-                                self.file_ext).builtins.values())
+            builtins = list(
+                self.last_valid_model._tx_metamodel.builtins.values())
         except:
             pass
 
@@ -1,57 +1,82 @@
 # Copyright 2017 Palantir Technologies, Inc.
 import os
-import functools
 import threading
 import imp
 
 
-def debounce(interval_s):
-    """Debounce calls to this function until interval_s seconds have passed."""
-    def wrapper(func):
-        @functools.wraps(func)
-        def debounced(*args, **kwargs):
-            if hasattr(debounced, '_timer'):
-                debounced._timer.cancel()
-            debounced._timer = threading.Timer(interval_s, func, args, kwargs)
-            debounced._timer.start()
-        return debounced
-    return wrapper
+def split_module_path(path_to_module):
+    """
+    Splits 'path/to/module.py:func_name' into module path and function name
+    """
+    # Skip first two chars because of windows drive letter (e.g. 'C:')
+    func_name = path_to_module[2:].split(':')[1]
+    path_name = path_to_module.replace(':{}'.format(func_name), '')
+    return path_name, func_name
 
 
-def exec_func_from_module(path_to_module, module_name):
+def get_mtime(path):
     try:
-        func_name = path_to_module[2:].split(':')[1]
-        path_name = path_to_module.replace(':{}'.format(func_name), '')
-        module = imp.load_source(module_name, path_name)
-        return getattr(module, func_name)()
-    except:
+        return os.path.getmtime(path)
+    except (OSError, TypeError):
         return None
 
 
-def flatten(list_of_lists):
-    return [item for lst in list_of_lists for item in lst]
+def get_module_mtime(path_to_module):
+    try:
+        path_name, _ = split_module_path(path_to_module)
+    except (AttributeError, IndexError):
+        return None
+    return get_mtime(path_name)
+
+
+class ModuleCache(object):
+    """
+    Caches modules loaded from source files and results of their
+    functions. Module is loaded again only if it is changed on disk.
+    """
+
+    def __init__(self):
+        # Key: module path
+        # Value: (mtime, module, {func_name: result})
+        self._modules = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
 
+    def exec_func(self, path_name, func_name, module_name):
+        mtime = get_mtime(path_name)
+        with self._lock:
+            entry = self._modules.get(path_name)
+            if entry is None or entry[0] != mtime:
+                module = imp.load_source(module_name, path_name)
+                entry = (mtime, module, {})
+                self._modules[path_name] = entry
 
-def line_col_to_pos(source, position):
-    line = position['line']
-    col = position['character']
+            _, module, results = entry
+            try:
+                result = results[func_name]
+                self.hits += 1
+            except KeyError:
+                result = getattr(module, func_name)()
+                results[func_name] = result
+                self.misses += 1
+            return result
 
-    lines = source.splitlines()
-    offset = 0
-    for l in range(0, line):
-        offset += (len(lines[l]) + 2)
-    offset += col
+    def clear(self):
+        with self._lock:
+            self._modules = {}
 
-    return offset
 
+module_cache = ModuleCache()
 
-def pos_to_line_col(source, pos):
-    line = 0
-    lines = source.splitlines()
-    for _ in lines:
-        temp = pos - (len(lines[line]) + 2)
-        if temp >= 0:
-            pos = temp
-            line += 1
 
-    return line, pos
+def exec_func_from_module(path_to_module, module_name):
+    try:
+        path_name, func_name = split_module_path(path_to_module)
+        return module_cache.exec_func(path_name, func_name, module_name)
+    except:
+        return None
+
+
+def flatten(list_of_lists):
+    return [item for lst in list_of_lists for item in lst]
@@ -0,0 +1,122 @@
+"""
+Module for reading sources of model files which are not opened in editor
+"""
+import mmap
+import os
+import threading
+
+from collections import OrderedDict
+
+__author__ = "Daniel Elero"
+__copyright__ = "textX-tools"
+__license__ = "MIT"
+
+
+# Max total length of cached texts, in characters
+MAX_CACHED_CHARS = 8 * 1024 * 1024
+
+
+class FileSource(object):
+    """
+    Text of a file on disk.
+
+    File is memory-mapped and decoded only when its text is requested.
+    Text is cached until file modification time or size is changed, so
+    reading an unchanged file again costs only one stat call.
+    """
+
+    def __init__(self, path, encoding='utf-8'):
+        self.path = path
+        self.encoding = encoding
+        # ((mtime, size), text)
+        self._cached = (None, None)
+
+    def _stat_key(self):
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def read(self):
+        key = self._stat_key()
+        cached_key, text = self._cached
+        if cached_key == key:
+            return text
+
+        with open(self.path, 'rb') as f:
+            if key[1] == 0:
+                # Empty files can not be mapped
+                text = ''
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                    text = str(m, self.encoding)
+
+        self._cached = (key, text)
+        return text
+
+    @property
+    def cached_size(self):
+        _, text = self._cached
+        return len(text) if text is not None else 0
+
+
+class FileSourceCache(object):
+    """
+    Recently read file sources of the workspace, shared by documents and
+    indexers. Least recently read sources are dropped when total length of
+    cached texts is over the limit.
+    """
+
+    def __init__(self, max_chars=MAX_CACHED_CHARS):
+        self.max_chars = max_chars
+        self._lock = threading.Lock()
+        # Key: file path
+        # Value: FileSource, least recently read first
+        self._sources = OrderedDict()
+        # Key: file path
+        # Value: length of cached text
+        self._sizes = {}
+        self._total_size = 0
+
+    def get(self, path):
+        with self._lock:
+            try:
+                source = self._sources[path]
+                self._sources.move_to_end(path)
+            except KeyError:
+                source = FileSource(path)
+                self._sources[path] = source
+            return source
+
+    def read(self, path):
+        source = self.get(path)
+        text = source.read()
+        with self._lock:
+            # Source could be discarded while it was read
+            if self._sources.get(path) is source:
+                self._set_size(path, source.cached_size)
+                self._evict(keep=path)
+        return text
+
+    def _set_size(self, path, size):
+        self._total_size += size - self._sizes.pop(path, 0)
+        if size:
+            self._sizes[path] = size
+
+    def _evict(self, keep):
+        while self._total_size > self.max_chars:
+            path = next(iter(self._sources))
+            if path == keep:
+                break
+            del self._sources[path]
+            self._set_size(path, 0)
+
+    def discard(self, path):
+        with self._lock:
+            self._sources.pop(path, None)
+            self._set_size(path, 0)
+
+    @property
+    def total_size(self):
+        return self._total_size
+
+
+file_sources = FileSourceCache()
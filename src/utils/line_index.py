@@ -0,0 +1,127 @@
+"""
+Module for converting between source offsets and line/column positions
+"""
+import bisect
+import re
+
+from ..infrastructure.lsp import PositionEncodingKind
+from .rope import RE_LINE_BREAK
+
+__author__ = "Daniel Elero"
+__copyright__ = "textX-tools"
+__license__ = "MIT"
+
+
+# Characters which are more than one code unit long in the encoding
+RE_MULTI_UNIT_CHAR = {
+    PositionEncodingKind.UTF8: re.compile('[^\x00-\x7f]'),
+    PositionEncodingKind.UTF16: re.compile('[\U00010000-\U0010ffff]')
+}
+
+
+def units_table(line, encoding):
+    """
+    Returns offsets (in code units) of all characters in the line,
+    or None if every character of the line is one code unit long.
+    """
+    multi_unit_char = RE_MULTI_UNIT_CHAR.get(encoding)
+    if multi_unit_char is None or multi_unit_char.search(line) is None:
+        return None
+
+    table = [0]
+    for ch in line:
+        if encoding == PositionEncodingKind.UTF8:
+            size = len(ch.encode('utf-8'))
+        else:
+            size = 2 if ord(ch) > 0xFFFF else 1
+        table.append(table[-1] + size)
+    return table
+
+
+def col_to_units(table, col):
+    if table is None:
+        return col
+    if col >= len(table):
+        return table[-1] + col - len(table) + 1
+    return table[col]
+
+
+def units_to_col(table, units):
+    if table is None:
+        return units
+    if units > table[-1]:
+        return len(table) - 1 + units - table[-1]
+    return bisect.bisect_left(table, units)
+
+
+class LineIndex(object):
+    """
+    Start offsets of all lines in the source.
+
+    Index is built once per source (document version), and every
+    conversion is a binary search. Lines are terminated by LF, CRLF or CR.
+
+    Columns are in code units of the negotiated position encoding.
+    Conversion tables are built only for lines with multi-unit characters,
+    when the line is used for the first time.
+    """
+
+    def __init__(self, source, encoding=PositionEncodingKind.UTF32):
+        self.source = source
+        self.encoding = encoding
+        self.line_starts = [0]
+        self.line_starts.extend(m.end()
+                                for m in RE_LINE_BREAK.finditer(source))
+        self._lines = None
+        # Key: line number
+        # Value: code units table of the line
+        self._units_tables = {}
+
+    @property
+    def lines(self):
+        """
+        Lines of the source with their line terminators
+        """
+        if self._lines is None:
+            ends = self.line_starts[1:] + [len(self.source)]
+            self._lines = [self.source[start:end] for start, end
+                           in zip(self.line_starts, ends)]
+            if self._lines[-1] == '':
+                # As str.splitlines, there is no empty line after the last
+                # line terminator
+                self._lines.pop()
+        return self._lines
+
+    def _units_table(self, line):
+        if self.encoding == PositionEncodingKind.UTF32:
+            return None
+
+        try:
+            return self._units_tables[line]
+        except KeyError:
+            start = self.line_starts[line]
+            end = self.line_starts[line + 1] \
+                if line + 1 < len(self.line_starts) else len(self.source)
+            table = units_table(self.source[start:end], self.encoding)
+            self._units_tables[line] = table
+            return table
+
+    def encode_col(self, line, col):
+        """
+        Returns column (in characters) of the line in code units
+        """
+        if line >= len(self.line_starts):
+            return col
+        return col_to_units(self._units_table(line), col)
+
+    def line_col_to_pos(self, position):
+        line = position['line']
+
+        if line >= len(self.line_starts):
+            return len(self.source)
+        col = units_to_col(self._units_table(line), position['character'])
+        return self.line_starts[line] + col
+
+    def pos_to_line_col(self, pos):
+        line = bisect.bisect_right(self.line_starts, pos) - 1
+        return line, self.encode_col(line, pos - self.line_starts[line])
@@ -0,0 +1,80 @@
+"""
+Module for looking up cross-references of a parsed model
+"""
+import bisect
+
+from collections import OrderedDict
+
+__author__ = "Daniel Elero"
+__copyright__ = "textX-tools"
+__license__ = "MIT"
+
+
+class ReferenceMap(object):
+    """
+    Cross-references of one model version grouped by referenced rule.
+
+    Map is built once per parsed version with a single pass over the
+    crossref list. Ranges are converted with the line index of the same
+    version when they are requested for the first time, so each lookup
+    costs only the number of returned ranges.
+    """
+
+    def __init__(self, crossref_list, line_index):
+        self.line_index = line_index
+        # Crossref list is sorted by ref_pos_start
+        self._crossrefs = crossref_list
+        self._ref_starts = [ref.ref_pos_start for ref in crossref_list]
+        # Key: (def_pos_start, def_pos_end)
+        # Value: list of (ref_pos_start, ref_pos_end)
+        self._references = OrderedDict()
+        for ref in crossref_list:
+            self._references.setdefault(
+                (ref.def_pos_start, ref.def_pos_end), []).append(
+                (ref.ref_pos_start, ref.ref_pos_end))
+        # Key: (def_pos_start, def_pos_end)
+        # Value: list of converted reference ranges
+        self._ranges = {}
+
+    @classmethod
+    def from_model(cls, model, line_index):
+        return cls(getattr(model, '_pos_crossref_list', []), line_index)
+
+    def to_range(self, start, end):
+        st_line, st_col = self.line_index.pos_to_line_col(start)
+        end_line, end_col = self.line_index.pos_to_line_col(end)
+        return {
+            'start': {'line': st_line, 'character': st_col},
+            'end': {'line': end_line, 'character': end_col}
+        }
+
+    def reference_at(self, offset):
+        """
+        Returns cross-reference whose span contains the offset
+        """
+        idx = bisect.bisect(self._ref_starts, offset) - 1
+        if idx < 0:
+            return None
+        ref = self._crossrefs[idx]
+        return ref if ref.ref_pos_end >= offset else None
+
+    def definitions(self):
+        """
+        Returns (def_pos_start, def_pos_end) of all referenced rules
+        """
+        return self._references.keys()
+
+    def count(self, def_span):
+        return len(self._references.get(def_span, ()))
+
+    def references(self, def_span):
+        """
+        Returns ranges of all references to the rule at def_span
+        """
+        try:
+            return self._ranges[def_span]
+        except KeyError:
+            ranges = [self.to_range(start, end)
+                      for start, end in self._references.get(def_span, ())]
+            self._ranges[def_span] = ranges
+            return ranges
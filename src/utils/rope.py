@@ -0,0 +1,271 @@
+"""
+Immutable rope used as document text storage.
+
+Text is kept in leaves of a balanced (AVL) binary tree. Every node knows
+the length and the number of line breaks of its text, so edits and
+line/offset lookups are O(log n) and the whole string is built only when
+it is needed.
+"""
+import re
+
+__author__ = "Daniel Elero"
+__copyright__ = "textX-tools"
+__license__ = "MIT"
+
+
+LEAF_SIZE = 1024
+
+# Line terminators as defined by LSP
+RE_LINE_BREAK = re.compile(r'\r\n|\r|\n')
+
+
+def _count_breaks(text):
+    return text.count('\n') + text.count('\r') - text.count('\r\n')
+
+
+class _Leaf(object):
+    __slots__ = ('text', 'length', 'breaks', 'height')
+
+    def __init__(self, text):
+        self.text = text
+        self.length = len(text)
+        self.breaks = _count_breaks(text)
+        self.height = 0
+
+
+class _Node(object):
+    __slots__ = ('left', 'right', 'length', 'breaks', 'height')
+
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+        self.length = left.length + right.length
+        self.breaks = left.breaks + right.breaks
+        self.height = max(left.height, right.height) + 1
+
+
+def _build(text):
+    """
+    Returns balanced tree for the text. CRLF is never split between leaves.
+    """
+    leaves = []
+    start = 0
+    while start < len(text):
+        end = start + LEAF_SIZE
+        if text[end - 1:end + 1] == '\r\n':
+            end += 1
+        leaves.append(_Leaf(text[start:end]))
+        start = end
+
+    if not leaves:
+        return None
+
+    while len(leaves) > 1:
+        level = [_Node(leaves[i], leaves[i + 1])
+                 for i in range(0, len(leaves) - 1, 2)]
+        if len(leaves) % 2:
+            level.append(leaves[-1])
+        leaves = level
+    return leaves[0]
+
+
+def _first_char(node):
+    while isinstance(node, _Node):
+        node = node.left
+    return node.text[:1]
+
+
+def _last_char(node):
+    while isinstance(node, _Node):
+        node = node.right
+    return node.text[-1:]
+
+
+def _append_to_last_leaf(node, text):
+    if isinstance(node, _Leaf):
+        return _Leaf(node.text + text)
+    return _Node(node.left, _append_to_last_leaf(node.right, text))
+
+
+def _balance(left, right):
+    if left.height > right.height + 1:
+        if left.left.height >= left.right.height:
+            return _Node(left.left, _Node(left.right, right))
+        return _Node(_Node(left.left, left.right.left),
+                     _Node(left.right.right, right))
+    if right.height > left.height + 1:
+        if right.right.height >= right.left.height:
+            return _Node(_Node(left, right.left), right.right)
+        return _Node(_Node(left, right.left.left),
+                     _Node(right.left.right, right.right))
+    return _Node(left, right)
+
+
+def _concat(a, b):
+    if a.height > b.height + 1:
+        return _balance(a.left, _concat(a.right, b))
+    if b.height > a.height + 1:
+        return _balance(_concat(a, b.left), b.right)
+    if isinstance(a, _Leaf) and isinstance(b, _Leaf) and \
+            a.length + b.length <= LEAF_SIZE:
+        return _Leaf(a.text + b.text)
+    return _Node(a, b)
+
+
+def _join(a, b):
+    if a is None or a.length == 0:
+        return b
+    if b is None or b.length == 0:
+        return a
+
+    # Keep CRLF in one leaf, so it is counted as one line break
+    if _last_char(a) == '\r' and _first_char(b) == '\n':
+        a = _append_to_last_leaf(a, '\n')
+        b = _split(b, 1)[1]
+        if b is None:
+            return a
+
+    return _concat(a, b)
+
+
+def _split(node, pos):
+    """
+    Returns trees with text before and after pos
+    """
+    if node is None:
+        return None, None
+
+    if isinstance(node, _Leaf):
+        left = _Leaf(node.text[:pos]) if pos > 0 else None
+        right = _Leaf(node.text[pos:]) if pos < node.length else None
+        return left, right
+
+    left_len = node.left.length
+    if pos < left_len:
+        left, right = _split(node.left, pos)
+        return left, _join(right, node.right)
+    elif pos > left_len:
+        left, right = _split(node.right, pos - left_len)
+        return _join(node.left, left), right
+    return node.left, node.right
+
+
+def _slice(node, start, end, parts):
+    """
+    Collects text between start and end (relative to the node), only
+    subtrees which overlap with it are visited
+    """
+    while isinstance(node, _Node):
+        left_len = node.left.length
+        if end <= left_len:
+            node = node.left
+        elif start >= left_len:
+            node = node.right
+            start -= left_len
+            end -= left_len
+        else:
+            _slice(node.left, start, left_len, parts)
+            node = node.right
+            start = 0
+            end -= left_len
+    parts.append(node.text[start:end])
+
+
+def _leaves(node):
+    stack = [node] if node is not None else []
+    while stack:
+        n = stack.pop()
+        if isinstance(n, _Leaf):
+            yield n
+        else:
+            stack.append(n.right)
+            stack.append(n.left)
+
+
+class Rope(object):
+    """
+    Immutable text. Edits return a new rope which shares unchanged
+    subtrees with the old one.
+    """
+
+    def __init__(self, text=''):
+        self._root = _build(text)
+        self._text = text
+
+    @classmethod
+    def _from_root(cls, root):
+        rope = cls.__new__(cls)
+        rope._root = root
+        rope._text = None
+        return rope
+
+    def __len__(self):
+        return self._root.length if self._root is not None else 0
+
+    def __str__(self):
+        if self._text is None:
+            self._text = ''.join(leaf.text for leaf in _leaves(self._root))
+        return self._text
+
+    @property
+    def line_count(self):
+        return (self._root.breaks if self._root is not None else 0) + 1
+
+    def replace(self, start, end, text):
+        """
+        Returns new rope where text between start and end is replaced
+        """
+        left, rest = _split(self._root, start)
+        _, right = _split(rest, end - start)
+        return Rope._from_root(_join(_join(left, _build(text)), right))
+
+    def slice(self, start, end):
+        if self._text is not None:
+            return self._text[start:end]
+
+        start = max(start, 0)
+        end = min(end, len(self))
+        if start >= end:
+            return ''
+
+        parts = []
+        _slice(self._root, start, end, parts)
+        return ''.join(parts)
+
+    def line_offset(self, line):
+        """
+        Returns offset of the first character of the line. For lines after
+        the last one, length of the text is returned.
+        """
+        if line <= 0:
+            return 0
+        if line >= self.line_count:
+            return len(self)
+
+        node = self._root
+        offset = 0
+        while isinstance(node, _Node):
+            if line <= node.left.breaks:
+                node = node.left
+            else:
+                line -= node.left.breaks
+                offset += node.left.length
+                node = node.right
+
+        for i, m in enumerate(RE_LINE_BREAK.finditer(node.text), 1):
+            if i == line:
+                return offset + m.end()
+
+    def offset(self, line, character):
+        """
+        Returns offset of the position. Character is limited to the line
+        (with its line terminator).
+        """
+        line_start = self.line_offset(line)
+        return min(line_start + character, self.line_offset(line + 1))
+
+    def line(self, line):
+        """
+        Returns text of the line with its line terminator
+        """
+        return self.slice(self.line_offset(line), self.line_offset(line + 1))
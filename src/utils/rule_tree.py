@@ -0,0 +1,95 @@
+"""
+Module for finding rule instances which enclose a position in model source
+"""
+import bisect
+
+__author__ = "Daniel Elero"
+__copyright__ = "textX-tools"
+__license__ = "MIT"
+
+
+class RuleTree(object):
+    """
+    Nesting of rule instances of one model, built once per model version.
+
+    Spans of rule instances are nested or disjoint, so the source is split
+    into segments which have the same innermost rule instance. Innermost
+    rule at an offset is found by a binary search over segment starts,
+    enclosing rules are found by following parents.
+
+    As before, rule instance contains an offset only if the offset is
+    strictly between its start and end.
+    """
+
+    def __init__(self, pos_rule_dict):
+        # Spans are (start, end) keys of model._pos_rule_dict, contained
+        # offsets are [start + 1, end)
+        spans = sorted(((start + 1, end, rule)
+                        for (start, end), rule in pos_rule_dict.items()
+                        if end - start > 1),
+                       key=lambda s: (s[0], -s[1]))
+
+        self.rules = [rule for _, _, rule in spans]
+        # Index of the parent rule for each rule, or None
+        self.parents = [None] * len(spans)
+        # Segment starts and index of the innermost rule of each segment
+        self._starts = []
+        self._owners = []
+
+        ends = []
+        stack = []
+        for i, (start, end, _) in enumerate(spans):
+            while stack and ends[stack[-1]] <= start:
+                self._pop(stack, ends)
+            if stack:
+                # Malformed span which crosses the end of its parent
+                end = min(end, ends[stack[-1]])
+                self.parents[i] = stack[-1]
+            ends.append(end)
+            self._add_segment(start, i)
+            stack.append(i)
+        while stack:
+            self._pop(stack, ends)
+
+    def _add_segment(self, start, owner):
+        if self._starts and self._starts[-1] == start:
+            self._owners[-1] = owner
+        else:
+            self._starts.append(start)
+            self._owners.append(owner)
+
+    def _pop(self, stack, ends):
+        end = ends[stack.pop()]
+        self._add_segment(end, stack[-1] if stack else None)
+
+    @classmethod
+    def from_model(cls, model):
+        if model is None:
+            return cls({})
+        return cls(model._pos_rule_dict)
+
+    def _innermost_index(self, offset):
+        i = bisect.bisect_right(self._starts, offset) - 1
+        if i < 0:
+            return None
+        return self._owners[i]
+
+    def innermost(self, offset):
+        """
+        Returns the innermost rule instance which contains the offset
+        """
+        i = self._innermost_index(offset)
+        if i is not None:
+            return self.rules[i]
+
+    def enclosing(self, offset):
+        """
+        Returns all rule instances which contain the offset, from the
+        innermost to the outermost one
+        """
+        chain = []
+        i = self._innermost_index(offset)
+        while i is not None:
+            chain.append(self.rules[i])
+            i = self.parents[i]
+        return chain
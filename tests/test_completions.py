@@ -0,0 +1,98 @@
+from os.path import join
+
+import pytest
+
+from textx.metamodel import metamodel_from_file
+
+from src import LS_ROOT_PATH
+from src.capabilities.completions import completions
+from src.infrastructure.grammar_tables import GrammarTables
+from src.infrastructure.workspace import TextXDocument
+
+EXAMPLES_PATH = join(LS_ROOT_PATH, '..', 'examples')
+
+ENTITY_SOURCE = """type string
+type int
+
+entity Person {
+  name : string
+  address : Address
+}
+
+entity Address {
+  street : string
+  number : int
+}
+"""
+
+
+class _NoTables(object):
+    """
+    Tables which never answer, so the prefix is always parsed
+    """
+
+    def expected_after(self, source, offset, rule_tree, budget=None):
+        return None
+
+
+class _Config(object):
+
+    def __init__(self, metamodel, tables):
+        self.metamodel = metamodel
+        self.tables = tables
+
+    def get_mm_by_ext(self, ext):
+        return self.metamodel
+
+    def get_parse_budget(self, ext):
+        return None
+
+    def get_grammar_tables(self, ext):
+        return self.tables
+
+
+class _Workspace(object):
+
+    def __init__(self, txdoc):
+        self.txdoc = txdoc
+
+    def get_document(self, doc_uri):
+        return self.txdoc
+
+    def get_snapshot(self, doc_uri):
+        return self.txdoc.snapshot
+
+
+@pytest.fixture(scope='module')
+def entity_mm():
+    return metamodel_from_file(join(EXAMPLES_PATH, 'entity', 'entity.tx'),
+                               textx_tools_support=True)
+
+
+def _document(config, source):
+    txdoc = TextXDocument(config, 'file:///model.ent', source)
+    txdoc.parse_model(source)
+    return txdoc
+
+
+def _labels(txdoc, offset):
+    line, col = txdoc.snapshot.line_index.pos_to_line_col(offset)
+    items = completions(txdoc.uri, _Workspace(txdoc),
+                        {'line': line, 'character': col})['items']
+    return sorted(item['label'] for item in items)
+
+
+def test_table_completions_match_parsed_completions(entity_mm):
+    tables = GrammarTables(entity_mm)
+    table_doc = _document(_Config(entity_mm, tables), ENTITY_SOURCE)
+    parsed_doc = _document(_Config(entity_mm, _NoTables()), ENTITY_SOURCE)
+    rule_tree = table_doc.snapshot.rule_tree
+
+    answered = 0
+    for offset in range(len(ENTITY_SOURCE) + 1):
+        if tables.expected_after(ENTITY_SOURCE, offset, rule_tree) is None:
+            continue
+        answered += 1
+        assert _labels(table_doc, offset) == _labels(parsed_doc, offset), \
+            ENTITY_SOURCE[:offset]
+    assert answered
@@ -0,0 +1,103 @@
+import glob
+import os
+import threading
+from os.path import join
+
+import pytest
+
+from textx.exceptions import TextXSemanticError
+from textx.metamodel import metamodel_from_file
+
+from src import LS_ROOT_PATH
+from src.infrastructure import configuration
+from src.utils.constants import MM_PATH
+
+
+GRAMMARS = sorted(glob.glob(join(LS_ROOT_PATH, MM_PATH, '*.tx')))
+
+
+def test_grammars_compile_in_parallel():
+    assert configuration.WARM_UP_WORKERS > 1
+    errors = []
+
+    def build(grammar_path):
+        for _ in range(3):
+            try:
+                metamodel_from_file(grammar_path, textx_tools_support=True)
+            except Exception as e:
+                errors.append((grammar_path, e))
+
+    threads = [threading.Thread(target=build, args=(path,))
+               for path in GRAMMARS * 2]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+
+
+def test_grammar_hash_follows_grammar_content(tmpdir):
+    config = configuration.Configuration(str(tmpdir))
+    tx_hash = config.get_grammar_hash('.tx')
+
+    assert tx_hash == config.get_grammar_hash('.tx')
+    assert tx_hash != config.get_grammar_hash('.txconfig')
+    assert config.get_grammar_hash('.unknown') is None
+
+
+TXCONFIG = """dsl Items [items] {
+    paths {
+        grammar: "items.tx"
+        model_processors: "procs.py:get_model_proc"
+        object_processors: "procs.py:get_obj_proc"
+    }
+}"""
+
+PROCESSORS = """from textx.exceptions import TextXSemanticError
+
+
+def check(model, metamodel):
+    if {}:
+        raise TextXSemanticError('Single item')
+
+
+def get_model_proc():
+    return [check]
+
+
+def get_obj_proc():
+    return {{}}
+"""
+
+
+def _write(path, content, mtime):
+    path.write(content)
+    # Changes in the same second could have the same mtime
+    os.utime(str(path), (mtime, mtime))
+
+
+def test_metamodel_is_rebuilt_when_grammar_or_processors_change(tmpdir):
+    tmpdir.join('.txconfig').write(TXCONFIG)
+    _write(tmpdir.join('items.tx'),
+           "Model: items+=Item; Item: 'item' name=ID;", 1000)
+    _write(tmpdir.join('procs.py'), PROCESSORS.format('False'), 1000)
+    config = configuration.Configuration(str(tmpdir))
+
+    mm = config.get_mm_by_ext('.items')
+    assert config.get_mm_by_ext('.items') is mm
+    assert mm.model_from_str('item a').items[0].name == 'a'
+
+    _write(tmpdir.join('items.tx'),
+           "Model: items+=Item; Item: 'it' name=ID;", 2000)
+    grammar_mm = config.get_mm_by_ext('.items')
+    assert grammar_mm is not mm
+    assert grammar_mm.model_from_str('it a').items[0].name == 'a'
+
+    _write(tmpdir.join('procs.py'),
+           PROCESSORS.format('len(model.items) == 1'), 2000)
+    processors_mm = config.get_mm_by_ext('.items')
+    assert processors_mm is not grammar_mm
+    with pytest.raises(TextXSemanticError):
+        processors_mm.model_from_str('it a')
+    assert config.get_mm_by_ext('.items') is processors_mm
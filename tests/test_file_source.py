@@ -0,0 +1,52 @@
+import os
+
+from src.utils.file_source import FileSource, FileSourceCache
+
+
+def _write(tmpdir, name, text):
+    path = tmpdir.join(name)
+    path.write_binary(text.encode('utf-8'))
+    return str(path)
+
+
+def test_file_source_reads_changed_file(tmpdir):
+    path = _write(tmpdir, 'a.ent', 'entity A {}')
+    source = FileSource(path)
+    assert source.read() == 'entity A {}'
+
+    _write(tmpdir, 'a.ent', 'entity Bč {}\n')
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+    assert source.read() == 'entity Bč {}\n'
+
+
+def test_file_source_reads_empty_file(tmpdir):
+    assert FileSource(_write(tmpdir, 'empty.ent', '')).read() == ''
+
+
+def test_cache_drops_least_recently_read_sources(tmpdir):
+    cache = FileSourceCache(max_chars=25)
+    paths = [_write(tmpdir, '{}.ent'.format(i), str(i) * 10)
+             for i in range(3)]
+
+    cache.read(paths[0])
+    cache.read(paths[1])
+    assert cache.total_size == 20
+
+    # First file is read again, so the second one is the oldest
+    cache.read(paths[0])
+    cache.read(paths[2])
+    assert cache.total_size == 20
+    assert cache.get(paths[0]).cached_size == 10
+    assert cache.get(paths[1]).cached_size == 0
+
+
+def test_cache_keeps_source_larger_than_limit(tmpdir):
+    cache = FileSourceCache(max_chars=5)
+    path = _write(tmpdir, 'big.ent', 'x' * 10)
+
+    assert cache.read(path) == 'x' * 10
+    assert cache.get(path).cached_size == 10
+
+    cache.discard(path)
+    assert cache.total_size == 0
@@ -0,0 +1,121 @@
+import threading
+
+import pytest
+
+import textx.lang
+
+from textx.exceptions import TextXSemanticError
+from textx.metamodel import metamodel_from_str
+
+# Configuration makes textX grammar parsers use the cache
+from src.infrastructure import configuration  # noqa: F401
+from src.infrastructure.grammar_cache import grammar_hash, grammar_trees, \
+    list_to_tree, parser_rules, tree_to_list
+
+GRAMMAR = """
+Model: 'model' items*=Item;
+Item: name=ID ('->' target=[Item])? ';';
+"""
+
+
+def _in_thread(func):
+    """
+    Runs func with a new textX grammar parser, which is made per thread
+    """
+    result = []
+
+    def _run():
+        try:
+            result.append((func(), None))
+        except Exception as e:
+            result.append((None, e))
+
+    thread = threading.Thread(target=_run)
+    thread.start()
+    thread.join()
+    value, error = result[0]
+    if error is not None:
+        raise error
+    return value
+
+
+def _expressions(metamodel):
+    exprs = []
+    visited = set()
+    stack = [metamodel.parser.parser_model]
+    while stack:
+        e = stack.pop()
+        if id(e) in visited:
+            continue
+        visited.add(id(e))
+        exprs.append((type(e).__name__, e.rule_name,
+                      getattr(e, 'to_match', None)))
+        stack.extend(reversed(e.nodes))
+    return exprs
+
+
+@pytest.fixture
+def cache_dir(tmpdir, monkeypatch):
+    monkeypatch.setattr(grammar_trees, '_cache_dir', str(tmpdir))
+    return tmpdir
+
+
+def test_tree_is_stored_as_plain_values():
+    parser = textx.lang.ParserPython(textx.lang.textx_model,
+                                     comment_def=textx.lang.comment,
+                                     reduce_tree=False)
+    rules = parser_rules(parser)
+    rule_indexes = {id(rule): i for i, rule in enumerate(rules)}
+    tree = parser.parse(GRAMMAR)
+
+    nodes = tree_to_list(tree, rule_indexes)
+    loaded = list_to_tree(nodes, rules)
+
+    assert tree_to_list(loaded, rule_indexes) == nodes
+    assert loaded.value == tree.value
+    assert loaded.position_end == tree.position_end
+
+
+def test_metamodel_is_built_from_stored_tree(cache_dir):
+    hits = grammar_trees.hits
+    parsed = _in_thread(lambda: metamodel_from_str(GRAMMAR))
+    assert cache_dir.join(grammar_hash(GRAMMAR) + '.grammar.json').check()
+
+    loaded = _in_thread(lambda: metamodel_from_str(GRAMMAR))
+    assert grammar_trees.hits == hits + 1
+    assert _expressions(loaded) == _expressions(parsed)
+
+    model = loaded.model_from_str('model a -> b; b;')
+    assert model.items[0].target is model.items[1]
+
+
+def test_changed_grammar_is_parsed(cache_dir):
+    _in_thread(lambda: metamodel_from_str(GRAMMAR))
+    changed = GRAMMAR.replace("'model'", "'program'")
+    misses = grammar_trees.misses
+
+    metamodel = _in_thread(lambda: metamodel_from_str(changed))
+
+    assert grammar_trees.misses == misses + 1
+    assert metamodel.model_from_str('program a;').items[0].name == 'a'
+
+
+def test_invalid_stored_tree_is_removed(cache_dir):
+    stored = cache_dir.join(grammar_hash(GRAMMAR) + '.grammar.json')
+    stored.write('[[0, 100000')
+
+    metamodel = _in_thread(lambda: metamodel_from_str(GRAMMAR))
+
+    assert metamodel.model_from_str('model a;').items[0].name == 'a'
+    # Tree is stored again after the grammar is parsed
+    assert stored.read().startswith('[[0,')
+
+
+def test_errors_of_stored_grammar_have_positions(cache_dir):
+    grammar = GRAMMAR.replace('[Item]', '[Unknown]')
+    hits = grammar_trees.hits
+    for _ in range(2):
+        with pytest.raises(TextXSemanticError) as e:
+            _in_thread(lambda: metamodel_from_str(grammar))
+        assert (e.value.line, e.value.col) == (3, 21)
+    assert grammar_trees.hits == hits + 1
@@ -0,0 +1,142 @@
+from os.path import join
+
+import pytest
+
+from textx.exceptions import TextXSyntaxError
+from textx.metamodel import metamodel_from_file, metamodel_from_str
+
+from src import LS_ROOT_PATH
+from src.capabilities.completions import FAKE_SYN_CHARS, rule_to_exp_str
+from src.infrastructure.grammar_tables import GrammarTables
+from src.utils.rule_tree import RuleTree
+
+EXAMPLES_PATH = join(LS_ROOT_PATH, '..', 'examples')
+
+ENTITY_SOURCE = """type string
+entity Person {
+  type : string // the entity
+  address : Address
+}
+
+entity Address {
+  street : string
+}
+"""
+
+OUTLINE_SOURCE = """Entity {
+  label = name + "entity"
+  icon = "icon.png"
+}
+"""
+
+TEXTX_SOURCE = """Model: 'a' x=INT ',' y=ID;
+Foo: 'c' name=ID;
+"""
+
+
+def _metamodel(*path):
+    return metamodel_from_file(join(*path), textx_tools_support=True)
+
+
+@pytest.fixture(scope='module')
+def entity_mm():
+    return _metamodel(EXAMPLES_PATH, 'entity', 'entity.tx')
+
+
+@pytest.fixture(scope='module')
+def outline_mm():
+    return _metamodel(LS_ROOT_PATH, 'metamodel', 'outline.tx')
+
+
+@pytest.fixture(scope='module')
+def textx_mm():
+    return _metamodel(LS_ROOT_PATH, 'metamodel', 'textx.tx')
+
+
+def _expected_after(mm, source, prefix):
+    """
+    Returns expected terminals after the first occurrence of the prefix
+    """
+    tables = GrammarTables(mm)
+    rule_tree = RuleTree.from_model(mm.model_from_str(source))
+    expected = tables.expected_after(source,
+                                     source.index(prefix) + len(prefix),
+                                     rule_tree)
+    if expected is not None:
+        return sorted(rule_to_exp_str(r) for r in expected)
+
+
+def _parsed_expected(mm, prefix):
+    try:
+        mm.model_from_str(prefix + FAKE_SYN_CHARS)
+    except TextXSyntaxError as e:
+        return set(rule_to_exp_str(r) for r in e.expected_rules)
+    return set()
+
+
+def test_expected_after_keyword(entity_mm):
+    assert _expected_after(entity_mm, ENTITY_SOURCE, 'entity') == ['ID']
+    assert _expected_after(entity_mm, ENTITY_SOURCE, 'entity Person {') \
+        == ['ID']
+
+
+def test_expected_at_start(entity_mm):
+    assert _expected_after(entity_mm, '  ' + ENTITY_SOURCE, '  ') == \
+        ['entity', 'type']
+
+
+def test_id_spelled_as_keyword_is_parsed(entity_mm):
+    assert _expected_after(entity_mm, ENTITY_SOURCE,
+                           'entity Person {\n  type') is None
+
+
+def test_keyword_in_comment_is_parsed(entity_mm):
+    assert _expected_after(entity_mm, ENTITY_SOURCE, '// the entity') is None
+
+
+def test_keyword_in_string_is_parsed(outline_mm, textx_mm):
+    assert _expected_after(outline_mm, OUTLINE_SOURCE,
+                           'icon = "icon') is None
+    assert _expected_after(textx_mm, TEXTX_SOURCE, "x=INT ',") is None
+
+
+def test_predicate_operands_are_not_keywords():
+    mm = metamodel_from_str("""
+        Model: items+=Item;
+        Item: 'stop' ';' | !'end' name=STRING;
+    """, textx_tools_support=True)
+    tables = GrammarTables(mm)
+
+    assert 'end' not in tables.keywords
+    assert 'stop' in tables.keywords
+    source = 'stop; "end"'
+    rule_tree = RuleTree.from_model(mm.model_from_str(source))
+    assert tables.expected_after(source, len('stop; "end'),
+                                 rule_tree) is None
+
+
+@pytest.mark.parametrize('mm_name, source', [
+    ('entity_mm', ENTITY_SOURCE),
+    ('outline_mm', OUTLINE_SOURCE),
+    ('textx_mm', TEXTX_SOURCE),
+])
+def test_tables_agree_with_parser(request, mm_name, source):
+    """
+    Terminals from tables are the same or more than those reported by the
+    parser at every position where tables answer
+    """
+    mm = request.getfixturevalue(mm_name)
+    tables = GrammarTables(mm)
+    rule_tree = RuleTree.from_model(mm.model_from_str(source))
+
+    answered = 0
+    # Comments are expected at the start, but they are not completed
+    for offset in range(1, len(source) + 1):
+        expected = tables.expected_after(source, offset, rule_tree)
+        if expected is None:
+            continue
+        answered += 1
+        expected = set(rule_to_exp_str(r) for r in expected)
+        assert _parsed_expected(mm, source[:offset]) <= expected, \
+            source[:offset]
+    assert answered
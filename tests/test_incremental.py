@@ -0,0 +1,215 @@
+import random
+
+from collections import Counter
+from os.path import join
+
+import pytest
+
+from textx.exceptions import TextXError
+from textx.metamodel import metamodel_from_file
+
+from src import LS_ROOT_PATH
+from src.infrastructure import workspace
+from src.infrastructure.incremental import IncrementalParseError, \
+    changed_region, reparse_region
+from src.infrastructure.parse_scheduler import ParseBudgetExceeded
+from src.infrastructure.workspace import TextXDocument
+
+EXAMPLES_PATH = join(LS_ROOT_PATH, '..', 'examples')
+
+TYPES = ['string', 'int', 'bool']
+
+
+@pytest.fixture(scope='module')
+def entity_mm():
+    return metamodel_from_file(join(EXAMPLES_PATH, 'entity', 'entity.tx'),
+                               textx_tools_support=True)
+
+
+def _entity(name, props):
+    return 'entity {} {{\n{}}}\n'.format(
+        name, ''.join('  {} : {}\n'.format(p, t) for p, t in props))
+
+
+def _random_source(rnd, count):
+    header = ''.join('type {}\n'.format(t) for t in TYPES)
+    entities = []
+    for i in range(count):
+        types = TYPES + ['E{}'.format(j) for j in range(count)]
+        entities.append(_entity('E{}'.format(i),
+                                [('p{}'.format(j), rnd.choice(types))
+                                 for j in range(rnd.randint(1, 4))]))
+    return header + ''.join(entities)
+
+
+def _random_edit(rnd, source, count):
+    """
+    Returns source with a random edit inside a property of an entity
+    """
+    lines = source.splitlines(True)
+    props = [i for i, line in enumerate(lines) if ' : ' in line]
+    i = rnd.choice(props)
+    name, type_name = lines[i].split(' : ')
+    edit = rnd.choice(['type', 'name', 'insert', 'delete', 'space',
+                       'syntax'])
+    if edit == 'type':
+        types = TYPES + ['E{}'.format(j) for j in range(count)] + ['Unknown']
+        lines[i] = '{} : {}\n'.format(name, rnd.choice(types))
+    elif edit == 'name':
+        lines[i] = '{}x : {}'.format(name, type_name)
+    elif edit == 'insert':
+        lines[i] += '  q : {}\n'.format(rnd.choice(TYPES))
+    elif edit == 'delete':
+        lines[i] = ''
+    elif edit == 'space':
+        lines[i] = '{}   :  {}'.format(name, type_name)
+    else:
+        lines[i] = '{} {}'.format(name, type_name)
+    return ''.join(lines)
+
+
+def _crossrefs(model):
+    return [(r.name, r.ref_pos_start, r.ref_pos_end, r.def_pos_start,
+             r.def_pos_end) for r in model._pos_crossref_list]
+
+
+def _objects(model):
+    """
+    Returns positions and types of objects and positions of objects they
+    reference
+    """
+    objects = {}
+    for span, obj in model._pos_rule_dict.items():
+        refs = []
+        for attr_name, attr in type(obj)._tx_attrs.items():
+            value = getattr(obj, attr_name, None)
+            if not attr.cont and hasattr(value, '_tx_position'):
+                refs.append((attr_name, value._tx_position))
+        objects[span] = (type(obj).__name__, sorted(refs))
+    return objects
+
+
+def _full_parse(mm, source):
+    try:
+        return mm.model_from_str(source)
+    except TextXError:
+        return None
+
+
+def test_changed_region():
+    assert changed_region('abcdef', 'abXYef') == (2, 4, 4)
+    assert changed_region('aaa', 'aaaa') == (3, 3, 4)
+    assert changed_region('abc', 'abc') == (3, 3, 3)
+
+
+def test_edit_outside_instances_is_not_reparsed(entity_mm):
+    old = 'type string\n' + _entity('A', [('x', 'string')])
+    new = 'type int\n' + _entity('A', [('x', 'string')])
+    with pytest.raises(IncrementalParseError):
+        reparse_region(entity_mm, entity_mm.model_from_str(old), old, new)
+
+
+def test_renamed_instance_is_not_reparsed(entity_mm):
+    old = 'type string\n' + _entity('A', [('x', 'string')]) + \
+        _entity('B', [('y', 'A')])
+    new = old.replace('entity A', 'entity AA')
+    with pytest.raises(IncrementalParseError):
+        reparse_region(entity_mm, entity_mm.model_from_str(old), old, new)
+
+
+def test_previous_model_is_not_changed(entity_mm):
+    old = 'type string\n' + _entity('A', [('x', 'string')]) + \
+        _entity('B', [('y', 'A')])
+    new = old.replace('x : string', 'xyz : string')
+    old_model = entity_mm.model_from_str(old)
+    objects, crossrefs = _objects(old_model), _crossrefs(old_model)
+
+    new_model = reparse_region(entity_mm, old_model, old, new)
+
+    assert _objects(old_model) == objects
+    assert _crossrefs(old_model) == crossrefs
+    assert new_model.entities[1].properties[0].type is \
+        new_model.entities[0]
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_fuzz_against_full_parse(entity_mm, seed):
+    rnd = random.Random(seed)
+    count = rnd.randint(2, 8)
+    source = _random_source(rnd, count)
+    model = entity_mm.model_from_str(source)
+
+    for _ in range(5):
+        new_source = _random_edit(rnd, source, count)
+        expected = _full_parse(entity_mm, new_source)
+        try:
+            new_model = reparse_region(entity_mm, model, source, new_source)
+        except IncrementalParseError:
+            new_model = None
+        else:
+            assert expected is not None
+            assert _objects(new_model) == _objects(expected)
+            assert _crossrefs(new_model) == _crossrefs(expected)
+
+        if expected is not None:
+            source, model = new_source, new_model or expected
+
+
+def test_large_cross_referenced_model(entity_mm):
+    # Each entity references the next one, so copying the model
+    # recursively would exceed the recursion limit
+    count = 400
+    source = 'type string\n' + ''.join(
+        _entity('E{}'.format(i), [('a', 'string'),
+                                  ('b', 'E{}'.format((i + 1) % count))])
+        for i in range(count))
+    new_source = source.replace('a : string', 'ab : string', 1)
+    model = entity_mm.model_from_str(source)
+
+    new_model = reparse_region(entity_mm, model, source, new_source)
+
+    expected = entity_mm.model_from_str(new_source)
+    assert _objects(new_model) == _objects(expected)
+    assert _crossrefs(new_model) == _crossrefs(expected)
+    assert new_model.entities[-1].properties[1].type is \
+        new_model.entities[0]
+    assert new_model.entities[0].parent is new_model
+
+
+def test_exceeded_budget_is_raised(entity_mm):
+    old = 'type string\n' + _entity('A', [('x', 'string')])
+    new = old.replace('x : string', 'xyz : string')
+    with pytest.raises(ParseBudgetExceeded):
+        reparse_region(entity_mm, entity_mm.model_from_str(old), old, new,
+                       budget=1e-9)
+
+
+class _Config(object):
+
+    def __init__(self, metamodel, budget):
+        self.metamodel = metamodel
+        self.budget = budget
+        self.parse_budget_overruns = Counter()
+
+    def get_mm_by_ext(self, ext):
+        return self.metamodel
+
+    def get_parse_budget(self, ext):
+        return self.budget
+
+
+def test_exceeded_budget_is_not_renewed_for_full_parse(entity_mm,
+                                                       monkeypatch):
+    old = 'type string\n' + _entity('A', [('x', 'string')])
+    new = old.replace('x : string', 'xyz : string')
+    txdoc = TextXDocument(_Config(entity_mm, 1e-9), 'file:///doc.ent', old)
+    txdoc.set_parse_result(1, entity_mm.model_from_str(old), [], [], old)
+
+    full_parses = []
+    monkeypatch.setattr(workspace, 'model_from_str',
+                        lambda *args: full_parses.append(args))
+    model, syntax_errors, _ = txdoc.parse_source(new, incremental=True)
+
+    assert model is None
+    assert [type(e) for e in syntax_errors] == [ParseBudgetExceeded]
+    assert full_parses == []
@@ -0,0 +1,75 @@
+import sqlite3
+import time
+
+from src.infrastructure.index_store import IndexStore
+from src.infrastructure.indexer import FileIndex, Reference, Symbol
+from src.infrastructure.lsp import PositionEncodingKind
+
+
+def _file_index(path):
+    return FileIndex(path, 1, 2, 'hash',
+                     [Symbol('Person', 'Entity', 0, 20, 0, 0, 2, 1)],
+                     [Reference('Person', 30, 36, 0, 20)], None, None, None)
+
+
+def test_symbols_are_stored_with_their_ranges(tmpdir):
+    db_path = str(tmpdir.join('index.sqlite'))
+    store = IndexStore(db_path)
+    store.put(_file_index('/a.ent'), 'grammar')
+    store.close()
+
+    [(file_index, grammar_hash)] = IndexStore(db_path).load()
+    assert file_index == _file_index('/a.ent')
+    assert grammar_hash == 'grammar'
+
+
+def test_index_of_other_position_encoding_is_dropped(tmpdir):
+    db_path = str(tmpdir.join('index.sqlite'))
+    store = IndexStore(db_path, PositionEncodingKind.UTF16)
+    store.put(_file_index('/a.ent'), 'grammar')
+    store.close()
+
+    assert IndexStore(db_path, PositionEncodingKind.UTF8).load() == []
+
+
+def _stored_paths(db_path):
+    # Separate connection sees only committed writes
+    conn = sqlite3.connect(db_path)
+    try:
+        return sorted(row[0] for row in conn.execute('SELECT path FROM files'))
+    finally:
+        conn.close()
+
+
+def test_writes_are_committed_in_batches(tmpdir):
+    db_path = str(tmpdir.join('index.sqlite'))
+    store = IndexStore(db_path, commit_every=2, commit_interval=60)
+    store.put(_file_index('/a.ent'), 'grammar')
+    assert _stored_paths(db_path) == []
+
+    store.put(_file_index('/b.ent'), 'grammar')
+    assert _stored_paths(db_path) == ['/a.ent', '/b.ent']
+    store.close()
+
+
+def test_pending_writes_are_committed_after_interval(tmpdir):
+    db_path = str(tmpdir.join('index.sqlite'))
+    store = IndexStore(db_path, commit_every=100, commit_interval=0.05)
+    store.put(_file_index('/a.ent'), 'grammar')
+    store.remove('/a.ent')
+    store.put(_file_index('/b.ent'), 'grammar')
+
+    deadline = time.time() + 5
+    while _stored_paths(db_path) != ['/b.ent'] and time.time() < deadline:
+        time.sleep(0.01)
+    assert _stored_paths(db_path) == ['/b.ent']
+    store.close()
+
+
+def test_pending_writes_are_committed_on_close(tmpdir):
+    db_path = str(tmpdir.join('index.sqlite'))
+    store = IndexStore(db_path, commit_interval=60)
+    store.put(_file_index('/a.ent'), 'grammar')
+    store.close()
+
+    assert _stored_paths(db_path) == ['/a.ent']
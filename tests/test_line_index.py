@@ -0,0 +1,74 @@
+import random
+
+import pytest
+
+from src.infrastructure.lsp import PositionEncodingKind
+from src.utils.line_index import LineIndex
+
+ENCODINGS = [PositionEncodingKind.UTF8, PositionEncodingKind.UTF16,
+             PositionEncodingKind.UTF32]
+
+# ASCII, two bytes in UTF-8, three bytes in UTF-8, surrogate pair in UTF-16
+CHARS = ['a', ' ', '\n', '\r', '\r\n', 'é', '€', '\U0001f600']
+
+
+def _units(text, encoding):
+    if encoding == PositionEncodingKind.UTF8:
+        return len(text.encode('utf-8'))
+    elif encoding == PositionEncodingKind.UTF16:
+        return len(text.encode('utf-16-le')) // 2
+    return len(text)
+
+
+def _line_starts(text):
+    starts = [0]
+    i = 0
+    while i < len(text):
+        if text[i] == '\r' and text[i + 1:i + 2] == '\n':
+            i += 1
+        if text[i] in '\r\n':
+            starts.append(i + 1)
+        i += 1
+    return starts
+
+
+def _random_text(rnd):
+    return ''.join(rnd.choice(CHARS) for _ in range(rnd.randint(0, 60)))
+
+
+def test_lines_are_split_as_lsp():
+    index = LineIndex('a\r\nb\rc\nd\n')
+    assert index.line_starts == [0, 3, 5, 7, 9]
+    assert index.lines == ['a\r\n', 'b\r', 'c\n', 'd\n']
+
+
+def test_position_after_the_last_line():
+    index = LineIndex('ab\ncd', PositionEncodingKind.UTF16)
+    assert index.line_col_to_pos({'line': 5, 'character': 0}) == 5
+    # Column after the end of line is not clamped
+    assert index.line_col_to_pos({'line': 0, 'character': 10}) == 10
+
+
+def test_column_in_surrogate_pair_is_the_next_character():
+    index = LineIndex('\U0001f600a', PositionEncodingKind.UTF16)
+    assert index.line_col_to_pos({'line': 0, 'character': 1}) == 1
+    assert index.line_col_to_pos({'line': 0, 'character': 2}) == 1
+    assert index.pos_to_line_col(2) == (0, 3)
+
+
+@pytest.mark.parametrize('encoding', ENCODINGS)
+@pytest.mark.parametrize('seed', range(20))
+def test_fuzz_against_naive_conversion(encoding, seed):
+    rnd = random.Random(seed)
+    text = _random_text(rnd)
+    index = LineIndex(text, encoding)
+
+    starts = _line_starts(text)
+    assert index.line_starts == starts
+
+    for pos in range(len(text) + 1):
+        line = max(i for i, start in enumerate(starts) if start <= pos)
+        col = _units(text[starts[line]:pos], encoding)
+        assert index.pos_to_line_col(pos) == (line, col)
+        assert index.encode_col(line, pos - starts[line]) == col
+        assert index.line_col_to_pos({'line': line, 'character': col}) == pos
@@ -0,0 +1,198 @@
+from os.path import join
+
+import pytest
+
+from textx.metamodel import metamodel_from_file
+
+from src import LS_ROOT_PATH
+from src.capabilities.lint import document_diagnostic, lint_files, \
+    workspace_diagnostic
+from src.infrastructure.grammar_tables import GrammarTables
+from src.infrastructure.indexer import FileIndex
+from src.infrastructure.lsp import DocumentDiagnosticReportKind, \
+    PositionEncodingKind
+from src.infrastructure.workspace import TextXDocument
+from src.utils import uris
+
+EXAMPLES_PATH = join(LS_ROOT_PATH, '..', 'examples')
+
+VALID_SOURCE = 'type string\nentity A {\n  x : string\n}\n'
+INVALID_SOURCE = 'type string\nentity A {\n  x string\n}\n'
+
+
+class _Config(object):
+
+    def __init__(self, metamodel):
+        self.metamodel = metamodel
+        # Errors after the first one are recovered with grammar tables
+        self.tables = GrammarTables(metamodel)
+
+    def get_mm_by_ext(self, ext):
+        return self.metamodel
+
+    def get_parse_budget(self, ext):
+        return None
+
+    def get_grammar_tables(self, ext):
+        return self.tables
+
+
+class _Workspace(object):
+
+    position_encoding = PositionEncodingKind.UTF16
+
+    def __init__(self, metamodel):
+        self.config = _Config(metamodel)
+        # Key: document uri
+        # Value: TextXDocument
+        self.documents = {}
+        self.published = []
+
+    def open(self, doc_uri, source):
+        txdoc = TextXDocument(self.config, doc_uri, source, version=1)
+        txdoc.parse_model(source)
+        self.documents[doc_uri] = txdoc
+        return txdoc
+
+    def get_snapshot(self, doc_uri):
+        txdoc = self.documents.get(doc_uri)
+        if txdoc is not None:
+            return txdoc.snapshot
+
+    def get_document_by_path(self, path):
+        for txdoc in self.documents.values():
+            if txdoc.path == path:
+                return txdoc
+
+    def publish_all_diagnostics(self, uri_diagnostics):
+        self.published.extend(uri_diagnostics)
+
+
+@pytest.fixture(scope='module')
+def entity_mm():
+    return metamodel_from_file(join(EXAMPLES_PATH, 'entity', 'entity.tx'),
+                               textx_tools_support=True)
+
+
+def test_document_report_is_unchanged_until_parsed_again(entity_mm):
+    workspace = _Workspace(entity_mm)
+    txdoc = workspace.open('file:///ws/a.ent', INVALID_SOURCE)
+
+    report = document_diagnostic(txdoc.uri, workspace)
+    assert report['kind'] == DocumentDiagnosticReportKind.Full
+    assert [d['range']['start']['line'] for d in report['items']] == [2]
+
+    assert document_diagnostic(txdoc.uri, workspace, report['resultId']) == \
+        {'kind': DocumentDiagnosticReportKind.Unchanged,
+         'resultId': report['resultId']}
+
+    txdoc.parse_model(VALID_SOURCE)
+    new_report = document_diagnostic(txdoc.uri, workspace, report['resultId'])
+    assert new_report['kind'] == DocumentDiagnosticReportKind.Full
+    assert new_report['resultId'] != report['resultId']
+    assert new_report['items'] == []
+
+
+def test_unknown_document_has_empty_report(entity_mm):
+    assert document_diagnostic('file:///ws/a.ent', _Workspace(entity_mm)) == \
+        {'kind': DocumentDiagnosticReportKind.Full, 'items': []}
+
+
+def test_workspace_report_uses_previous_result_ids(entity_mm):
+    workspace = _Workspace(entity_mm)
+    valid = workspace.open('file:///ws/a.ent', VALID_SOURCE)
+    invalid = workspace.open('file:///ws/b.ent', INVALID_SOURCE)
+
+    items = workspace_diagnostic(workspace)['items']
+    assert [(r['uri'], r['kind'], r['version'], len(r['items']))
+            for r in items] == [
+        (valid.uri, DocumentDiagnosticReportKind.Full, 1, 0),
+        (invalid.uri, DocumentDiagnosticReportKind.Full, 1, 1)]
+
+    previous = [{'uri': r['uri'], 'value': r['resultId']} for r in items]
+    invalid.parse_model(VALID_SOURCE)
+    new_items = workspace_diagnostic(workspace, previous)['items']
+    assert [(r['uri'], r['kind']) for r in new_items] == [
+        (valid.uri, DocumentDiagnosticReportKind.Unchanged),
+        (invalid.uri, DocumentDiagnosticReportKind.Full)]
+    assert new_items[1]['items'] == []
+
+
+# Emoji is two UTF-16 code units, error is at '{' after it
+CLOSED_SOURCE = 'type string\nentity \U0001f600 {\n}\n'
+
+
+class _Indexer(object):
+
+    def __init__(self, file_indexes, grammar_hash='grammar'):
+        self.files = file_indexes
+        self.grammar_hash = grammar_hash
+
+    def get_file_index(self, path):
+        for file_index in self.files:
+            if file_index.path == path:
+                return file_index
+
+    def get_grammar_hash(self, path):
+        return self.grammar_hash
+
+
+def _closed_file(tmpdir, name, source, content_hash, error=None):
+    path = tmpdir.join(name)
+    path.write_text(source, encoding='utf-8')
+    return FileIndex(str(path), 1, len(source), content_hash, [], [], error,
+                     2 if error else None, 10 if error else None)
+
+
+def test_closed_file_diagnostics_come_from_index(entity_mm, tmpdir):
+    workspace = _Workspace(entity_mm)
+    invalid = _closed_file(tmpdir, 'b.ent', CLOSED_SOURCE, 'b',
+                           "Expected ID at position (2, 10) => 'y *{'.")
+    valid = _closed_file(tmpdir, 'c.ent', VALID_SOURCE, 'c')
+    opened = workspace.open(uris.from_fs_path(str(tmpdir.join('a.ent'))),
+                            INVALID_SOURCE)
+    indexer = _Indexer([invalid, valid])
+
+    lint_files([uris.from_fs_path(invalid.path),
+                uris.from_fs_path(valid.path), opened.uri],
+               workspace, indexer)
+
+    [(invalid_uri, [diagnostic]), (valid_uri, [])] = workspace.published
+    assert invalid_uri == uris.from_fs_path(invalid.path)
+    assert valid_uri == uris.from_fs_path(valid.path)
+    assert diagnostic['message'] == 'Expected ID'
+    # Column is converted to UTF-16 code units
+    assert diagnostic['range']['start'] == {'line': 1, 'col': 11}
+
+
+def test_deleted_closed_file_has_no_diagnostics(entity_mm, tmpdir):
+    workspace = _Workspace(entity_mm)
+    deleted = _closed_file(tmpdir, 'b.ent', CLOSED_SOURCE, 'b', 'Error')
+    tmpdir.join('b.ent').remove()
+
+    lint_files([uris.from_fs_path(deleted.path)], workspace,
+               _Indexer([deleted]))
+
+    assert workspace.published == [(uris.from_fs_path(deleted.path), [])]
+
+
+def test_workspace_report_of_closed_files(entity_mm, tmpdir):
+    workspace = _Workspace(entity_mm)
+    invalid = _closed_file(tmpdir, 'b.ent', CLOSED_SOURCE, 'b', 'Error')
+    opened = workspace.open(uris.from_fs_path(str(tmpdir.join('a.ent'))),
+                            VALID_SOURCE)
+    indexer = _Indexer([_closed_file(tmpdir, 'a.ent', VALID_SOURCE, 'a'),
+                        invalid])
+
+    items = workspace_diagnostic(workspace, indexer=indexer)['items']
+    assert [(r['uri'], r['version'], len(r['items'])) for r in items] == [
+        (opened.uri, 1, 0), (uris.from_fs_path(invalid.path), None, 1)]
+
+    # Report of closed file is unchanged until its content or grammar changes
+    previous = [{'uri': r['uri'], 'value': r['resultId']} for r in items]
+    items = workspace_diagnostic(workspace, previous, indexer)['items']
+    assert items[1]['kind'] == DocumentDiagnosticReportKind.Unchanged
+
+    indexer.grammar_hash = 'changed grammar'
+    items = workspace_diagnostic(workspace, previous, indexer)['items']
+    assert items[1]['kind'] == DocumentDiagnosticReportKind.Full
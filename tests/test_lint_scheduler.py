@@ -0,0 +1,119 @@
+import threading
+import time
+
+import pytest
+
+from src.infrastructure import lint_scheduler
+from src.infrastructure.lint_scheduler import LintScheduler
+
+
+class _Linter(object):
+    """
+    Records linted documents, linting of the blocking document waits until
+    it is released
+    """
+
+    def __init__(self, blocking_uri=None):
+        self.blocking_uri = blocking_uri
+        self.release = threading.Event()
+        self.blocked = threading.Event()
+        self.linted = []
+        self.times = []
+
+    def __call__(self, doc_uris):
+        if self.blocking_uri in doc_uris:
+            self.blocked.set()
+            self.release.wait(5)
+        self.linted.append(doc_uris)
+        self.times.append(time.monotonic())
+
+
+@pytest.fixture
+def short_intervals(monkeypatch):
+    monkeypatch.setattr(lint_scheduler, 'LINT_ACTIVE_DEBOUNCE_S', 0.05)
+    monkeypatch.setattr(lint_scheduler, 'LINT_DEBOUNCE_S', 0.1)
+
+
+def _wait_for(linter, count):
+    deadline = time.monotonic() + 5
+    while len(linter.linted) < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_debounce_interval_follows_parse_time():
+    parse_times = {'file:///slow': 1.0, 'file:///very_slow': 10.0}
+    scheduler = LintScheduler(lambda doc_uris: None, parse_times.get)
+
+    assert scheduler.debounce_interval('file:///a', active=True) == \
+        lint_scheduler.LINT_ACTIVE_DEBOUNCE_S
+    assert scheduler.debounce_interval('file:///a') == \
+        lint_scheduler.LINT_DEBOUNCE_S
+    assert scheduler.debounce_interval('file:///slow', active=True) == 2.0
+    assert scheduler.debounce_interval('file:///very_slow') == \
+        lint_scheduler.LINT_MAX_DEBOUNCE_S
+    scheduler.stop()
+
+
+def test_rescheduled_document_is_linted_once(short_intervals):
+    linter = _Linter()
+    scheduler = LintScheduler(linter)
+    for _ in range(3):
+        last_scheduled = time.monotonic()
+        scheduler.schedule('file:///a')
+        time.sleep(0.02)
+
+    _wait_for(linter, 1)
+    time.sleep(0.2)
+    scheduler.stop()
+
+    assert linter.linted == [['file:///a']]
+    # Deadline is postponed by every edit
+    assert linter.times[0] - last_scheduled >= 0.1
+
+
+def test_other_document_does_not_postpone_deadline(short_intervals):
+    linter = _Linter()
+    scheduler = LintScheduler(linter)
+    scheduler.schedule('file:///a', active=True)
+    for _ in range(5):
+        scheduler.schedule('file:///b')
+        time.sleep(0.02)
+
+    _wait_for(linter, 2)
+    scheduler.stop()
+
+    assert linter.linted == [['file:///a'], ['file:///b']]
+
+
+def test_active_document_is_linted_first(short_intervals):
+    linter = _Linter('file:///x')
+    scheduler = LintScheduler(linter)
+    scheduler.schedule('file:///x', active=True)
+    assert linter.blocked.wait(5)
+
+    # All are due while linting of the first document is blocked
+    scheduler.schedule('file:///b')
+    scheduler.schedule('file:///c')
+    scheduler.schedule('file:///a', active=True)
+    time.sleep(0.2)
+    linter.release.set()
+
+    _wait_for(linter, 3)
+    scheduler.stop()
+
+    assert linter.linted == [['file:///x'], ['file:///a'],
+                             ['file:///b', 'file:///c']]
+
+
+def test_discarded_document_is_not_linted(short_intervals):
+    linter = _Linter()
+    scheduler = LintScheduler(linter)
+    scheduler.schedule('file:///a')
+    scheduler.schedule('file:///b')
+    scheduler.discard('file:///a')
+
+    _wait_for(linter, 1)
+    time.sleep(0.2)
+    scheduler.stop()
+
+    assert linter.linted == [['file:///b']]
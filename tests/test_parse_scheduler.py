@@ -0,0 +1,68 @@
+import threading
+
+from textx.exceptions import TextXSyntaxError
+
+from src.infrastructure.parse_scheduler import ParseScheduler
+
+
+class _Document(object):
+    """
+    Document whose source has one error and whose recovery waits until
+    it is released
+    """
+
+    def __init__(self, source):
+        self.uri = 'file:///doc.ent'
+        self.source = source
+        self.version = 1
+        self.release = threading.Event()
+        self.results = []
+        self.cancelled = []
+
+    def parse_source(self, source, incremental=False):
+        return None, [TextXSyntaxError(source, 1, 1)], []
+
+    def recover_source(self, source, error, cancelled=None):
+        self.release.wait(5)
+        self.cancelled.append(cancelled())
+        return object(), [error, TextXSyntaxError(source, 2, 1)], []
+
+    def set_parse_result(self, version, model, syntax_errors,
+                         semantic_errors, source):
+        self.results.append((source, len(syntax_errors)))
+
+
+def test_first_error_is_applied_before_recovery():
+    recovered = threading.Event()
+    scheduler = ParseScheduler(
+        recovered_callback=lambda txdoc: recovered.set())
+    txdoc = _Document('first')
+    scheduler.schedule(txdoc)
+
+    assert scheduler.wait(txdoc.uri, 5)
+    assert txdoc.results == [('first', 1)]
+
+    txdoc.release.set()
+    assert recovered.wait(5)
+    assert txdoc.results == [('first', 1), ('first', 2)]
+    assert txdoc.cancelled == [False]
+
+
+def test_recovery_of_old_version_is_dropped():
+    scheduler = ParseScheduler()
+    txdoc = _Document('first')
+    scheduler.schedule(txdoc)
+    assert scheduler.wait(txdoc.uri, 5)
+
+    txdoc.source = 'second'
+    scheduler.schedule(txdoc)
+    txdoc.release.set()
+
+    assert scheduler.wait(txdoc.uri, 5)
+    # Second version is recovered after it is parsed
+    for _ in range(50):
+        if len(txdoc.results) == 3:
+            break
+        threading.Event().wait(0.1)
+    assert txdoc.results == [('first', 1), ('second', 1), ('second', 2)]
+    assert txdoc.cancelled == [True, False]
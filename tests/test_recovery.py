@@ -0,0 +1,248 @@
+import random
+import time
+
+from os.path import join
+
+import pytest
+
+from textx.exceptions import TextXError
+from textx.metamodel import metamodel_from_file
+
+from src import LS_ROOT_PATH
+from src.infrastructure.grammar_tables import GrammarTables
+from src.infrastructure.recovery import MAX_RECOVERED_ERRORS, blank_out, \
+    grammar_starts, model_boundaries, recover_errors, repetition_extent
+
+EXAMPLES_PATH = join(LS_ROOT_PATH, '..', 'examples')
+
+
+@pytest.fixture(scope='module')
+def entity_mm():
+    return metamodel_from_file(join(EXAMPLES_PATH, 'entity', 'entity.tx'),
+                               textx_tools_support=True)
+
+
+@pytest.fixture(scope='module')
+def textx_mm():
+    return metamodel_from_file(join(LS_ROOT_PATH, 'metamodel', 'textx.tx'),
+                               textx_tools_support=True)
+
+
+@pytest.fixture(scope='module')
+def robot_mm():
+    return metamodel_from_file(join(EXAMPLES_PATH, 'robot', 'robot.tx'),
+                               textx_tools_support=True)
+
+
+def _robot_source():
+    with open(join(EXAMPLES_PATH, 'robot', 'robot.rbt')) as f:
+        return f.read()
+
+
+def _first_error(mm, source):
+    try:
+        mm.model_from_str(source)
+    except TextXError as e:
+        return e
+
+
+def _recover(mm, source, last_valid=(None, None)):
+    model, errors = recover_errors(mm, source, _first_error(mm, source),
+                                   last_valid=last_valid)
+    return model, [(e.line, e.col) for e in errors]
+
+
+def _entity(name, props):
+    return 'entity {} {{\n{}}}\n'.format(
+        name, ''.join('  {} : {}\n'.format(p, t) for p, t in props))
+
+
+def test_blank_out_keeps_line_breaks():
+    assert blank_out('ab\ncd\r\nef', 1, 8) == 'a \n  \r\n f'
+
+
+def test_grammar_starts(entity_mm):
+    source = 'type string\n\nentity A {\n  type : string\n}\n'
+    starts = grammar_starts(GrammarTables(entity_mm), source)
+    # Indented ID spelled as keyword does not start an instance
+    assert starts == [0, source.index('entity')]
+
+
+def test_model_boundaries_are_mapped_onto_edited_source(entity_mm):
+    old = 'type string\nentity A {\n  x : string\n}\nentity B {\n' \
+        '  y : string\n}\nentity C {\n  z : string\n}\n'
+    new = old.replace('x : string', 'x  string') \
+        .replace('z : string', 'z  string')
+    starts, ends = model_boundaries((old, entity_mm.model_from_str(old)),
+                                    new)
+    # Lines of A and C which are not edited are mapped too
+    assert set(starts) == set([0, new.index('entity A'),
+                               new.index('entity B'), new.index('entity C')])
+    assert new.index('}\nentity B') + 1 in ends
+    assert len(new) - 1 in ends
+
+
+def test_repetition_extent(robot_mm):
+    source = _robot_source() + '\nfoo bar\n'
+    start, end = repetition_extent(GrammarTables(robot_mm), source,
+                                   time.monotonic() + 1)
+    assert (start, end) == (len('begin'), source.index('end'))
+
+
+def test_model_rule_tokens_are_not_blanked(robot_mm):
+    source = _robot_source().replace('initial', 'initil') + '\nfoo bar\n'
+    _, errors = _recover(robot_mm, source)
+    assert errors == [(2, 4), (8, 1)]
+
+
+def test_error_expecting_model_start_is_cascade(robot_mm):
+    source = _robot_source().replace('begin', 'begn')
+    model, errors = _recover(robot_mm, source)
+    assert model is None
+    assert errors == [(1, 1)]
+
+
+def test_errors_in_edited_instances(entity_mm):
+    old = 'type string\n' + _entity('A', [('x', 'string')]) + \
+        _entity('B', [('y', 'string')]) + _entity('C', [('z', 'string')])
+    new = old.replace('x : string', 'x  string') \
+        .replace('z : string', 'z  string')
+    model, errors = _recover(entity_mm, new,
+                             (old, entity_mm.model_from_str(old)))
+    assert errors == [(3, 6), (9, 6)]
+    assert [e.name for e in model.entities] == ['B']
+
+
+def test_errors_of_several_instances(entity_mm):
+    source = 'type string\n' + \
+        _entity('A', [('x', 'string')]).replace('x :', 'x') + \
+        _entity('B', [('y', 'string')]) + \
+        _entity('C', [('z', 'string')])[:-2]
+    model, errors = _recover(entity_mm, source)
+    assert errors == [(3, 5), (10, 1)]
+    assert model is not None
+    assert [e.name for e in model.entities] == ['B']
+
+
+def test_missing_closing_bracket(entity_mm):
+    source = 'type string\n' + \
+        _entity('A', [('x', 'string')]).replace('}', '') + \
+        _entity('B', [('y', 'string')]) + \
+        _entity('C', [('z', 'string')]).replace('z :', 'z')
+    _, errors = _recover(entity_mm, source)
+    # Keyword 'entity' of B is taken for a property of A
+    assert errors == [(5, 8), (9, 5)]
+
+
+def test_unclosed_instance_before_the_last_one(entity_mm):
+    source = 'type string\n' + \
+        _entity('A', [('x', 'string')]).replace('}', '') + \
+        _entity('B', [('y', 'string')])
+    model, errors = _recover(entity_mm, source)
+    assert errors == [(5, 8)]
+    assert [e.name for e in model.entities] == ['B']
+
+
+def test_end_of_source_after_blanking_is_not_reported(entity_mm):
+    source = 'type string\n' + \
+        _entity('A', [('x', 'string')]).replace('x :', 'x') + '\n\n'
+    model, errors = _recover(entity_mm, source)
+    assert model is None
+    assert errors == [(3, 5)]
+
+
+def test_reference_to_blanked_instance_is_not_reported(entity_mm):
+    source = 'type string\n' + \
+        _entity('A', [('x', 'string')]).replace('x :', 'x') + \
+        _entity('B', [('a', 'A')])
+    model, errors = _recover(entity_mm, source)
+    assert model is None
+    assert errors == [(3, 5)]
+
+
+def test_unknown_reference_after_blanking(entity_mm):
+    source = 'type string\n' + \
+        _entity('A', [('x', 'string')]).replace('x :', 'x') + \
+        _entity('C', [('c', 'Unknown')])
+    model, errors = _recover(entity_mm, source)
+    assert model is None
+    assert errors == [(3, 5), (6, 7)]
+
+
+def test_semicolon_at_line_start_ends_rule(textx_mm):
+    source = """Model:
+  items+=Item
+;
+
+Item:
+  'item' name=ID x=
+;
+
+Other:
+  'o' y=INT
+;
+
+Third:
+  'x' ( y=INT
+;
+"""
+    model, errors = _recover(textx_mm, source)
+    assert errors == [(7, 1), (15, 1)]
+    assert model is not None
+
+
+def test_recovery_is_cancelled(entity_mm):
+    source = 'type string\n' + \
+        _entity('A', [('x', 'string')]).replace('x :', 'x') + \
+        _entity('B', [('y', 'string')])
+    error = _first_error(entity_mm, source)
+    model, errors = recover_errors(entity_mm, source, error,
+                                   cancelled=lambda: True)
+    assert model is None
+    assert errors == [error]
+
+
+def _corrupt(entity, rnd):
+    """
+    Returns entity source with one syntax error
+    """
+    mutation = rnd.choice(['colon', 'bracket', 'name', 'junk'])
+    if mutation == 'colon':
+        return entity.replace(' :', '', 1)
+    elif mutation == 'bracket':
+        return entity.replace('{', '', 1)
+    elif mutation == 'name':
+        return entity.replace('entity ', 'entity 1', 1)
+    return entity.replace('\n', ' @\n', 1)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_fuzz_against_full_parse(entity_mm, seed):
+    """
+    Each corrupted entity is reported at the same position as when it is
+    the only error in the source
+    """
+    rnd = random.Random(seed)
+    types = ['string', 'int', 'bool']
+    header = ''.join('type {}\n'.format(t) for t in types)
+    entities = [_entity('E{}'.format(i),
+                        [('p{}'.format(j), rnd.choice(types))
+                         for j in range(rnd.randint(1, 4))])
+                for i in range(rnd.randint(2, 15))]
+    corrupted = sorted(rnd.sample(range(len(entities)),
+                                  rnd.randint(1, len(entities))))
+
+    expected = []
+    sources = list(entities)
+    for i in corrupted:
+        sources[i] = _corrupt(entities[i], rnd)
+        only = list(entities)
+        only[i] = sources[i]
+        e = _first_error(entity_mm, header + ''.join(only))
+        expected.append((e.line, e.col))
+
+    model, errors = _recover(entity_mm, header + ''.join(sources))
+
+    assert errors == expected[:MAX_RECOVERED_ERRORS]
+    if len(corrupted) < min(len(entities), MAX_RECOVERED_ERRORS):
+        assert len(model.entities) == len(entities) - len(corrupted)
@@ -0,0 +1,105 @@
+import random
+
+import pytest
+
+from src.utils import rope as rope_module
+from src.utils.rope import RE_LINE_BREAK, Rope
+
+
+def _lines(text):
+    """
+    Lines with their terminators, split as LSP does (CRLF, CR and LF)
+    """
+    lines = []
+    start = 0
+    for m in RE_LINE_BREAK.finditer(text):
+        lines.append(text[start:m.end()])
+        start = m.end()
+    lines.append(text[start:])
+    return lines
+
+
+def _check(rope, text):
+    assert len(rope) == len(text)
+
+    lines = _lines(text)
+    assert rope.line_count == len(lines)
+    offset = 0
+    for i, line in enumerate(lines):
+        assert rope.line_offset(i) == offset
+        assert rope.line(i) == line
+        offset += len(line)
+    assert rope.line_offset(len(lines)) == len(text)
+    assert str(rope) == text
+
+
+@pytest.fixture
+def small_leaves(monkeypatch):
+    # Small leaves make deep trees from short texts
+    monkeypatch.setattr(rope_module, 'LEAF_SIZE', 4)
+
+
+def test_empty_rope():
+    rope = Rope('')
+    _check(rope, '')
+    assert rope.slice(0, 10) == ''
+    assert rope.offset(3, 3) == 0
+
+
+def test_crlf_is_one_line_break(small_leaves):
+    text = 'ab\r\ncd\ref\ngh\r\n'
+    rope = Rope(text)
+    _check(rope, text)
+
+    # CRLF made by an edit
+    rope = Rope('ab\rX\ncd').replace(3, 4, '')
+    _check(rope, 'ab\r\ncd')
+
+    # Edit in the middle of CRLF
+    rope = Rope('ab\r\ncd').replace(3, 3, 'X')
+    _check(rope, 'ab\rX\ncd')
+
+
+def test_offset_is_limited_to_the_line(small_leaves):
+    rope = Rope('abc\r\ndef')
+    assert rope.offset(0, 2) == 2
+    assert rope.offset(0, 100) == 5
+    assert rope.offset(1, 100) == 8
+    assert rope.offset(5, 0) == 8
+
+
+def test_slice_of_edited_rope(small_leaves):
+    text = ''.join(chr(ord('a') + i % 26) for i in range(200))
+    rope = Rope(text).replace(10, 20, '0123456789')
+    text = text[:10] + '0123456789' + text[20:]
+    for start in range(0, 210, 7):
+        for end in range(start, 210, 11):
+            assert rope.slice(start, end) == text[start:end]
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_random_edits_match_string(small_leaves, seed):
+    rnd = random.Random(seed)
+    alphabet = 'ab \r\n\n{}'
+    text = ''.join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 80)))
+    rope = Rope(text)
+
+    for _ in range(60):
+        start = rnd.randint(0, len(text))
+        end = rnd.randint(start, min(len(text), start + 10))
+        new = ''.join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 8)))
+        rope = rope.replace(start, end, new)
+        text = text[:start] + new + text[end:]
+
+        start = rnd.randint(0, len(text))
+        end = rnd.randint(start, len(text))
+        assert rope.slice(start, end) == text[start:end]
+    _check(rope, text)
+
+
+def test_edits_do_not_change_old_rope(small_leaves):
+    old = Rope('line 1\nline 2\n')
+    new = old.replace(5, 6, 'one')
+    assert str(old) == 'line 1\nline 2\n'
+    assert str(new) == 'line one\nline 2\n'
+    assert new.line(1) == 'line 2\n'
@@ -0,0 +1,83 @@
+import random
+
+from os.path import join
+
+import pytest
+
+from textx.metamodel import metamodel_from_file
+
+from src import LS_ROOT_PATH
+from src.utils.rule_tree import RuleTree
+
+EXAMPLES_PATH = join(LS_ROOT_PATH, '..', 'examples')
+
+
+def _enclosing(pos_rule_dict, offset):
+    """
+    Brute force: rules strictly containing the offset, innermost first
+    """
+    spans = [(end - start, rule)
+             for (start, end), rule in pos_rule_dict.items()
+             if start < offset < end]
+    return [rule for _, rule in sorted(spans, key=lambda s: s[0])]
+
+
+def _random_spans(rnd, start, end, depth=0):
+    """
+    Returns nested or disjoint spans between start and end
+    """
+    spans = []
+    pos = start
+    while pos < end and depth < 4:
+        s = rnd.randint(pos, end)
+        e = rnd.randint(s, end)
+        if (s, e) != (start, end):
+            spans.append((s, e))
+            spans.extend(_random_spans(rnd, s, e, depth + 1))
+        pos = e + rnd.randint(0, 3)
+    return spans
+
+
+def _assert_brute_force(pos_rule_dict, source_len):
+    tree = RuleTree(pos_rule_dict)
+    for offset in range(-1, source_len + 2):
+        expected = _enclosing(pos_rule_dict, offset)
+        assert tree.enclosing(offset) == expected
+        assert tree.innermost(offset) == (expected[0] if expected else None)
+
+
+def test_offsets_at_span_boundaries():
+    tree = RuleTree({(0, 10): 'outer', (2, 5): 'inner', (5, 6): 'empty'})
+    assert tree.innermost(0) is None
+    assert tree.innermost(2) == 'outer'
+    assert tree.enclosing(3) == ['inner', 'outer']
+    assert tree.innermost(5) == 'outer'
+    assert tree.innermost(10) is None
+
+
+def test_empty_tree():
+    tree = RuleTree.from_model(None)
+    assert tree.innermost(0) is None
+    assert tree.enclosing(0) == []
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_random_spans_against_brute_force(seed):
+    rnd = random.Random(seed)
+    spans = set(_random_spans(rnd, 0, 60))
+    pos_rule_dict = dict((span, 'r{}'.format(i))
+                         for i, span in enumerate(sorted(spans)))
+    _assert_brute_force(pos_rule_dict, 60)
+
+
+@pytest.mark.parametrize('path', [
+    join(EXAMPLES_PATH, 'entity', 'entity.tx'),
+    join(LS_ROOT_PATH, 'metamodel', 'textx.tx'),
+])
+def test_model_against_brute_force(path):
+    mm = metamodel_from_file(join(LS_ROOT_PATH, 'metamodel', 'textx.tx'),
+                             textx_tools_support=True)
+    with open(path) as f:
+        source = f.read()
+    model = mm.model_from_str(source)
+    _assert_brute_force(model._pos_rule_dict, len(source))
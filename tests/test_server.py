@@ -0,0 +1,143 @@
+import io
+import json
+import os
+import threading
+
+import pytest
+
+from src.infrastructure.language_server import LanguageServer
+from src.infrastructure.lsp import PositionEncodingKind
+from src.infrastructure.server import REQUEST_CANCELLED, REQUEST_WORKERS
+
+
+def _message(msg):
+    body = json.dumps(msg)
+    return 'Content-Length: {}\r\n\r\n{}'.format(len(body), body)\
+        .encode('utf-8')
+
+
+def _read_messages(data):
+    messages = []
+    while data:
+        header, data = data.split(b'\r\n\r\n', 1)
+        length = int(header.split(b'\r\n')[0].split(b': ')[1])
+        messages.append(json.loads(data[:length].decode('utf-8')))
+        data = data[length:]
+    return messages
+
+
+class _Server(LanguageServer):
+
+    def __init__(self, rfile, wfile):
+        super(_Server, self).__init__(rfile, wfile)
+        self.release = threading.Event()
+        self.notified = threading.Event()
+
+    def m_wait(self, **_kwargs):
+        self.release.wait(5)
+        return 'waited'
+
+    def m_echo(self, value=None, **_kwargs):
+        return value
+
+    def m_notify(self, **_kwargs):
+        self.notified.set()
+
+
+def _start():
+    read_fd, write_fd = os.pipe()
+    rfile = os.fdopen(read_fd, 'rb')
+    client = os.fdopen(write_fd, 'wb')
+    wfile = io.BytesIO()
+    wfile.close = lambda: None
+    server = _Server(rfile, wfile)
+    thread = threading.Thread(target=server.handle)
+    thread.start()
+    return server, client, wfile, thread
+
+
+def _send(client, *msgs):
+    for msg in msgs:
+        client.write(_message(msg))
+    client.flush()
+
+
+def _stop(server, client, wfile, thread):
+    server.release.set()
+    client.close()
+    thread.join(5)
+    server._request_executor.shutdown(wait=True)
+    return _read_messages(wfile.getvalue())
+
+
+def test_waiting_request_does_not_block_notifications():
+    server, client, wfile, thread = _start()
+    _send(client,
+          {'jsonrpc': '2.0', 'id': 1, 'method': 'wait'},
+          {'jsonrpc': '2.0', 'method': 'notify'})
+
+    assert server.notified.wait(5)
+
+    messages = _stop(server, client, wfile, thread)
+    assert messages == [{'jsonrpc': '2.0', 'id': 1, 'result': 'waited'}]
+
+
+def test_requests_are_answered_while_one_waits():
+    server, client, wfile, thread = _start()
+    _send(client,
+          {'jsonrpc': '2.0', 'id': 1, 'method': 'wait'},
+          {'jsonrpc': '2.0', 'id': 2, 'method': 'echo',
+           'params': {'value': 'x'}})
+
+    for _ in range(50):
+        if wfile.getvalue():
+            break
+        threading.Event().wait(0.1)
+    assert _read_messages(wfile.getvalue()) == [
+        {'jsonrpc': '2.0', 'id': 2, 'result': 'x'}]
+
+    messages = _stop(server, client, wfile, thread)
+    assert messages[-1] == {'jsonrpc': '2.0', 'id': 1, 'result': 'waited'}
+
+
+def test_cancel_pending_request():
+    server, client, wfile, thread = _start()
+    # All workers wait, so the next request is pending
+    _send(client, *[{'jsonrpc': '2.0', 'id': i, 'method': 'wait'}
+                    for i in range(REQUEST_WORKERS)])
+    _send(client,
+          {'jsonrpc': '2.0', 'id': 'pending', 'method': 'echo',
+           'params': {'value': 'x'}},
+          {'jsonrpc': '2.0', 'method': '$/cancelRequest',
+           'params': {'id': 'pending'}},
+          {'jsonrpc': '2.0', 'method': 'notify'})
+
+    assert server.notified.wait(5)
+
+    messages = _stop(server, client, wfile, thread)
+    assert messages[0] == {'jsonrpc': '2.0', 'id': 'pending',
+                           'error': {'code': REQUEST_CANCELLED,
+                                     'message': 'Request cancelled'}}
+    assert sorted(m['id'] for m in messages[1:]) == \
+        list(range(REQUEST_WORKERS))
+
+
+@pytest.mark.parametrize('client_encodings, encoding', [
+    (None, PositionEncodingKind.UTF16),
+    ([], PositionEncodingKind.UTF16),
+    (['utf-16', 'utf-8'], PositionEncodingKind.UTF8),
+    (['utf-8', 'utf-32'], PositionEncodingKind.UTF32),
+    (['unknown'], PositionEncodingKind.UTF16),
+])
+def test_position_encoding_is_negotiated(client_encodings, encoding):
+    server = LanguageServer(io.BytesIO(), io.BytesIO())
+    capabilities = {}
+    if client_encodings is not None:
+        capabilities['general'] = {'positionEncodings': client_encodings}
+
+    result = server.m_initialize(rootUri='file:///ws',
+                                 capabilities=capabilities)
+
+    assert result['capabilities']['positionEncoding'] == encoding
+    assert server.position_encoding == encoding
+    server._request_executor.shutdown(wait=True)
@@ -0,0 +1,108 @@
+import random
+
+import pytest
+
+from src.infrastructure import symbol_index
+from src.infrastructure.indexer import Symbol
+from src.infrastructure.symbol_index import SortedNames, SymbolIndex
+
+
+def _symbol(name):
+    return Symbol(name, 'Entity', 0, len(name), 0, 0, 0, len(name))
+
+
+def _names(results):
+    return [symbol.name for _, symbol in results]
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(symbol_index, 'NAMES_CHUNK_SIZE', 4)
+
+
+def test_sorted_names_random_changes(small_chunks):
+    rnd = random.Random(0)
+    sorted_names = SortedNames()
+    expected = set()
+    for _ in range(2000):
+        name = ''.join(rnd.choice('abc') for _ in range(rnd.randint(1, 5)))
+        if name in expected and rnd.random() < 0.5:
+            sorted_names.remove(name)
+            expected.discard(name)
+        elif name not in expected:
+            sorted_names.add(name)
+            expected.add(name)
+
+        if rnd.random() < 0.05:
+            assert list(sorted_names) == sorted(expected)
+            start = ''.join(rnd.choice('abc') for _ in range(2))
+            assert list(sorted_names.iter_from(start)) == \
+                sorted(n for n in expected if n >= start)
+    assert len(sorted_names) == len(expected)
+
+
+def test_exact_then_prefix_then_shorter_names():
+    index = SymbolIndex()
+    index.update('/a.ent', [_symbol(n) for n in
+                            ('PersonAddress', 'Person', 'APerson',
+                             'Persons', 'Other')])
+
+    assert _names(index.search('person')) == \
+        ['Person', 'Persons', 'PersonAddress', 'APerson']
+    assert _names(index.search('PERS')) == \
+        ['Person', 'Persons', 'PersonAddress', 'APerson']
+
+
+def test_short_queries_match_substrings():
+    index = SymbolIndex()
+    index.update('/a.ent', [_symbol('Entity1'), _symbol('yes')])
+
+    assert _names(index.search('y1')) == ['Entity1']
+    assert _names(index.search('y')) == ['yes', 'Entity1']
+
+
+def test_update_and_remove_file():
+    index = SymbolIndex()
+    index.update('/a.ent', [_symbol('Person'), _symbol('Address')])
+    index.update('/b.ent', [_symbol('Person')])
+
+    index.update('/a.ent', [_symbol('Address'), _symbol('City')])
+    assert [(path, s.name) for path, s in index.search('person')] == \
+        [('/b.ent', 'Person')]
+    assert _names(index.search('city')) == ['City']
+
+    index.remove('/b.ent')
+    assert index.search('person') == []
+    assert index.search('per') == []
+    assert sorted(_names(index.search(''))) == ['Address', 'City']
+
+
+def test_results_are_limited():
+    index = SymbolIndex()
+    index.update('/a.ent', [_symbol('Item{}'.format(i)) for i in range(50)])
+
+    assert len(index.search('item', limit=10)) == 10
+    assert len(index.search('', limit=10)) == 10
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_search_matches_brute_force(small_chunks, seed):
+    rnd = random.Random(seed)
+    index = SymbolIndex()
+    files = {}
+    for _ in range(200):
+        path = '/{}.ent'.format(rnd.randint(0, 9))
+        if rnd.random() < 0.2:
+            index.remove(path)
+            files.pop(path, None)
+            continue
+        names = [''.join(rnd.choice('abcd') for _ in range(rnd.randint(1, 6)))
+                 for _ in range(rnd.randint(0, 5))]
+        files[path] = names
+        index.update(path, [_symbol(n) for n in names])
+
+    all_names = set(n for names in files.values() for n in names)
+    for query in ('a', 'ab', 'abc', 'bcd', 'dd', 'abcd'):
+        expected = sorted(n for n in all_names if query in n)
+        found = sorted(set(_names(index.search(query, limit=1000))))
+        assert found == expected
@@ -0,0 +1,98 @@
+import io
+import json
+
+from src.infrastructure.textx_ls import TextXLanguageServer
+from src.infrastructure.workspace import Workspace
+from src.utils import uris
+
+
+def _read_messages(data):
+    messages = []
+    while data:
+        header, data = data.split(b'\r\n\r\n', 1)
+        length = int(header.split(b'\r\n')[0].split(b': ')[1])
+        messages.append(json.loads(data[:length].decode('utf-8')))
+        data = data[length:]
+    return messages
+
+
+class _LintScheduler(object):
+
+    def __init__(self):
+        self.scheduled = []
+
+    def schedule(self, doc_uri, active=False):
+        self.scheduled.append(doc_uri)
+
+    def discard(self, doc_uri):
+        pass
+
+
+def _server(capabilities):
+    wfile = io.BytesIO()
+    server = TextXLanguageServer(io.BytesIO(), wfile)
+    server.client_capabilities = capabilities
+    server.lint_scheduler = _LintScheduler()
+    return server, wfile
+
+
+def test_recovered_diagnostics_are_published():
+    server, wfile = _server({})
+    server.diagnostics_changed('file:///a.ent')
+    assert server.lint_scheduler.scheduled == ['file:///a.ent']
+    assert wfile.getvalue() == b''
+
+
+def test_recovered_diagnostics_are_refreshed_in_pull_mode():
+    server, wfile = _server({
+        'textDocument': {'diagnostic': {}},
+        'workspace': {'diagnostics': {'refreshSupport': True}}})
+    server.diagnostics_changed('file:///a.ent')
+    assert server.lint_scheduler.scheduled == []
+    assert [m['method'] for m in _read_messages(wfile.getvalue())] == \
+        ['workspace/diagnostic/refresh']
+
+
+def test_refresh_is_not_requested_without_client_support():
+    server, wfile = _server({'textDocument': {'diagnostic': {}}})
+    server.diagnostics_changed('file:///a.ent')
+    assert server.lint_scheduler.scheduled == []
+    assert wfile.getvalue() == b''
+
+
+class _Indexer(object):
+
+    def __init__(self, indexed):
+        self.indexed = indexed
+        self.closed = []
+
+    def file_closed(self, path):
+        self.closed.append(path)
+
+    def is_indexed(self, path):
+        return path in self.indexed
+
+
+def _close(server, doc_uri, error):
+    server.workspace = Workspace('file:///ws', server)
+    server.workspace.publish_diagnostics(doc_uri, error)
+    server.m_text_document__did_close(textDocument={'uri': doc_uri})
+
+
+def test_diagnostics_of_closed_untracked_file_are_cleared():
+    server, wfile = _server({})
+    _close(server, 'file:///ws/a.ent', [{'message': 'error'}])
+
+    published = [m['params'] for m in _read_messages(wfile.getvalue())]
+    assert published[-1] == {'uri': 'file:///ws/a.ent', 'diagnostics': []}
+    assert server.workspace._published == {}
+
+
+def test_diagnostics_of_closed_indexed_file_are_kept():
+    server, wfile = _server({})
+    server.indexer = _Indexer([uris.to_fs_path('file:///ws/a.ent')])
+    _close(server, 'file:///ws/a.ent', [{'message': 'error'}])
+
+    assert len(_read_messages(wfile.getvalue())) == 1
+    assert server.indexer.closed == [uris.to_fs_path('file:///ws/a.ent')]
+    assert 'file:///ws/a.ent' in server.workspace._published
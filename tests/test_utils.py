@@ -0,0 +1,53 @@
+import os
+
+from src.utils._utils import ModuleCache, exec_func_from_module
+
+MODULE = """def get_value():
+    return [{}]
+
+
+def get_other():
+    return 'other'
+"""
+
+
+def _write_module(path, value, mtime):
+    path.write(MODULE.format(value))
+    # Changes in the same second could have the same mtime
+    os.utime(str(path), (mtime, mtime))
+
+
+def test_function_results_are_cached(tmpdir):
+    path = tmpdir.join('lang.py')
+    _write_module(path, 1, 1000)
+    cache = ModuleCache()
+
+    result = cache.exec_func(str(path), 'get_value', 'lang')
+    assert result == [1]
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    assert cache.exec_func(str(path), 'get_value', 'lang') is result
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    assert cache.exec_func(str(path), 'get_other', 'lang') == 'other'
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_changed_module_is_loaded_again(tmpdir):
+    path = tmpdir.join('lang.py')
+    _write_module(path, 1, 1000)
+    cache = ModuleCache()
+    cache.exec_func(str(path), 'get_value', 'lang')
+
+    _write_module(path, 2, 2000)
+    assert cache.exec_func(str(path), 'get_value', 'lang') == [2]
+    assert (cache.hits, cache.misses) == (0, 2)
+
+    cache.clear()
+    assert cache.exec_func(str(path), 'get_value', 'lang') == [2]
+    assert (cache.hits, cache.misses) == (0, 3)
+
+
+def test_missing_module_returns_none(tmpdir):
+    path = str(tmpdir.join('missing.py'))
+    assert exec_func_from_module(path + ':get_value', 'missing') is None
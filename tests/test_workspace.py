@@ -0,0 +1,72 @@
+import pytest
+
+from src.infrastructure.lsp import PositionEncodingKind
+from src.infrastructure.workspace import Document, Workspace
+
+
+class _LangServer(object):
+
+    def __init__(self):
+        self.published = []
+
+    def notify_all(self, method, params_list):
+        self.published.extend((p['uri'], p['diagnostics'])
+                              for p in params_list)
+
+
+def test_unchanged_diagnostics_are_not_published_again():
+    server = _LangServer()
+    workspace = Workspace('file:///ws', server)
+    error = [{'message': 'error'}]
+
+    workspace.publish_all_diagnostics([('file:///a', error),
+                                       ('file:///b', [])])
+    workspace.publish_all_diagnostics([('file:///a', error),
+                                       ('file:///b', [])])
+
+    assert server.published == [('file:///a', error)]
+
+
+def test_cleared_diagnostics_are_not_remembered():
+    server = _LangServer()
+    workspace = Workspace('file:///ws', server)
+    error = [{'message': 'error'}]
+
+    workspace.publish_diagnostics('file:///a', error)
+    workspace.clear_diagnostics('file:///a')
+    workspace.clear_diagnostics('file:///a')
+
+    assert server.published == [('file:///a', error), ('file:///a', [])]
+    assert workspace._published == {}
+
+
+# Emoji is one code point, two UTF-16 code units and four UTF-8 bytes
+LINE = 'name = "\U0001f600" value\n'
+
+# Key: position encoding
+# Value: column after the emoji
+EMOJI_END = {
+    PositionEncodingKind.UTF8: 12,
+    PositionEncodingKind.UTF16: 10,
+    PositionEncodingKind.UTF32: 9,
+}
+
+
+@pytest.mark.parametrize('encoding', sorted(EMOJI_END))
+def test_change_after_non_bmp_character(encoding):
+    doc = Document('file:///ws/a.ent', 'first\n' + LINE,
+                   position_encoding=encoding)
+    col = EMOJI_END[encoding]
+    doc.apply_change({
+        'range': {'start': {'line': 1, 'character': col},
+                  'end': {'line': 1, 'character': col + 1}},
+        'text': '!'})
+
+    assert doc.source == 'first\nname = "\U0001f600! value\n'
+
+
+@pytest.mark.parametrize('encoding', sorted(EMOJI_END))
+def test_word_after_non_bmp_character(encoding):
+    doc = Document('file:///ws/a.ent', LINE, position_encoding=encoding)
+    col = EMOJI_END[encoding] + 4
+    assert doc.word_at_position({'line': 0, 'character': col}) == 'value'